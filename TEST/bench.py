@@ -0,0 +1,346 @@
+"""
+Benchmark harness for the TPS backend.
+
+    python TEST/bench.py run --scale small --concurrency 1,8,32 --requests 2000
+    python TEST/bench.py compare TEST/reports/<old>.json TEST/reports/<new>.json
+
+`run` creates a throwaway database (test_<BENCH_DB_NAME>, see
+bench_settings.py), migrates and seeds it at the chosen scale, then drives
+the Django app in-process through its full WSGI/middleware stack with one
+thread per concurrent client. Each worker authenticates as a real seeded
+user of every role (JWT, or a session for the admin) and draws requests
+from the role mix in workloads.py with a fixed random seed.
+
+For every concurrency level the report has, per endpoint: request count,
+status codes, p50/p95/p99/mean/max latency (ms), throughput and SQL
+queries per request; plus the git commit, dataset size and configuration,
+so reports of two commits can be compared with `compare`.
+
+Scale: --scale small|medium|large, each field overridable with BENCH_<FIELD>
+environment variables (BENCH_SESSIONS=200000, BENCH_USERS=5000, ...).
+Database: BENCH_DB_NAME, BENCH_DB_USER, BENCH_DB_PASSWORD, BENCH_DB_HOST,
+BENCH_DB_PORT. --keepdb reuses the seeded database between runs.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import asdict
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+REPO_ROOT = HERE.parent
+BACKEND = REPO_ROOT / 'backend' / 'tps_backend_folder'
+REPORTS = HERE / 'reports'
+
+
+def setup_django():
+    sys.path[:0] = [str(BACKEND), str(HERE)]
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bench_settings')
+    import django
+    django.setup()
+
+
+# --- Query counting ---
+
+_local = threading.local()
+
+
+def _count_queries(execute, sql, params, many, context):
+    _local.queries = getattr(_local, 'queries', 0) + 1
+    return execute(sql, params, many, context)
+
+
+def _install_query_counter(sender, connection, **kwargs):
+    connection.execute_wrappers.append(_count_queries)
+
+
+# --- Statistics ---
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    # pct * n first: pct / 100 * n can land just above an integer (7 / 100 * 100)
+    rank = max(math.ceil(pct * len(sorted_values) / 100) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(samples, wall_seconds):
+    """samples: list of (latency_ms, status, queries) of one endpoint"""
+    latencies = sorted(s[0] for s in samples)
+    queries = [s[2] for s in samples]
+    statuses = {}
+    for _, code, _ in samples:
+        statuses[str(code)] = statuses.get(str(code), 0) + 1
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, code, _ in samples if code >= 500),
+        'status_codes': statuses,
+        'throughput_rps': round(len(samples) / wall_seconds, 2) if wall_seconds else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'mean': round(sum(latencies) / len(latencies), 2),
+            'max': round(latencies[-1], 2),
+        },
+        'queries': {
+            'mean': round(sum(queries) / len(queries), 2),
+            'max': max(queries),
+        },
+    }
+
+
+# --- Workers ---
+
+class Worker:
+    """One concurrent client: an authenticated test client per role"""
+
+    def __init__(self, index, catalog, mix, seed):
+        from workloads import endpoints_for
+
+        self.rnd = random.Random(f'{seed}:{index}')
+        self.catalog = catalog
+        self.roles = [role for role in mix if mix[role] and catalog.actors.get(role)]
+        self.role_weights = [mix[role] for role in self.roles]
+        self.endpoints = {role: endpoints_for(role) for role in self.roles}
+        self.clients = {}
+        self.actors = {}
+        self.index = index
+
+    def _client(self, role):
+        from django.test import Client
+        from rest_framework_simplejwt.tokens import RefreshToken
+        from users.models import CustomUser
+
+        if role not in self.clients:
+            ids = self.catalog.actors[role]
+            actor = CustomUser.objects.get(pk=ids[self.index % len(ids)])
+            if role == 'admin':
+                client = Client(raise_request_exception=False)
+                client.force_login(actor)
+            else:
+                token = RefreshToken.for_user(actor).access_token
+                client = Client(raise_request_exception=False, headers={'Authorization': f'Bearer {token}'})
+            self.clients[role], self.actors[role] = client, actor
+        return self.clients[role], self.actors[role]
+
+    def request(self):
+        role = self.rnd.choices(self.roles, self.role_weights)[0]
+        endpoints = self.endpoints[role]
+        endpoint = self.rnd.choices(endpoints, [e.weight for e in endpoints])[0]
+        client, actor = self._client(role)
+        method, path, data = endpoint.build(self.rnd, self.catalog, actor)
+
+        _local.queries = 0
+        started = time.perf_counter()
+        if method == 'get':
+            response = client.get(path)
+        elif method == 'multipart':
+            response = client.post(path, data)
+        else:
+            response = client.post(path, data, content_type='application/json')
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        return endpoint.name, (elapsed_ms, response.status_code, _local.queries)
+
+    def run(self, count, results):
+        from django.db import connection
+
+        try:
+            for _ in range(count):
+                name, sample = self.request()
+                results.setdefault(name, []).append(sample)
+        finally:
+            connection.close()
+
+
+def run_level(catalog, mix, concurrency, total_requests, seed):
+    per_worker = [total_requests // concurrency + (1 if i < total_requests % concurrency else 0)
+                  for i in range(concurrency)]
+    workers = [Worker(i, catalog, mix, f'{seed}:{concurrency}') for i in range(concurrency)]
+    results = [{} for _ in workers]
+    threads = [
+        threading.Thread(target=worker.run, args=(count, result), name=f'bench-{i}')
+        for i, (worker, count, result) in enumerate(zip(workers, per_worker, results))
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    merged = {}
+    for result in results:
+        for name, samples in result.items():
+            merged.setdefault(name, []).extend(samples)
+    every = [sample for samples in merged.values() for sample in samples]
+    return {
+        'concurrency': concurrency,
+        'wall_seconds': round(wall, 3),
+        'total': summarize(every, wall),
+        'endpoints': {name: summarize(samples, wall) for name, samples in sorted(merged.items())},
+    }
+
+
+# --- Report ---
+
+def git_info():
+    def git(*args):
+        try:
+            return subprocess.run(
+                ['git', *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    return {
+        'commit': git('rev-parse', 'HEAD'),
+        'subject': git('log', '-1', '--format=%s'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+    }
+
+
+def environment_info():
+    import django
+    from django.db import connection
+
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': f'{connection.vendor} {connection.pg_version if connection.vendor == "postgresql" else ""}'.strip(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def print_level(level):
+    total = level['total']
+    print(f"\nconcurrency {level['concurrency']}: {total['requests']} requests in {level['wall_seconds']}s, "
+          f"{total['throughput_rps']} req/s, p95 {total['latency_ms']['p95']} ms, {total['errors']} errors")
+    print(f"  {'endpoint':<28}{'n':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}{'queries':>9}")
+    for name, stats in level['endpoints'].items():
+        lat = stats['latency_ms']
+        print(f"  {name:<28}{stats['requests']:>6}{lat['p50']:>9}{lat['p95']:>9}{lat['p99']:>9}"
+              f"{stats['throughput_rps']:>9}{stats['queries']['mean']:>9}")
+
+
+def cmd_run(args):
+    setup_django()
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+    from django.test.utils import setup_databases, teardown_databases
+
+    import seed as seeding
+    from workloads import DEFAULT_MIX, Catalog, parse_mix
+
+    scale = seeding.Scale.from_env(os.environ, seeding.SCALES[args.scale])
+    mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+    levels = [int(c) for c in args.concurrency.split(',')]
+
+    old_config = setup_databases(verbosity=0, interactive=False, keepdb=args.keepdb)
+    try:
+        if not seeding.is_seeded():
+            print(f'Seeding {asdict(scale)} ...')
+            started = time.perf_counter()
+            seeding.seed(scale, rnd_seed=args.seed)
+            print(f'Seeded in {time.perf_counter() - started:.1f}s')
+        dataset = seeding.dataset_size()
+        catalog = Catalog.load()
+
+        # Reconnect so every connection, in every worker thread, counts queries
+        connection_created.connect(_install_query_counter)
+        connections.close_all()
+
+        if args.warmup:
+            run_level(catalog, mix, 1, args.warmup, f'{args.seed}:warmup')
+
+        report = {
+            'meta': {
+                'created_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+                'git': git_info(),
+                'environment': environment_info(),
+            },
+            'config': {
+                'scale': args.scale, 'seed': args.seed, 'requests_per_level': args.requests,
+                'warmup': args.warmup, 'mix': mix,
+            },
+            'dataset': dataset,
+            'levels': [],
+        }
+        for concurrency in levels:
+            level = run_level(catalog, mix, concurrency, args.requests, args.seed)
+            report['levels'].append(level)
+            print_level(level)
+    finally:
+        connections.close_all()
+        teardown_databases(old_config, verbosity=0, keepdb=args.keepdb)
+
+    output = Path(args.output) if args.output else REPORTS / (
+        f"bench-{(report['meta']['git']['commit'] or 'nogit')[:10]}-{args.scale}-"
+        f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f'\nReport written to {output}')
+
+
+def cmd_compare(args):
+    base, new = (json.loads(Path(p).read_text()) for p in (args.baseline, args.candidate))
+    print(f"baseline  {base['meta']['git']['commit'][:10]} {base['meta']['git']['subject']}")
+    print(f"candidate {new['meta']['git']['commit'][:10]} {new['meta']['git']['subject']}")
+    if base['dataset'] != new['dataset']:
+        print('WARNING: the datasets differ, figures are not directly comparable')
+
+    base_levels = {level['concurrency']: level for level in base['levels']}
+    for level in new['levels']:
+        old = base_levels.get(level['concurrency'])
+        if not old:
+            continue
+        print(f"\nconcurrency {level['concurrency']}")
+        print(f"  {'endpoint':<28}{'p95 old':>10}{'p95 new':>10}{'change':>9}{'q old':>8}{'q new':>8}")
+        rows = [('TOTAL', old['total'], level['total'])] + [
+            (name, old['endpoints'][name], stats)
+            for name, stats in level['endpoints'].items() if name in old['endpoints']
+        ]
+        for name, before, after in rows:
+            p_old, p_new = before['latency_ms']['p95'], after['latency_ms']['p95']
+            change = f"{(p_new - p_old) / p_old * 100:+.1f}%" if p_old else '-'
+            print(f"  {name:<28}{p_old:>10}{p_new:>10}{change:>9}"
+                  f"{before['queries']['mean']:>8}{after['queries']['mean']:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='Seed a local database and benchmark the API.')
+    run.add_argument('--scale', choices=('small', 'medium', 'large'), default='small')
+    run.add_argument('--concurrency', default='1,8,32', help='Comma separated concurrency levels (default: 1,8,32).')
+    run.add_argument('--requests', type=int, default=1000, help='Requests per concurrency level (default: 1000).')
+    run.add_argument('--warmup', type=int, default=100, help='Unrecorded requests before the first level (default: 100).')
+    run.add_argument('--mix', help='Role weights, e.g. user=60,controller=30,manager=8,admin=2.')
+    run.add_argument('--seed', type=int, default=1, help='Random seed of the dataset and the request mix.')
+    run.add_argument('--keepdb', action='store_true', help='Keep (and reuse) the seeded database.')
+    run.add_argument('--output', help='Report path (default: TEST/reports/bench-<commit>-<scale>-<time>.json).')
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser('compare', help='Compare two reports.')
+    compare.add_argument('baseline')
+    compare.add_argument('candidate')
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
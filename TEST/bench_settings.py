@@ -0,0 +1,41 @@
+"""
+Settings for the benchmark harness (TEST/bench.py).
+
+Same app configuration as production, but the database always comes from
+BENCH_DB_* environment variables (a local Postgres by default), so a
+benchmark can never touch the deployed database. The harness runs on a
+throwaway test_<BENCH_DB_NAME> database created and migrated for the run.
+"""
+import os
+
+from tps_backend.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('BENCH_DB_NAME', 'tps_bench'),
+        'USER': os.environ.get('BENCH_DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('BENCH_DB_PASSWORD', ''),
+        'HOST': os.environ.get('BENCH_DB_HOST', 'localhost'),
+        'PORT': os.environ.get('BENCH_DB_PORT', '5432'),
+        'CONN_MAX_AGE': None,
+    }
+}
+
+DEBUG = False
+ALLOWED_HOSTS = ['testserver', 'localhost', '127.0.0.1']
+
+# Seeding creates thousands of users: hash their passwords quickly
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# Offline OCR, no third-party calls during a run
+PLATE_OCR_PROVIDER = 'stub'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'root': {'handlers': ['console'], 'level': 'WARNING'},
+    # 4xx responses are expected in the mixed workloads (e.g. unknown plates)
+    'loggers': {'django.request': {'level': 'ERROR'}},
+}
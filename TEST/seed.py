@@ -0,0 +1,213 @@
+"""
+Deterministic benchmark dataset.
+
+Everything is created with bulk_create from a fixed random seed, so two runs
+at the same scale benchmark the same rows. Denormalized state that the app
+normally maintains on save (plate_normalized, parking geometry, occupancy
+counters, violation counts, dashboard rollup) is filled in explicitly.
+"""
+import random
+from dataclasses import asdict, dataclass, fields
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.utils import timezone
+
+PASSWORD = 'bench'
+CITY_CENTERS = (
+    (45.4642, 9.1900), (41.9028, 12.4964), (40.8518, 14.2681), (45.0703, 7.6869),
+    (44.4949, 11.3426), (43.7696, 11.2558), (45.4408, 12.3155), (38.1157, 13.3615),
+)
+
+
+@dataclass
+class Scale:
+    cities: int = 4
+    parkings_per_city: int = 25
+    spots_per_parking: int = 20
+    users: int = 2000
+    controllers: int = 20
+    managers: int = 5
+    sessions: int = 50000
+    # Share of users' vehicles currently parked
+    active_ratio: float = 0.05
+    fines: int = 5000
+
+    @classmethod
+    def from_env(cls, environ, base):
+        """BENCH_<FIELD> variables override a preset, e.g. BENCH_SESSIONS=200000"""
+        values = asdict(base)
+        for field in fields(cls):
+            raw = environ.get(f'BENCH_{field.name.upper()}')
+            if raw is not None:
+                values[field.name] = type(values[field.name])(raw)
+        return cls(**values)
+
+
+SCALES = {
+    'small': Scale(cities=2, parkings_per_city=10, spots_per_parking=10, users=200,
+                   controllers=5, managers=2, sessions=5000, fines=500),
+    'medium': Scale(),
+    'large': Scale(cities=8, parkings_per_city=100, spots_per_parking=40, users=20000,
+                   controllers=100, managers=20, sessions=1000000, fines=100000),
+}
+
+
+def _plate(i):
+    letters = 'ABCDEFGHJKLMNPRSTVWXYZ'
+    return (
+        letters[i // (22 * 1000 * 22) % 22] + letters[i // (1000 * 22) % 22]
+        + f'{i // 22 % 1000:03d}'
+        + letters[i % 22] + letters[i * 7 % 22]
+    )
+
+
+def is_seeded():
+    from parkings.models import Parking
+    return Parking.objects.exists()
+
+
+def seed(scale, rnd_seed=1):
+    from django.contrib.auth.hashers import make_password
+
+    from parkings.metrics import refresh_dashboard_metrics
+    from parkings.models import City, Parking, Spot
+    from parkings.stats import rebuild_parking_stats
+    from users.models import CustomUser
+    from vehicles.models import Fine, GlobalSettings, ParkingSession, Vehicle, normalize_plate
+    from vehicles.violations import reconcile_violation_counts
+
+    rnd = random.Random(rnd_seed)
+    now = timezone.now()
+    password = make_password(PASSWORD)
+
+    GlobalSettings.objects.create(
+        max_violations=3,
+        grace_period_minutes=15,
+        violation_config=[{"name": "Parking Violation", "amount": 50}, {"name": "Expired", "amount": 30}],
+    )
+
+    cities = City.objects.bulk_create([
+        City(
+            name=f'Bench City {c}',
+            center_latitude=CITY_CENTERS[c % len(CITY_CENTERS)][0],
+            center_longitude=CITY_CENTERS[c % len(CITY_CENTERS)][1],
+        )
+        for c in range(scale.cities)
+    ])
+    city_names = [city.name for city in cities]
+
+    parkings = []
+    for city in cities:
+        for p in range(scale.parkings_per_city):
+            lat = city.center_latitude + rnd.uniform(-0.05, 0.05)
+            lng = city.center_longitude + rnd.uniform(-0.05, 0.05)
+            parking = Parking(
+                name=f'{city.name} P{p}', city=city.name, address=f'Via Bench {p}',
+                latitude=lat, longitude=lng,
+                polygon_coordinates=[
+                    {"lat": lat, "lng": lng}, {"lat": lat + 0.0005, "lng": lng},
+                    {"lat": lat + 0.0005, "lng": lng + 0.0005}, {"lat": lat, "lng": lng + 0.0005},
+                ],
+            )
+            parking.refresh_geometry()
+            parkings.append(parking)
+    parkings = Parking.objects.bulk_create(parkings, batch_size=1000)
+
+    Spot.objects.bulk_create(
+        (Spot(parking=parking, number=str(n)) for parking in parkings for n in range(scale.spots_per_parking)),
+        batch_size=5000,
+    )
+
+    def staff(role, count, cities):
+        return [
+            CustomUser(
+                email=f'{role}{i}@bench.local', password=password, role=role, first_name=role.title(),
+                last_name=str(i), allowed_cities=cities(i),
+            )
+            for i in range(count)
+        ]
+
+    users = CustomUser.objects.bulk_create([
+        CustomUser(
+            email=f'user{i}@bench.local', password=password, role='user', first_name='User', last_name=str(i),
+            date_joined=now - timedelta(days=rnd.randint(0, 365)),
+        )
+        for i in range(scale.users)
+    ], batch_size=5000)
+    CustomUser.objects.bulk_create(
+        # Controllers patrol every city, each manager runs one
+        staff('controller', scale.controllers, lambda i: city_names)
+        + staff('manager', scale.managers, lambda i: city_names[i % len(city_names):][:1])
+    )
+    CustomUser.objects.create_superuser(email='admin@bench.local', password=PASSWORD)
+
+    vehicles = Vehicle.objects.bulk_create(
+        (
+            Vehicle(user=user, plate=_plate(i), plate_normalized=normalize_plate(_plate(i)))
+            for i, user in enumerate(users)
+        ),
+        batch_size=5000,
+    )
+
+    # Active sessions first (one per parked vehicle), then ended history
+    active_count = min(int(len(vehicles) * scale.active_ratio), scale.sessions)
+    sessions = []
+    for i in range(scale.sessions):
+        vehicle = vehicles[i % len(vehicles)]
+        duration = rnd.choice((30, 60, 90, 120, 180))
+        cost = Decimal(duration) / 60 * Decimal('2.50')
+        if i < active_count:
+            start = now - timedelta(minutes=rnd.randint(0, duration))
+            end = None
+        else:
+            start = now - timedelta(minutes=rnd.randint(duration, 60 * 24 * 180))
+            end = start + timedelta(minutes=duration)
+        sessions.append(ParkingSession(
+            user_id=vehicle.user_id, vehicle=vehicle, parking_lot=rnd.choice(parkings),
+            start_time=start, end_time=end, planned_end_time=start + timedelta(minutes=duration),
+            duration_purchased_minutes=duration, is_active=end is None,
+            prepaid_cost=cost.quantize(Decimal('0.01')), total_cost=cost.quantize(Decimal('0.01')),
+        ))
+        if len(sessions) == 10000:
+            ParkingSession.objects.bulk_create(sessions)
+            sessions = []
+    ParkingSession.objects.bulk_create(sessions)
+
+    statuses = ('unpaid',) * 5 + ('paid',) * 3 + ('disputed', 'cancelled')
+    fines = []
+    for i in range(scale.fines):
+        fine_status = rnd.choice(statuses)
+        issued = now - timedelta(minutes=rnd.randint(0, 60 * 24 * 180))
+        fines.append(Fine(
+            vehicle=rnd.choice(vehicles), reason='Parking Violation', amount=Decimal('50.00'),
+            status=fine_status, issued_at=issued,
+            paid_at=issued + timedelta(days=1) if fine_status == 'paid' else None,
+            contestation_reason='Bench dispute' if fine_status == 'disputed' else None,
+        ))
+    Fine.objects.bulk_create(fines, batch_size=5000)
+
+    rebuild_parking_stats()
+    reconcile_violation_counts()
+    refresh_dashboard_metrics(days=None)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def dataset_size():
+    """Row counts of the seeded tables, recorded in the report"""
+    from parkings.models import City, Parking, Spot
+    from users.models import CustomUser
+    from vehicles.models import Fine, ParkingSession, Vehicle
+
+    return {
+        'cities': City.objects.count(),
+        'parkings': Parking.objects.count(),
+        'spots': Spot.objects.count(),
+        'users': CustomUser.objects.count(),
+        'vehicles': Vehicle.objects.count(),
+        'sessions': ParkingSession.objects.count(),
+        'active_sessions': ParkingSession.objects.filter(is_active=True).count(),
+        'fines': Fine.objects.count(),
+    }
@@ -0,0 +1,137 @@
+"""
+Request mixes per role.
+
+Every endpoint is a weighted request builder: given the worker's random
+generator, the dataset catalog and the acting user, it returns
+(method, path, data). Workers only draw from the endpoints of their role,
+so --mix decides how the load splits between app users, controllers,
+managers and the admin dashboard.
+"""
+from dataclasses import dataclass
+from typing import Callable
+
+# Share of controller plate checks on plates that are not registered
+UNKNOWN_PLATE_RATIO = 0.1
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    name: str
+    role: str
+    weight: int
+    build: Callable
+
+
+@dataclass
+class Catalog:
+    """Ids the request builders pick from, loaded once from the seeded database"""
+    parking_ids: list
+    parkings_by_city: dict
+    city_centers: list
+    cities: list
+    plates: list
+    active_plates: list
+    actors: dict          # role -> list of user ids
+
+    @classmethod
+    def load(cls):
+        from parkings.models import City, Parking
+        from users.models import CustomUser
+        from vehicles.models import ParkingSession, Vehicle
+
+        parkings_by_city = {}
+        for pk, city in Parking.objects.values_list('id', 'city').order_by('id'):
+            parkings_by_city.setdefault(city, []).append(pk)
+        actors = {}
+        # Banned users cannot authenticate: act as active ones only
+        active_users = CustomUser.objects.filter(is_active=True).order_by('id')
+        for pk, role, is_superuser in active_users.values_list('id', 'role', 'is_superuser'):
+            actors.setdefault('admin' if is_superuser else role, []).append(pk)
+        return cls(
+            parking_ids=[pk for pks in parkings_by_city.values() for pk in pks],
+            parkings_by_city=parkings_by_city,
+            city_centers=list(City.objects.values_list('center_latitude', 'center_longitude')),
+            cities=sorted(parkings_by_city),
+            plates=list(Vehicle.objects.order_by('id').values_list('plate', flat=True)),
+            active_plates=list(
+                ParkingSession.objects.filter(is_active=True, vehicle__isnull=False)
+                .order_by('id').values_list('vehicle__plate', flat=True)
+            ),
+            actors=actors,
+        )
+
+
+def _get(path):
+    return 'get', path, None
+
+
+def _plate(rnd, catalog):
+    if rnd.random() < UNKNOWN_PLATE_RATIO:
+        return f'ZZ{rnd.randint(0, 999):03d}ZZ'
+    pool = catalog.active_plates if catalog.active_plates and rnd.random() < 0.5 else catalog.plates
+    return rnd.choice(pool)
+
+
+def _near(rnd, catalog):
+    lat, lng = rnd.choice(catalog.city_centers)
+    return f'{lat + rnd.uniform(-0.03, 0.03):.5f},{lng + rnd.uniform(-0.03, 0.03):.5f}'
+
+
+def _manager_parking(rnd, catalog, actor):
+    pks = [pk for city in actor.allowed_cities or [] for pk in catalog.parkings_by_city.get(city, [])]
+    return rnd.choice(pks or catalog.parking_ids)
+
+
+ENDPOINTS = [
+    # App users
+    Endpoint('parkings.list', 'user', 3, lambda rnd, c, a: _get('/api/parkings/?page_size=50')),
+    Endpoint('parkings.search_map', 'user', 3, lambda rnd, c, a: _get(
+        f'/api/parkings/search_map/?near={_near(rnd, c)}&radius_m=1000')),
+    Endpoint('parkings.quote', 'user', 2, lambda rnd, c, a: _get(
+        f'/api/parkings/{rnd.choice(c.parking_ids)}/quote/?durations=30,60,120,240')),
+    Endpoint('sessions.active', 'user', 3, lambda rnd, c, a: _get('/api/sessions/active/')),
+    Endpoint('sessions.history', 'user', 1, lambda rnd, c, a: _get('/api/sessions/?page_size=20')),
+    Endpoint('vehicles.list', 'user', 1, lambda rnd, c, a: _get('/api/vehicles/')),
+    Endpoint('fines.mine', 'user', 1, lambda rnd, c, a: _get('/api/users/me/fines/')),
+    Endpoint('profile', 'user', 1, lambda rnd, c, a: _get('/api/users/profile/')),
+
+    # Controllers on patrol
+    Endpoint('plates.status', 'controller', 6, lambda rnd, c, a: _get(f'/api/plates/{_plate(rnd, c)}/status/')),
+    Endpoint('plates.status_batch', 'controller', 2, lambda rnd, c, a: (
+        'post', '/api/plates/status/', {'plates': [_plate(rnd, c) for _ in range(50)]})),
+    Endpoint('sessions.search_by_plate', 'controller', 1, lambda rnd, c, a: _get(
+        f'/api/sessions/search_by_plate/?plate={_plate(rnd, c)}')),
+    Endpoint('violations.report', 'controller', 1, lambda rnd, c, a: (
+        'multipart', '/api/users/violations/report/', {'plate': rnd.choice(c.plates), 'reason': 'Parking Violation'})),
+
+    # Managers
+    Endpoint('manager.parkings', 'manager', 3, lambda rnd, c, a: _get('/api/parkings/?page_size=50')),
+    Endpoint('manager.parking_sessions', 'manager', 2, lambda rnd, c, a: _get(
+        f'/api/parkings/{_manager_parking(rnd, c, a)}/sessions/')),
+    Endpoint('manager.spots', 'manager', 2, lambda rnd, c, a: _get(
+        f'/api/spots/?parking={_manager_parking(rnd, c, a)}&page_size=100')),
+    Endpoint('manager.activity', 'manager', 1, lambda rnd, c, a: _get('/api/users/activity/')),
+    Endpoint('manager.active_officers', 'manager', 1, lambda rnd, c, a: _get(
+        f'/api/users/shifts/active-officers/?city={(a.allowed_cities or c.cities)[0]}')),
+
+    # Admin home page (session authentication)
+    Endpoint('admin.dashboard', 'admin', 1, lambda rnd, c, a: _get('/admin/')),
+]
+
+ROLES = ('user', 'controller', 'manager', 'admin')
+DEFAULT_MIX = {'user': 60, 'controller': 30, 'manager': 8, 'admin': 2}
+
+
+def parse_mix(text):
+    """'user=60,controller=30' -> {'user': 60, 'controller': 30}"""
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(','))):
+        role, _, weight = part.partition('=')
+        if role not in ROLES or not weight.isdigit():
+            raise ValueError(f'Invalid mix entry {part!r}: expected <role>=<weight>, role in {ROLES}')
+        mix[role] = int(weight)
+    return mix
+
+
+def endpoints_for(role):
+    return [endpoint for endpoint in ENDPOINTS if endpoint.role == role]
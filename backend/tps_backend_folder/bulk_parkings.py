@@ -2,7 +2,6 @@ import os
 import django
 import random
 import math
-import json
 from django.utils import timezone
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tps_backend.settings")
@@ -77,8 +76,10 @@ for i in range(1, num_parkings + 1):
         rate_per_hour=DEFAULT_RATE,
         latitude=lat,
         longitude=lon,
-        polygon_coordinates=json.dumps(polygon)
+        polygon_coordinates=polygon
     )
+    # bulk_create skips save(), so fill the derived geometry here
+    parking.refresh_geometry()
     parkings_to_create.append(parking)
 
 # 4. Bulk create parkings in batches
@@ -111,6 +112,8 @@ for parking in last_parkings:
     # Bulk create spots in batches per parking
     for start in range(0, len(spots_to_create), BATCH_SIZE):
         Spot.objects.bulk_create(spots_to_create[start:start + BATCH_SIZE])
+    # bulk_create skips the spot signals, so set the counter directly
+    Parking.objects.filter(pk=parking.pk).update(spots_count=len(spots_to_create))
     spots_to_create = []  # reset for next parking
 
 print("Done! All parkings and spots created in 0_TEST_CITY.")
@@ -8,4 +8,4 @@ class ParkingsConfig(AppConfig):
 
     def ready(self):
         # Import signals here if needed
-        pass
+        from . import tariffs  # noqa: F401  (tariff plan cache invalidation)
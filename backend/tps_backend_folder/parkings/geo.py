@@ -0,0 +1,143 @@
+import math
+
+from django.db.models import BooleanField, Field, Func, Value
+
+EARTH_RADIUS_M = 6_371_000
+MAX_NEAR_RADIUS_M = 50_000
+DEFAULT_NEAR_RADIUS_M = 500
+
+
+class Point(Func):
+    """Postgres ``point(x, y)``; longitude is used as x and latitude as y."""
+    function = 'point'
+    output_field = Field()
+
+
+class Box(Func):
+    """Postgres ``box`` spanned by two points."""
+    function = 'box'
+    output_field = Field()
+
+
+class Overlaps(Func):
+    """Postgres ``&&`` operator, answered by the GiST index on the parking extent."""
+    template = '(%(expressions)s)'
+    arg_joiner = ' && '
+    output_field = BooleanField()
+
+
+def extent_box():
+    """Expression matching the GiST index declared on Parking."""
+    return Box(
+        Point('min_longitude', 'min_latitude'),
+        Point('max_longitude', 'max_latitude'),
+    )
+
+
+def query_box(min_lat, min_lng, max_lat, max_lng):
+    return Box(
+        Point(Value(float(min_lng)), Value(float(min_lat))),
+        Point(Value(float(max_lng)), Value(float(max_lat))),
+    )
+
+
+def polygon_extent(coords, latitude=None, longitude=None):
+    """
+    Bounding box (min_lat, min_lng, max_lat, max_lng) covering the polygon
+    and the parking point. Returns None when there is nothing to locate.
+    """
+    lats = []
+    lngs = []
+    for c in coords or []:
+        try:
+            lats.append(float(c['lat']))
+            lngs.append(float(c['lng']))
+        except (KeyError, TypeError, ValueError):
+            continue
+    if latitude is not None and longitude is not None:
+        lats.append(latitude)
+        lngs.append(longitude)
+    if not lats:
+        return None
+    return min(lats), min(lngs), max(lats), max(lngs)
+
+
+def polygon_centroid(coords):
+    """Vertex average of the polygon, used for marker placement."""
+    points = []
+    for c in coords or []:
+        try:
+            points.append((float(c['lat']), float(c['lng'])))
+        except (KeyError, TypeError, ValueError):
+            continue
+    if not points:
+        return None, None
+    return (
+        sum(lat for lat, _ in points) / len(points),
+        sum(lng for _, lng in points) / len(points),
+    )
+
+
+def _check_lat_lng(lat, lng):
+    if not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
+        raise ValueError("Coordinates out of range.")
+
+
+def parse_bbox(raw):
+    """Parse ``minLat,minLng,maxLat,maxLng`` into a tuple of floats."""
+    try:
+        min_lat, min_lng, max_lat, max_lng = (float(v) for v in raw.split(','))
+    except ValueError:
+        raise ValueError("bbox must be 'minLat,minLng,maxLat,maxLng'.")
+    _check_lat_lng(min_lat, min_lng)
+    _check_lat_lng(max_lat, max_lng)
+    if min_lat > max_lat or min_lng > max_lng:
+        raise ValueError("bbox minimum corner must be below the maximum corner.")
+    return min_lat, min_lng, max_lat, max_lng
+
+
+def parse_near(raw, raw_radius=None):
+    """Parse ``lat,lng`` and an optional radius in meters."""
+    try:
+        lat, lng = (float(v) for v in raw.split(','))
+    except ValueError:
+        raise ValueError("near must be 'lat,lng'.")
+    _check_lat_lng(lat, lng)
+
+    if raw_radius in (None, ''):
+        radius = DEFAULT_NEAR_RADIUS_M
+    else:
+        try:
+            radius = float(raw_radius)
+        except ValueError:
+            raise ValueError("radius_m must be a number.")
+    if radius <= 0 or radius > MAX_NEAR_RADIUS_M:
+        raise ValueError(f"radius_m must be between 0 and {MAX_NEAR_RADIUS_M}.")
+    return lat, lng, radius
+
+
+def radius_bbox(lat, lng, radius_m):
+    """Smallest lat/lng box containing the circle of ``radius_m`` around a point."""
+    delta_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    delta_lng = min(math.degrees(radius_m / (EARTH_RADIUS_M * cos_lat)), 180)
+    return (
+        max(lat - delta_lat, -90), max(lng - delta_lng, -180),
+        min(lat + delta_lat, 90), min(lng + delta_lng, 180),
+    )
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def distance_to_extent_m(lat, lng, extent):
+    """Distance from a point to the closest point of an extent (0 if inside)."""
+    min_lat, min_lng, max_lat, max_lng = extent
+    closest_lat = min(max(lat, min_lat), max_lat)
+    closest_lng = min(max(lng, min_lng), max_lng)
+    return haversine_m(lat, lng, closest_lat, closest_lng)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from parkings.stats import rebuild_parking_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild parking occupancy counters and daily stats from sessions and spots."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Only rebuild daily stats for the last N days (default: all history).',
+        )
+
+    def handle(self, *args, **options):
+        rows = rebuild_parking_stats(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Parking counters rebuilt, {rows} daily stats rows written."))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from parkings.metrics import DEFAULT_REFRESH_DAYS, refresh_dashboard_metrics
+
+
+class Command(BaseCommand):
+    help = "Refresh the admin dashboard rollup (DashboardMetrics) from sessions, fines and users."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=DEFAULT_REFRESH_DAYS,
+            help=f'Recompute the last N days (default: {DEFAULT_REFRESH_DAYS}).',
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Recompute the whole history instead of the last days.',
+        )
+        parser.add_argument(
+            '--loop', type=int, default=None, metavar='SECONDS',
+            help='Keep refreshing every SECONDS seconds instead of running once.',
+        )
+
+    def handle(self, *args, **options):
+        days = None if options['rebuild'] else options['days']
+        while True:
+            rows = refresh_dashboard_metrics(days=days)
+            self.stdout.write(f"{rows} dashboard metrics rows written.")
+            if not options['loop']:
+                break
+            # Only the first pass rebuilds
+            days = options['days']
+            time.sleep(options['loop'])
@@ -0,0 +1,207 @@
+"""
+DashboardMetrics rollup: per day, per city figures for the admin dashboard.
+
+refresh_dashboard_metrics() recomputes the last few days from range scans on
+the source tables (start_time, issued_at, date_joined) and carries the
+cumulative revenue forward from the day before the window, so a refresh
+costs the same whatever the size of the history. Run it every few minutes:
+`manage.py refresh_dashboard_metrics --loop 300`, or the Celery task in
+parkings/tasks.py.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Min, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import DashboardMetrics
+
+# Today and yesterday: sessions started yesterday may still be running
+DEFAULT_REFRESH_DAYS = 2
+
+DAILY_FIELDS = ('sessions_started', 'revenue', 'fines_issued', 'fines_amount', 'new_users')
+SNAPSHOT_FIELDS = ('users_total', 'active_sessions', 'open_violations', 'pending_disputes')
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _empty_row():
+    return {
+        'sessions_started': 0, 'revenue': Decimal('0.00'),
+        'fines_issued': 0, 'fines_amount': Decimal('0.00'), 'new_users': 0,
+    }
+
+
+def _first_day():
+    """Earliest day with any source data (full rebuild)"""
+    from vehicles.models import Fine, ParkingSession
+
+    firsts = [
+        ParkingSession.objects.aggregate(first=Min('start_time'))['first'],
+        Fine.objects.aggregate(first=Min('issued_at'))['first'],
+        get_user_model().objects.filter(role='user').aggregate(first=Min('date_joined'))['first'],
+    ]
+    firsts = [timezone.localdate(t) for t in firsts if t]
+    return min(firsts) if firsts else timezone.localdate()
+
+
+def _daily_figures(since, until):
+    """(date, city) -> daily figures for [since, until)"""
+    from vehicles.models import Fine, ParkingSession
+
+    daily = defaultdict(_empty_row)
+
+    sessions = (
+        ParkingSession.objects.filter(start_time__gte=since, start_time__lt=until)
+        .annotate(day=TruncDate('start_time'), city_name=Coalesce('parking_lot__city', Value('')))
+        .values('day', 'city_name')
+        .annotate(count=Count('id'), revenue=Sum('total_cost'))
+        .order_by()
+    )
+    for row in sessions:
+        figures = daily[row['day'], row['city_name']]
+        figures['sessions_started'] = row['count']
+        figures['revenue'] = row['revenue'] or Decimal('0.00')
+
+    fines = (
+        Fine.objects.filter(issued_at__gte=since, issued_at__lt=until)
+        .annotate(day=TruncDate('issued_at'), city_name=Coalesce('session__parking_lot__city', Value('')))
+        .values('day', 'city_name')
+        .annotate(count=Count('id'), amount=Sum('amount'))
+        .order_by()
+    )
+    for row in fines:
+        figures = daily[row['day'], row['city_name']]
+        figures['fines_issued'] = row['count']
+        figures['fines_amount'] = row['amount'] or Decimal('0.00')
+
+    users = (
+        get_user_model().objects.filter(role='user', date_joined__gte=since, date_joined__lt=until)
+        .annotate(day=TruncDate('date_joined'))
+        .values('day')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    for row in users:
+        daily[row['day'], '']['new_users'] = row['count']
+
+    return daily
+
+
+def _revenue_before(day):
+    """city -> cumulative revenue up to the day before ``day``"""
+    from vehicles.models import ParkingSession
+
+    previous = DashboardMetrics.objects.filter(date=day - timedelta(days=1))
+    if previous.exists():
+        return {row.city: row.revenue_total for row in previous}
+
+    # No rollup for the previous day (first run, or the job was stopped):
+    # start again from the session history once
+    rows = (
+        ParkingSession.objects.filter(start_time__lt=_day_start(day))
+        .annotate(city_name=Coalesce('parking_lot__city', Value('')))
+        .values('city_name')
+        .annotate(revenue=Sum('total_cost'))
+        .order_by()
+    )
+    return {row['city_name']: row['revenue'] or Decimal('0.00') for row in rows}
+
+
+def _snapshot():
+    """city -> current values of the snapshot fields"""
+    from vehicles.models import Fine, ParkingSession
+
+    snapshot = defaultdict(lambda: dict.fromkeys(SNAPSHOT_FIELDS, 0))
+    snapshot['']['users_total'] = get_user_model().objects.filter(role='user').count()
+
+    active = (
+        ParkingSession.objects.filter(is_active=True)
+        .annotate(city_name=Coalesce('parking_lot__city', Value('')))
+        .values('city_name').annotate(count=Count('id')).order_by()
+    )
+    for row in active:
+        snapshot[row['city_name']]['active_sessions'] = row['count']
+
+    open_fines = (
+        Fine.objects.exclude(status__in=['paid', 'cancelled'])
+        .annotate(city_name=Coalesce('session__parking_lot__city', Value('')))
+        .values('city_name', 'status').annotate(count=Count('id')).order_by()
+    )
+    for row in open_fines:
+        snapshot[row['city_name']]['open_violations'] += row['count']
+        if row['status'] == 'disputed':
+            snapshot[row['city_name']]['pending_disputes'] += row['count']
+
+    return snapshot
+
+
+def refresh_dashboard_metrics(days=DEFAULT_REFRESH_DAYS, now=None):
+    """
+    Rewrite the DashboardMetrics rows of the last ``days`` days
+    (None = all history). Returns the number of rows written.
+    """
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    first = _first_day() if days is None else today - timedelta(days=days - 1)
+
+    daily = _daily_figures(_day_start(first), _day_start(today + timedelta(days=1)))
+    totals = {} if days is None else _revenue_before(first)
+    snapshot = _snapshot()
+    # Past days keep the snapshot taken when they were last refreshed
+    kept = {
+        (row['date'], row['city']): row
+        for row in DashboardMetrics.objects.filter(date__gte=first, date__lt=today)
+        .values('date', 'city', *SNAPSHOT_FIELDS)
+    }
+
+    rows = []
+    day = first
+    while day <= today:
+        cities = set(totals) | {city for (d, city) in daily if d == day}
+        if day == today:
+            cities |= set(snapshot)
+        cities |= {city for (d, city) in kept if d == day}
+        for city in sorted(cities):
+            figures = daily.get((day, city)) or _empty_row()
+            totals[city] = totals.get(city, Decimal('0.00')) + figures['revenue']
+            if day == today:
+                snapshots = snapshot.get(city) or dict.fromkeys(SNAPSHOT_FIELDS, 0)
+            else:
+                snapshots = {f: kept.get((day, city), {}).get(f, 0) for f in SNAPSHOT_FIELDS}
+            rows.append(DashboardMetrics(
+                date=day, city=city, revenue_total=totals[city], refreshed_at=now,
+                **figures, **snapshots,
+            ))
+        day += timedelta(days=1)
+
+    with transaction.atomic():
+        DashboardMetrics.objects.filter(date__gte=first).delete()
+        DashboardMetrics.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def current_metrics():
+    """
+    Today's figures summed over the cities (one query on the rollup).
+    Until the job has produced today's rows, the latest snapshot is shown
+    with no daily figures: the admin request never runs a refresh itself.
+    """
+    fields = DAILY_FIELDS + SNAPSHOT_FIELDS + ('revenue_total',)
+    today = timezone.localdate()
+    latest = DashboardMetrics.objects.filter(date__lte=today).order_by('-date').values('date')[:1]
+    rows = list(DashboardMetrics.objects.filter(date=Subquery(latest)))
+
+    metrics = dict.fromkeys(fields, 0)
+    for row in rows:
+        for field in fields:
+            if row.date == today or field not in DAILY_FIELDS:
+                metrics[field] += getattr(row, field)
+    metrics['refreshed_at'] = min((row.refreshed_at for row in rows), default=None)
+    return metrics
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:47
+
+import json
+
+import django.contrib.postgres.indexes
+import parkings.geo
+from django.db import migrations, models
+
+
+def backfill_extents(apps, schema_editor):
+    Parking = apps.get_model('parkings', 'Parking')
+    to_update = []
+    for parking in Parking.objects.only('id', 'latitude', 'longitude', 'polygon_coordinates').iterator():
+        try:
+            coords = json.loads(parking.polygon_coordinates)
+        except (TypeError, ValueError):
+            coords = []
+        extent = parkings.geo.polygon_extent(coords, parking.latitude, parking.longitude)
+        if extent is None:
+            continue
+        parking.min_latitude, parking.min_longitude, parking.max_latitude, parking.max_longitude = extent
+        to_update.append(parking)
+    Parking.objects.bulk_update(
+        to_update,
+        ['min_latitude', 'min_longitude', 'max_latitude', 'max_longitude'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parkings', '0002_auto_20260208_1909'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parking',
+            name='max_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='parking',
+            name='max_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='parking',
+            name='min_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='parking',
+            name='min_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_extents, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='parking',
+            index=models.Index(fields=['city'], name='parkings_pa_city_f456b8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parking',
+            index=models.Index(fields=['name'], name='parkings_pa_name_fd12ed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parking',
+            index=django.contrib.postgres.indexes.GistIndex(parkings.geo.Box(parkings.geo.Point('min_longitude', 'min_latitude'), parkings.geo.Point('max_longitude', 'max_latitude')), name='parking_extent_gist'),
+        ),
+    ]
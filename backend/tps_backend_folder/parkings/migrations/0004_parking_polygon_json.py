@@ -0,0 +1,73 @@
+import json
+
+import parkings.geo
+from django.db import migrations, models
+
+
+def polygon_text_to_json(apps, schema_editor):
+    Parking = apps.get_model('parkings', 'Parking')
+    to_update = []
+    for parking in Parking.objects.only('id', 'polygon_coordinates').iterator():
+        try:
+            coords = json.loads(parking.polygon_coordinates or '[]')
+        except ValueError:
+            coords = []
+        if not isinstance(coords, list):
+            coords = []
+        parking.polygon_json = coords
+        parking.centroid_latitude, parking.centroid_longitude = parkings.geo.polygon_centroid(coords)
+        to_update.append(parking)
+    Parking.objects.bulk_update(
+        to_update,
+        ['polygon_json', 'centroid_latitude', 'centroid_longitude'],
+        batch_size=500,
+    )
+
+
+def polygon_json_to_text(apps, schema_editor):
+    Parking = apps.get_model('parkings', 'Parking')
+    to_update = []
+    for parking in Parking.objects.only('id', 'polygon_json').iterator():
+        parking.polygon_coordinates = json.dumps(parking.polygon_json or [])
+        to_update.append(parking)
+    Parking.objects.bulk_update(to_update, ['polygon_coordinates'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parkings', '0003_parking_extent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parking',
+            name='centroid_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='parking',
+            name='centroid_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='parking',
+            name='polygon_json',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(polygon_text_to_json, polygon_json_to_text),
+        migrations.RemoveField(
+            model_name='parking',
+            name='polygon_coordinates',
+        ),
+        migrations.RenameField(
+            model_name='parking',
+            old_name='polygon_json',
+            new_name='polygon_coordinates',
+        ),
+        migrations.AlterField(
+            model_name='parking',
+            name='polygon_coordinates',
+            field=models.JSONField(blank=True, default=list, help_text='JSON array of coordinates forming the parking polygon'),
+        ),
+    ]
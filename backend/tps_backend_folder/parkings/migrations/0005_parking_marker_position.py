@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:49
+
+from django.db import migrations, models
+
+
+def backfill_markers(apps, schema_editor):
+    Parking = apps.get_model('parkings', 'Parking')
+    ParkingEntrance = apps.get_model('parkings', 'ParkingEntrance')
+
+    first_entrances = {}
+    for entrance in ParkingEntrance.objects.order_by('-id').only('parking_id', 'latitude', 'longitude').iterator():
+        first_entrances[entrance.parking_id] = entrance
+
+    to_update = []
+    for parking in Parking.objects.iterator():
+        entrance = first_entrances.get(parking.id)
+        if entrance and entrance.latitude and entrance.longitude:
+            marker = (entrance.latitude, entrance.longitude)
+        elif parking.latitude is not None and parking.longitude is not None:
+            marker = (parking.latitude, parking.longitude)
+        elif len(parking.polygon_coordinates or []) >= 3:
+            marker = (parking.centroid_latitude, parking.centroid_longitude)
+        else:
+            continue
+        parking.marker_latitude, parking.marker_longitude = marker
+        to_update.append(parking)
+    Parking.objects.bulk_update(to_update, ['marker_latitude', 'marker_longitude'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parkings', '0004_parking_polygon_json'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parking',
+            name='marker_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='parking',
+            name='marker_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_markers, migrations.RunPython.noop),
+    ]
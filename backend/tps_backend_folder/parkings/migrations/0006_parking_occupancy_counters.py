@@ -0,0 +1,80 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:50
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill_counters(apps, schema_editor):
+    Parking = apps.get_model('parkings', 'Parking')
+    Spot = apps.get_model('parkings', 'Spot')
+    ParkingDailyStats = apps.get_model('parkings', 'ParkingDailyStats')
+    ParkingSession = apps.get_model('vehicles', 'ParkingSession')
+
+    spots_qs = Spot.objects.filter(parking=OuterRef('pk')).values('parking').annotate(cnt=Count('id')).values('cnt')
+    active_qs = ParkingSession.objects.filter(
+        parking_lot=OuterRef('pk'), is_active=True
+    ).values('parking_lot').annotate(cnt=Count('id')).values('cnt')
+    Parking.objects.update(
+        spots_count=Coalesce(Subquery(spots_qs, output_field=IntegerField()), Value(0)),
+        active_sessions_count=Coalesce(Subquery(active_qs, output_field=IntegerField()), Value(0)),
+    )
+
+    rows = (
+        ParkingSession.objects.filter(parking_lot__isnull=False)
+        .annotate(day=TruncDate('start_time'))
+        .values('parking_lot', 'day')
+        .annotate(entries=Count('id'), revenue=Sum('total_cost'))
+        .order_by()
+    )
+    ParkingDailyStats.objects.bulk_create(
+        [
+            ParkingDailyStats(
+                parking_id=row['parking_lot'],
+                date=row['day'],
+                entries=row['entries'],
+                revenue=row['revenue'] or Decimal('0.00'),
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parkings', '0005_parking_marker_position'),
+        ('vehicles', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parking',
+            name='active_sessions_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='parking',
+            name='spots_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ParkingDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('entries', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('parking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='parkings.parking')),
+            ],
+            options={
+                'verbose_name': 'Parking Daily Stats',
+                'verbose_name_plural': 'Parking Daily Stats',
+                'constraints': [models.UniqueConstraint(fields=('parking', 'date'), name='unique_parking_daily_stats')],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
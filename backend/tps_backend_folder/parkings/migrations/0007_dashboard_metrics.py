@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parkings', '0006_parking_occupancy_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('city', models.CharField(blank=True, default='', max_length=50)),
+                ('sessions_started', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('revenue_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('fines_issued', models.PositiveIntegerField(default=0)),
+                ('fines_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('new_users', models.PositiveIntegerField(default=0)),
+                ('users_total', models.PositiveIntegerField(default=0)),
+                ('active_sessions', models.PositiveIntegerField(default=0)),
+                ('open_violations', models.PositiveIntegerField(default=0)),
+                ('pending_disputes', models.PositiveIntegerField(default=0)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Dashboard Metrics',
+                'verbose_name_plural': 'Dashboard Metrics',
+                'constraints': [models.UniqueConstraint(fields=('date', 'city'), name='unique_dashboard_metrics')],
+            },
+        ),
+    ]
@@ -1,6 +1,10 @@
 from django.db import models
 from django.db.models.fields import DecimalField
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.contrib.postgres.indexes import GistIndex
 import json
+from .geo import extent_box, polygon_centroid, polygon_extent
 
 DEFAULT_TARIFF_JSON = """{
     "type": "HOURLY_LINEAR",
@@ -37,77 +41,124 @@ class Parking(models.Model):
     tariff_config_json = models.TextField(default=DEFAULT_TARIFF_JSON) 
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
-    polygon_coordinates = models.TextField(
-        default='[]',
+    polygon_coordinates = models.JSONField(
+        default=list,
+        blank=True,
         help_text='JSON array of coordinates forming the parking polygon'
     )
 
+    # Derived geometry, kept in sync on save so reads never walk the polygon
+    centroid_latitude = models.FloatField(null=True, blank=True, editable=False)
+    centroid_longitude = models.FloatField(null=True, blank=True, editable=False)
+    min_latitude = models.FloatField(null=True, blank=True, editable=False)
+    min_longitude = models.FloatField(null=True, blank=True, editable=False)
+    max_latitude = models.FloatField(null=True, blank=True, editable=False)
+    max_longitude = models.FloatField(null=True, blank=True, editable=False)
+
+    # Map marker (first entrance, else lat/lng, else centroid), refreshed on
+    # save here and by ParkingEntrance save/delete
+    marker_latitude = models.FloatField(null=True, blank=True, editable=False)
+    marker_longitude = models.FloatField(null=True, blank=True, editable=False)
+
+    # Live counters, maintained incrementally (see parkings/stats.py)
+    spots_count = models.PositiveIntegerField(default=0, editable=False)
+    active_sessions_count = models.PositiveIntegerField(default=0, editable=False)
+
+    GEOMETRY_SOURCE_FIELDS = {'latitude', 'longitude', 'polygon_coordinates'}
+    GEOMETRY_FIELDS = [
+        'centroid_latitude', 'centroid_longitude',
+        'min_latitude', 'min_longitude', 'max_latitude', 'max_longitude',
+        'marker_latitude', 'marker_longitude',
+    ]
+
     class Meta:
         indexes = [
             models.Index(fields=['city']),      
             models.Index(fields=['name']),     
+            GistIndex(extent_box(), name='parking_extent_gist'),
         ]
 
     def __str__(self):
         return f"{self.name} ({self.city})"
 
+    def refresh_geometry(self):
+        """Recompute centroid and bounding box from polygon and lat/lng (no save)"""
+        if isinstance(self.polygon_coordinates, str):
+            # Legacy callers still hand over JSON text: parse it once, here
+            try:
+                self.polygon_coordinates = json.loads(self.polygon_coordinates or '[]')
+            except ValueError:
+                self.polygon_coordinates = []
+        coords = self.get_polygon_coords()
+        self.centroid_latitude, self.centroid_longitude = polygon_centroid(coords)
+        extent = polygon_extent(coords, self.latitude, self.longitude)
+        if extent is None:
+            extent = (None, None, None, None)
+        self.min_latitude, self.min_longitude, self.max_latitude, self.max_longitude = extent
+        self.marker_latitude, self.marker_longitude = self.compute_marker_position()
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.GEOMETRY_SOURCE_FIELDS.intersection(update_fields):
+            self.refresh_geometry()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | set(self.GEOMETRY_FIELDS)
+        super().save(*args, **kwargs)
+
     def get_polygon_coords(self):
         """Returns polygon coordinates as list of dicts"""
-        try:
-            return json.loads(self.polygon_coordinates)
-        except:
-            return []
+        coords = self.polygon_coordinates
+        return coords if isinstance(coords, list) else []
 
     def set_polygon_coords(self, coords_list):
         """Sets polygon coordinates from list of dicts"""
-        self.polygon_coordinates = json.dumps(coords_list)
+        self.polygon_coordinates = list(coords_list or [])
 
     def calculate_centroid(self):
-        """Calculate centroid of polygon for marker placement"""
-        coords = self.get_polygon_coords()
-        if not coords:
-            return None, None
-        
-        lat_sum = sum(c['lat'] for c in coords)
-        lng_sum = sum(c['lng'] for c in coords)
-        count = len(coords)
-        
-        return lat_sum / count, lng_sum / count
+        """Centroid of polygon for marker placement (precomputed on save)"""
+        return self.centroid_latitude, self.centroid_longitude
 
-    def get_marker_position(self):
+    def compute_marker_position(self):
         """
-        Returns the marker position using cached entrances to avoid N+1 queries.
+        Marker position from the current data: first entrance, then
+        lat/lng, then polygon centroid. Hits the database for entrances.
         """
-
-        entrances = list(self.entrances.all()) 
-        
-        if entrances:
-            entrance = entrances[0] 
-            if entrance.latitude and entrance.longitude:
+        if self.pk:
+            entrance = self.entrances.order_by('id').first()
+            if entrance and entrance.latitude and entrance.longitude:
                 return (entrance.latitude, entrance.longitude)
 
         if self.latitude is not None and self.longitude is not None:
             return (self.latitude, self.longitude)
 
-        coords = self.get_polygon_coords()
-        if len(coords) >= 3:
-            sum_lat = sum(c['lat'] for c in coords)
-            sum_lng = sum(c['lng'] for c in coords)
-            return (sum_lat / len(coords), sum_lng / len(coords))
+        if len(self.get_polygon_coords()) >= 3:
+            return self.calculate_centroid()
         
         return (None, None)
 
+    def refresh_marker(self):
+        """Recompute and persist only the marker columns"""
+        self.marker_latitude, self.marker_longitude = self.compute_marker_position()
+        Parking.objects.filter(pk=self.pk).update(
+            marker_latitude=self.marker_latitude,
+            marker_longitude=self.marker_longitude,
+        )
+
+    def get_marker_position(self):
+        """Returns the precomputed marker position (no queries)"""
+        return (self.marker_latitude, self.marker_longitude)
+
     @property
     def total_spots(self):
-        return self.spots.count()
+        return self.spots_count
 
     @property
     def occupied_spots(self):
-        return self.spots.filter(is_occupied=True).count()
+        return self.active_sessions_count
 
     @property
     def available_spots(self):
-        return self.total_spots - self.occupied_spots
+        return max(self.total_spots - self.occupied_spots, 0)
 
 class ParkingEntrance(models.Model):
     parking = models.ForeignKey(
@@ -134,4 +185,85 @@ class Spot(models.Model):
     is_occupied = models.BooleanField(default=False)
 
     def __str__(self):
-        return f"Spot {self.number} at {self.parking.name}"
\ No newline at end of file
+        return f"Spot {self.number} at {self.parking.name}"
+
+class ParkingDailyStats(models.Model):
+    """
+    Per parking, per day counters updated when sessions start,
+    so the parking list never aggregates the session history.
+    """
+    parking = models.ForeignKey(Parking, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    entries = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Parking Daily Stats'
+        verbose_name_plural = 'Parking Daily Stats'
+        constraints = [
+            models.UniqueConstraint(fields=['parking', 'date'], name='unique_parking_daily_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.parking_id} {self.date}: {self.entries} entries"
+
+
+class DashboardMetrics(models.Model):
+    """
+    Admin dashboard figures per day and city, refreshed by a scheduled job
+    (parkings/metrics.py) so the admin home never aggregates the history.
+    city is '' for figures without a city (users, fines without a session).
+    The snapshot fields are the values at refreshed_at.
+    """
+    date = models.DateField()
+    city = models.CharField(max_length=50, blank=True, default='')
+
+    sessions_started = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Session revenue of all days up to and including this one
+    revenue_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    fines_issued = models.PositiveIntegerField(default=0)
+    fines_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    new_users = models.PositiveIntegerField(default=0)
+
+    # Snapshots
+    users_total = models.PositiveIntegerField(default=0)
+    active_sessions = models.PositiveIntegerField(default=0)
+    open_violations = models.PositiveIntegerField(default=0)
+    pending_disputes = models.PositiveIntegerField(default=0)
+
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Dashboard Metrics'
+        verbose_name_plural = 'Dashboard Metrics'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'city'], name='unique_dashboard_metrics'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.city or '-'}"
+
+
+@receiver(post_save, sender=ParkingEntrance)
+@receiver(post_delete, sender=ParkingEntrance)
+def refresh_parking_marker(sender, instance, **kwargs):
+    parking = Parking.objects.filter(pk=instance.parking_id).first()
+    if parking:
+        parking.refresh_marker()
+
+
+# Spot.save() and deletes (a queryset .delete() too: it sends post_delete per
+# spot) move spots_count. Spot.objects.bulk_create() and raw SQL send no
+# signal: run `manage.py rebuild_parking_stats` after them, which recounts
+# spots_count from the spots table (parkings/stats.py).
+
+@receiver(post_save, sender=Spot)
+def increment_spots_count(sender, instance, created, **kwargs):
+    if created:
+        Parking.objects.filter(pk=instance.parking_id).update(spots_count=models.F('spots_count') + 1)
+
+
+@receiver(post_delete, sender=Spot)
+def decrement_spots_count(sender, instance, **kwargs):
+    Parking.objects.filter(pk=instance.parking_id, spots_count__gt=0).update(spots_count=models.F('spots_count') - 1)
@@ -41,18 +41,35 @@ class ParkingMapSerializer(serializers.ModelSerializer):
         return obj.get_polygon_coords()
 
     def get_marker_latitude(self, obj):
-        if obj.latitude: return obj.latitude
-        lat, _ = obj.get_marker_position()
-        return lat
+        return obj.latitude or obj.marker_latitude
 
     def get_marker_longitude(self, obj):
-        if obj.longitude: return obj.longitude
-        _, lng = obj.get_marker_position()
-        return lng
+        return obj.longitude or obj.marker_longitude
     
+class ParkingSummarySerializer(serializers.ModelSerializer):
+    """
+    Lightweight parking embedded in session payloads: stored columns only,
+    no entrances and no daily stats, so it never triggers extra queries.
+    tariff_config_json stays: the apps price the live session with it.
+    """
+    polygon_coords = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Parking
+        fields = [
+            'id', 'name', 'city', 'address', 'rate_per_hour',
+            'latitude', 'longitude',
+            'marker_latitude', 'marker_longitude',
+            'polygon_coords', 'tariff_config_json',
+        ]
+        read_only_fields = fields
+
+    def get_polygon_coords(self, obj):
+        return obj.get_polygon_coords()
+
 class ParkingSerializer(serializers.ModelSerializer):
-    total_spots = serializers.IntegerField(read_only=True, source='annotated_total_spots')
-    occupied_spots = serializers.IntegerField(read_only=True, source='annotated_occupied_spots')
+    total_spots = serializers.IntegerField(read_only=True, source='spots_count')
+    occupied_spots = serializers.IntegerField(read_only=True, source='active_sessions_count')
     today_entries = serializers.IntegerField(read_only=True, source='annotated_today_entries')
     today_revenue = serializers.DecimalField(
         max_digits=10, 
@@ -62,8 +79,6 @@ class ParkingSerializer(serializers.ModelSerializer):
     )
     
     polygon_coords = serializers.SerializerMethodField()
-    marker_latitude = serializers.SerializerMethodField()
-    marker_longitude = serializers.SerializerMethodField()
     entrances = ParkingEntranceSerializer(many=True, read_only=True)
 
     class Meta:
@@ -82,38 +97,33 @@ class ParkingSerializer(serializers.ModelSerializer):
         """Return polygon coordinates as list"""
         return obj.get_polygon_coords()
 
-    def get_marker_latitude(self, obj):
-        """Return marker latitude (entrance or centroid)"""
-        lat, lng = obj.get_marker_position()
-        return lat
-
-    def get_marker_longitude(self, obj):
-        """Return marker longitude (entrance or centroid)"""
-        lat, lng = obj.get_marker_position()
-        return lng
+    def _polygon_from_input(self, value):
+        """Accept the polygon as a list or as JSON text and store it as a list"""
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                raise serializers.ValidationError({'polygon_coordinates': 'Invalid JSON.'})
+        if not isinstance(value, list):
+            raise serializers.ValidationError({'polygon_coordinates': 'Expected a list of coordinates.'})
+        return value
 
     def create(self, validated_data):
         polygon_coords = self.initial_data.get('polygon_coordinates')
         if polygon_coords:
-            if isinstance(polygon_coords, str):
-                validated_data['polygon_coordinates'] = polygon_coords
-            else:
-                validated_data['polygon_coordinates'] = json.dumps(polygon_coords)
+            validated_data['polygon_coordinates'] = self._polygon_from_input(polygon_coords)
         
         return super().create(validated_data)
 
     def update(self, instance, validated_data):
         polygon_coords = self.initial_data.get('polygon_coordinates')
         if polygon_coords:
-            if isinstance(polygon_coords, str):
-                validated_data['polygon_coordinates'] = polygon_coords
-            else:
-                validated_data['polygon_coordinates'] = json.dumps(polygon_coords)
+            validated_data['polygon_coordinates'] = self._polygon_from_input(polygon_coords)
         
         # Handle polygon coordinates
         polygon_coords = validated_data.pop('polygon_coords', None)
         if polygon_coords is not None:
-            validated_data['polygon_coordinates'] = json.dumps(polygon_coords)
+            validated_data['polygon_coordinates'] = self._polygon_from_input(polygon_coords)
         
         return super().update(instance, validated_data)
 
@@ -0,0 +1,97 @@
+"""
+Incremental maintenance of the parking occupancy counters
+(Parking.active_sessions_count, Parking.spots_count) and of ParkingDailyStats.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+
+from .models import Parking, ParkingDailyStats, Spot
+
+
+def record_session_started(session):
+    """A session just started: +1 active, +1 entry and its cost on the start day."""
+    if not session.parking_lot_id:
+        return
+    day = timezone.localdate(session.start_time)
+    revenue = session.total_cost or Decimal('0.00')
+
+    with transaction.atomic():
+        Parking.objects.filter(pk=session.parking_lot_id).update(
+            active_sessions_count=F('active_sessions_count') + 1
+        )
+        stats, _ = ParkingDailyStats.objects.get_or_create(parking_id=session.parking_lot_id, date=day)
+        ParkingDailyStats.objects.filter(pk=stats.pk).update(
+            entries=F('entries') + 1,
+            revenue=F('revenue') + revenue,
+        )
+
+
+def record_sessions_ended(parking_ids):
+    """
+    Sessions just ended. ``parking_ids`` has one entry per ended session,
+    so a batch of sessions costs one UPDATE per parking.
+    """
+    counts = Counter(pk for pk in parking_ids if pk)
+    with transaction.atomic():
+        for parking_id, ended in counts.items():
+            Parking.objects.filter(pk=parking_id).update(
+                active_sessions_count=Greatest(F('active_sessions_count') - ended, 0)
+            )
+
+
+def record_session_ended(session):
+    record_sessions_ended([session.parking_lot_id])
+
+
+def rebuild_parking_stats(days=None):
+    """
+    Recompute every counter from the source tables.
+    ``days`` limits the daily stats rebuild to the last N days (None = all history).
+    Returns the number of daily rows written.
+    """
+    from vehicles.models import ParkingSession
+
+    spots_qs = Spot.objects.filter(parking=OuterRef('pk')).values('parking').annotate(cnt=Count('id')).values('cnt')
+    active_qs = ParkingSession.objects.filter(
+        parking_lot=OuterRef('pk'), is_active=True
+    ).values('parking_lot').annotate(cnt=Count('id')).values('cnt')
+
+    sessions = ParkingSession.objects.filter(parking_lot__isnull=False)
+    daily = ParkingDailyStats.objects.all()
+    if days is not None:
+        since = timezone.localdate() - timedelta(days=days - 1)
+        sessions = sessions.filter(start_time__gte=timezone.make_aware(datetime.combine(since, time.min)))
+        daily = daily.filter(date__gte=since)
+
+    rows = (
+        sessions.annotate(day=TruncDate('start_time'))
+        .values('parking_lot', 'day')
+        .annotate(entries=Count('id'), revenue=Sum('total_cost'))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        Parking.objects.update(
+            spots_count=Coalesce(Subquery(spots_qs, output_field=IntegerField()), Value(0)),
+            active_sessions_count=Coalesce(Subquery(active_qs, output_field=IntegerField()), Value(0)),
+        )
+        daily.delete()
+        created = ParkingDailyStats.objects.bulk_create(
+            [
+                ParkingDailyStats(
+                    parking_id=row['parking_lot'],
+                    date=row['day'],
+                    entries=row['entries'],
+                    revenue=row['revenue'] or Decimal('0.00'),
+                )
+                for row in rows.iterator()
+            ],
+            batch_size=1000,
+        )
+    return len(created)
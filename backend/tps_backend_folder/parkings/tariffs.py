@@ -0,0 +1,300 @@
+"""
+Tariff engine.
+
+A parking's ``tariff_config_json`` is compiled once into an immutable
+TariffPlan, cached per parking and dropped when the parking is saved.
+
+Config keys, as written by the manager app (MODELS/tariff_config.dart):
+  type               HOURLY_LINEAR (default), HOURLY_VARIABLE or FIXED_DAILY
+  day_base_rate      hourly rate outside the night window
+  night_base_rate    hourly rate inside the night window (defaults to day rate)
+  night_start_time   "HH:MM", night window start (may cross midnight)
+  night_end_time     "HH:MM", night window end
+  daily_rate         FIXED_DAILY: price of 24 hours, charged pro rata
+  flex_rules         HOURLY_VARIABLE only, see below
+
+Flex rules (FlexRule.toJson in the apps):
+  {"rule_type": "DURATION", "duration_from_hours": 0, "duration_to_hours": 4,
+   "multiplier": 1.5}
+      the base rate is multiplied while the elapsed time of the stay is in
+      [from, to); the first matching rule wins, like the apps' calculators.
+      "from_hours"/"to_hours" are accepted too (user app format).
+  {"rule_type": "TIME", "day_of_week": "MONDAY", "start_time": "08:00",
+   "end_time": "12:00", "modifier": 1.2}
+      any other rule_type with a time window multiplies the base rate inside
+      the window (on one weekday when day_of_week is set, 0 = Monday or an
+      English day name); later rules win.
+A rule that cannot be parsed is skipped; the rest of the plan still applies.
+
+Prices follow local wall-clock time. The plan holds a cumulative cost table
+over one day (one week when a rule is weekday specific) at minute
+resolution, so a quote is a couple of table lookups per duration step and a
+batch of durations costs no more than a single one. Identical configs share
+one plan.
+"""
+import json
+import logging
+import math
+import threading
+from array import array
+from dataclasses import dataclass
+from functools import lru_cache
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Parking
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+FALLBACK_HOURLY_RATE = 2.00
+CENT = Decimal('0.01')
+MAX_QUOTE_DURATIONS = 50
+MAX_QUOTE_MINUTES = 7 * MINUTES_PER_DAY
+WEEKDAYS = ('MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY', 'SATURDAY', 'SUNDAY')
+NO_STEPS = ((0, math.inf, 1.0),)
+
+
+def _parse_hhmm(value):
+    hours, minutes = str(value).split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours <= 24 and 0 <= minutes < 60) or hours * 60 + minutes > MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time {value!r}")
+    return hours * 60 + minutes
+
+
+def _minutes_in_window(start, end):
+    """Minutes of the day inside [start, end), wrapping past midnight."""
+    if start == end:
+        return range(0)
+    if start < end:
+        return range(start, end)
+    return list(range(start, MINUTES_PER_DAY)) + list(range(0, end))
+
+
+@dataclass(frozen=True, eq=False)
+class TariffPlan:
+    tariff_type: str
+    # Length of the repeating pattern: one day or one week, in minutes
+    period: int
+    # cumulative[i] = cost of the first i minutes of the period
+    cumulative: array
+    # (from, to, multiplier) over the elapsed minutes of the stay
+    steps: tuple = NO_STEPS
+
+    def _cost_until(self, minute):
+        periods, rest = divmod(minute, self.period)
+        return periods * self.cumulative[-1] + self.cumulative[rest]
+
+    def _start_offset(self, start_time):
+        local = timezone.localtime(start_time or timezone.now())
+        offset = local.hour * 60 + local.minute
+        if self.period == MINUTES_PER_WEEK:
+            offset += local.weekday() * MINUTES_PER_DAY
+        return offset
+
+    def quote(self, duration_minutes, start_time=None):
+        return self.quote_many([duration_minutes], start_time)[0]
+
+    def quote_many(self, durations, start_time=None):
+        """Prices (Decimal, 2 dp) for several durations starting at the same time"""
+        offset = self._start_offset(start_time)
+        prices = []
+        for duration in durations:
+            duration = max(int(duration or 0), 0)
+            cost = 0.0
+            for step_from, step_to, multiplier in self.steps:
+                if step_from >= duration:
+                    break
+                step_to = min(step_to, duration)
+                cost += multiplier * (self._cost_until(offset + step_to) - self._cost_until(offset + step_from))
+            prices.append(Decimal(repr(cost)).quantize(CENT, rounding=ROUND_HALF_UP))
+        return prices
+
+
+def _build_plan(tariff_type, minute_rates, steps=NO_STEPS):
+    cumulative = array('d', [0.0])
+    total = 0.0
+    for rate in minute_rates:
+        total += rate / 60.0
+        cumulative.append(total)
+    return TariffPlan(tariff_type=tariff_type, period=len(minute_rates), cumulative=cumulative, steps=steps)
+
+
+def _flat_plan(tariff_type, hourly_rate):
+    return _build_plan(tariff_type, [hourly_rate] * MINUTES_PER_DAY)
+
+
+def compile_tariff(config_text):
+    """Compile a tariff config (JSON text or dict) into a TariffPlan"""
+    if isinstance(config_text, str):
+        return _compile_text(config_text)
+    return _compile(config_text)
+
+
+@lru_cache(maxsize=256)
+def _compile_text(config_text):
+    try:
+        config = json.loads(config_text)
+    except ValueError:
+        config = None
+    return _compile(config)
+
+
+def _rate(config, key, default):
+    value = config.get(key)
+    try:
+        return default if value is None else float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _weekday(value):
+    """0 = Monday; accepts 0-6 or an English day name ("MONDAY", "mon")"""
+    if isinstance(value, int) and 0 <= value < 7:
+        return value
+    name = str(value).strip().upper()
+    if name.isdigit() and int(name) < 7:
+        return int(name)
+    for day, weekday in enumerate(WEEKDAYS):
+        if len(name) >= 3 and weekday.startswith(name):
+            return day
+    raise ValueError(f"Invalid day_of_week {value!r}")
+
+
+def _duration_rule(rule):
+    """(from, to, multiplier) in elapsed minutes, or None for a time window rule"""
+    if rule.get('rule_type', 'DURATION') != 'DURATION':
+        return None
+    from_hours = rule.get('duration_from_hours', rule.get('from_hours', 0))
+    to_hours = rule.get('duration_to_hours', rule.get('to_hours'))
+    multiplier = rule.get('multiplier', rule.get('modifier', 1.0))
+    step_from = round(float(from_hours) * 60)
+    step_to = math.inf if to_hours is None else round(float(to_hours) * 60)
+    if step_from < 0 or step_to <= step_from:
+        raise ValueError(f"Invalid duration range {from_hours!r}-{to_hours!r}")
+    return step_from, step_to, float(multiplier)
+
+
+def _duration_steps(tiers):
+    """
+    Elapsed time split into intervals with a single multiplier, the first
+    matching tier winning as in the apps' calculators.
+    """
+    if not tiers:
+        return NO_STEPS
+    bounds = sorted({0, math.inf} | {b for tier in tiers for b in tier[:2]})
+    steps = []
+    for step_from, step_to in zip(bounds, bounds[1:]):
+        multiplier = next((m for lo, hi, m in tiers if lo <= step_from < hi), 1.0)
+        if steps and steps[-1][2] == multiplier:
+            steps[-1] = (steps[-1][0], step_to, multiplier)
+        else:
+            steps.append((step_from, step_to, multiplier))
+    return tuple(steps)
+
+
+def _compile(config):
+    if not isinstance(config, dict):
+        # Config illeggibile: tariffa di emergenza
+        return _flat_plan('HOURLY_LINEAR', FALLBACK_HOURLY_RATE)
+
+    tariff_type = config.get('type') or 'HOURLY_LINEAR'
+    if tariff_type == 'FIXED_DAILY':
+        return _flat_plan(tariff_type, _rate(config, 'daily_rate', 20.00) / 24.0)
+
+    # HOURLY_LINEAR, HOURLY_VARIABLE (and fallback for unknown types)
+    day_rate = _rate(config, 'day_base_rate', FALLBACK_HOURLY_RATE)
+    night_rate = _rate(config, 'night_base_rate', None)
+    day_rates = [day_rate] * MINUTES_PER_DAY
+    if night_rate is not None and config.get('night_start_time') and config.get('night_end_time'):
+        try:
+            window = _minutes_in_window(
+                _parse_hhmm(config['night_start_time']), _parse_hhmm(config['night_end_time'])
+            )
+        except ValueError:
+            logger.warning(f"Ignoring invalid night window in tariff config: {config}")
+            window = ()
+        for minute in window:
+            day_rates[minute] = night_rate
+
+    if tariff_type != 'HOURLY_VARIABLE':
+        return _build_plan(tariff_type, day_rates)
+
+    tiers, windows = [], []
+    flex_rules = config.get('flex_rules')
+    for rule in flex_rules if isinstance(flex_rules, list) else []:
+        try:
+            tier = _duration_rule(rule)
+            if tier is not None:
+                tiers.append(tier)
+                continue
+            start = _parse_hhmm(rule['start_time'])
+            minutes = _minutes_in_window(start, _parse_hhmm(rule['end_time']))
+            day = rule.get('day_of_week')
+            windows.append((None if day in (None, '') else _weekday(day), start, minutes,
+                            float(rule.get('modifier', rule.get('multiplier', 1.0)))))
+        except (AttributeError, KeyError, TypeError, ValueError):
+            logger.warning(f"Ignoring invalid tariff flex rule: {rule!r}")
+
+    weekly = any(day is not None for day, _, _, _ in windows)
+    rates = day_rates * 7 if weekly else day_rates
+    for day, start, minutes, modifier in windows:
+        for weekday in (range(7) if weekly and day is None else [day]):
+            for minute in minutes:
+                if weekday is None:
+                    rates[minute] = day_rates[minute] * modifier
+                    continue
+                # A window crossing midnight belongs to the day it starts on
+                spill = 1 if minute < start else 0
+                rates[((weekday + spill) % 7) * MINUTES_PER_DAY + minute] = day_rates[minute] * modifier
+
+    return _build_plan(tariff_type, rates, _duration_steps(tiers))
+
+
+def parse_durations(raw):
+    """Parse ``15,30,60`` into a list of minutes for quote_many."""
+    try:
+        durations = [int(v) for v in raw.split(',') if v.strip()]
+    except ValueError:
+        raise ValueError("durations must be a comma separated list of minutes.")
+    if not durations:
+        raise ValueError("durations is required.")
+    if len(durations) > MAX_QUOTE_DURATIONS:
+        raise ValueError(f"At most {MAX_QUOTE_DURATIONS} durations per request.")
+    if any(d <= 0 or d > MAX_QUOTE_MINUTES for d in durations):
+        raise ValueError(f"durations must be between 1 and {MAX_QUOTE_MINUTES} minutes.")
+    return durations
+
+
+_plan_cache = {}
+_plan_cache_lock = threading.Lock()
+
+
+def get_tariff_plan(parking):
+    """Cached TariffPlan of a parking, recompiled if its config text changed"""
+    config_text = parking.tariff_config_json
+    cached = _plan_cache.get(parking.pk)
+    if cached is not None and cached[0] == config_text:
+        return cached[1]
+
+    plan = compile_tariff(config_text)
+    if parking.pk is not None:
+        with _plan_cache_lock:
+            _plan_cache[parking.pk] = (config_text, plan)
+    return plan
+
+
+def invalidate_tariff_plan(parking_id):
+    with _plan_cache_lock:
+        _plan_cache.pop(parking_id, None)
+
+
+@receiver(post_save, sender=Parking)
+@receiver(post_delete, sender=Parking)
+def drop_cached_tariff_plan(sender, instance, **kwargs):
+    invalidate_tariff_plan(instance.pk)
@@ -0,0 +1,23 @@
+import logging
+
+from .metrics import refresh_dashboard_metrics
+
+try:
+    from celery import shared_task
+except ImportError:
+    # Celery is optional: without it run `manage.py refresh_dashboard_metrics --loop`
+    def shared_task(func):
+        return func
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def refresh_dashboard_metrics_task():
+    """
+    Periodic refresh of the admin dashboard rollup (DashboardMetrics).
+    Run this every 5 minutes via Celery Beat
+    """
+    rows = refresh_dashboard_metrics()
+    logger.info(f'Dashboard metrics refreshed ({rows} rows)')
+    return {'rows': rows}
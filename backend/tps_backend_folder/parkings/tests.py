@@ -1,3 +1,539 @@
-from django.test import TestCase
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from tps_backend.testing import CITY, QueryCountTestCase
+from users.models import CustomUser
+from vehicles.models import Fine, ParkingSession, Vehicle
+from vehicles.views import calculate_prepaid_cost
+
+from .metrics import current_metrics, refresh_dashboard_metrics
+from .models import DEFAULT_TARIFF_JSON, DashboardMetrics, Parking, ParkingDailyStats, ParkingEntrance, Spot
+from .stats import record_session_started, record_sessions_ended
+from .tariffs import compile_tariff
+
+
+def at(hour, minute=0, day=15):
+    """Local time on Monday 15 June 2026 (no DST change nearby)"""
+    return timezone.make_aware(datetime(2026, 6, day, hour, minute))
+
+
+def config(**overrides):
+    return json.dumps(dict(json.loads(DEFAULT_TARIFF_JSON), **overrides))
+
+
+class TariffPlanTests(SimpleTestCase):
+    """
+    Expected prices follow the apps' calculators (calculateFee in the user
+    app, CostCalculator in the manager app) with the start time taken into
+    account.
+    """
+
+    def assertQuote(self, config_text, start, minutes, expected):
+        self.assertEqual(compile_tariff(config_text).quote(minutes, start), Decimal(expected))
+
+    def test_day_rate(self):
+        self.assertQuote(DEFAULT_TARIFF_JSON, at(10), 60, '2.50')
+        self.assertQuote(DEFAULT_TARIFF_JSON, at(10), 90, '3.75')
+
+    def test_night_rate(self):
+        self.assertQuote(DEFAULT_TARIFF_JSON, at(23), 60, '1.50')
+
+    def test_day_into_night(self):
+        # 21-22 day, 22-24 night
+        self.assertQuote(DEFAULT_TARIFF_JSON, at(21), 180, '5.50')
+
+    def test_night_window_crossing_midnight(self):
+        # 23-06 night (7h), 06-07 day
+        self.assertQuote(DEFAULT_TARIFF_JSON, at(23), 480, '13.00')
+
+    def test_multi_day(self):
+        # Each day is 16h at 2.50 and 8h at 1.50
+        self.assertQuote(DEFAULT_TARIFF_JSON, at(10), 48 * 60, '104.00')
+
+    def test_fixed_daily_pro_rata(self):
+        fixed = config(type='FIXED_DAILY', daily_rate=20)
+        self.assertQuote(fixed, at(10), 6 * 60, '5.00')
+        self.assertQuote(fixed, at(10), 36 * 60, '30.00')
+
+    def test_hourly_linear_ignores_flex_rules(self):
+        rules = [{"rule_type": "DURATION", "duration_from_hours": 0, "duration_to_hours": 4, "multiplier": 2.0}]
+        self.assertQuote(config(flex_rules=rules), at(10), 60, '2.50')
+
+    def test_variable_duration_steps(self):
+        # Manager app FlexRule.toJson
+        rules = [
+            {"rule_type": "DURATION", "modifier": 1.0, "duration_from_hours": 0, "duration_to_hours": 2, "multiplier": 1.0},
+            {"rule_type": "DURATION", "modifier": 1.0, "duration_from_hours": 2, "duration_to_hours": 4, "multiplier": 1.5},
+            {"rule_type": "DURATION", "modifier": 1.0, "duration_from_hours": 4, "duration_to_hours": 24, "multiplier": 2.0},
+        ]
+        variable = config(type='HOURLY_VARIABLE', flex_rules=rules)
+        # 2h x 2.50 + 2h x 3.75 + 1h x 5.00
+        self.assertQuote(variable, at(10), 5 * 60, '17.50')
+        self.assertQuote(variable, at(10), 150, '6.88')
+        # The multiplier applies to the night rate too
+        self.assertQuote(variable, at(23), 3 * 60, '5.25')
+
+    def test_variable_user_app_rule_format(self):
+        rules = [{"from_hours": 1, "to_hours": 3, "multiplier": 2.0}]
+        self.assertQuote(config(type='HOURLY_VARIABLE', flex_rules=rules), at(10), 4 * 60, '15.00')
+
+    def test_variable_time_window(self):
+        rules = [{"rule_type": "TIME", "day_of_week": "MONDAY", "start_time": "10:00", "end_time": "12:00",
+                  "modifier": 2.0}]
+        variable = config(type='HOURLY_VARIABLE', flex_rules=rules)
+        self.assertQuote(variable, at(9), 3 * 60, '12.50')
+        # Tuesday: no surcharge
+        self.assertQuote(variable, at(9, day=16), 3 * 60, '7.50')
+
+    def test_invalid_rule_is_skipped(self):
+        rules = [
+            {"rule_type": "DURATION", "duration_from_hours": "x", "duration_to_hours": 2, "multiplier": 3.0},
+            {"rule_type": "TIME", "start_time": "25:00", "end_time": "26:00", "modifier": 3.0},
+            {"rule_type": "DURATION", "duration_from_hours": 0, "duration_to_hours": 1, "multiplier": 2.0},
+        ]
+        with self.assertLogs('parkings.tariffs', 'WARNING') as logs:
+            self.assertQuote(config(type='HOURLY_VARIABLE', flex_rules=rules), at(10), 120, '7.50')
+        self.assertEqual(len(logs.output), 2)
+
+    def test_unreadable_config_falls_back(self):
+        self.assertQuote('not json', at(10), 60, '2.00')
+
+
+class ParkingStatsTests(TestCase):
+    """Parking counters and daily stats (parkings/stats.py)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = CustomUser.objects.create_user(email='driver@example.com')
+        cls.parking = Parking.objects.create(name='P', city=CITY, address='Via Roma')
+        cls.vehicles = [Vehicle.objects.create(user=cls.driver, plate=f'AB{i:03d}CD') for i in range(3)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.driver)
+
+    def start(self, vehicle, minutes=60):
+        response = self.client.post('/api/sessions/', {
+            'vehicle_id': vehicle.pk, 'parking_lot_id': self.parking.pk, 'duration_purchased_minutes': minutes,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return ParkingSession.objects.get(pk=response.data['id'])
+
+    def end(self, session):
+        return self.client.post(f'/api/sessions/{session.pk}/end_session/')
+
+    def counters(self):
+        self.parking.refresh_from_db()
+        return self.parking.active_sessions_count
+
+    def daily(self):
+        return ParkingDailyStats.objects.get(parking=self.parking, date=timezone.localdate())
+
+    def test_start_increments(self):
+        first = self.start(self.vehicles[0])
+        second = self.start(self.vehicles[1], minutes=120)
+        self.assertEqual(self.counters(), 2)
+        stats = self.daily()
+        self.assertEqual(stats.entries, 2)
+        self.assertEqual(stats.revenue, first.total_cost + second.total_cost)
+
+    def test_end_decrements_once(self):
+        session = self.start(self.vehicles[0])
+        self.start(self.vehicles[1])
+        self.assertEqual(self.end(session).status_code, 200)
+        self.assertEqual(self.end(session).status_code, 400)
+        self.assertEqual(self.counters(), 1)
+        # Ending does not touch the day's entries
+        self.assertEqual(self.daily().entries, 2)
+
+    def test_stale_copy_ends_once(self):
+        """Two requests holding the same active session: only the first closes it"""
+        session = self.start(self.vehicles[0])
+        stale = ParkingSession.objects.get(pk=session.pk)
+        self.assertTrue(session.end_session())
+        self.assertFalse(stale.end_session())
+        self.assertFalse(stale.is_active)
+
+    def test_end_after_expiry_sweep(self):
+        from vehicles.expiry import expire_overdue_sessions
+
+        session = self.start(self.vehicles[0])
+        stale = ParkingSession.objects.get(pk=session.pk)
+        self.assertEqual(expire_overdue_sessions(now=timezone.now() + timedelta(days=1)), 1)
+        self.assertEqual(self.counters(), 0)
+        self.assertFalse(stale.end_session())
+        self.assertEqual(self.counters(), 0)
+
+    def test_batch_end(self):
+        for vehicle in self.vehicles:
+            self.start(vehicle)
+        record_sessions_ended([self.parking.pk, self.parking.pk, None])
+        self.assertEqual(self.counters(), 1)
+
+    def test_record_session_started_without_parking(self):
+        session = ParkingSession(user=self.driver, start_time=timezone.now())
+        record_session_started(session)
+        self.assertFalse(ParkingDailyStats.objects.exists())
+
+    def test_spots_count_follows_spots(self):
+        other = Parking.objects.create(name='Q', city=CITY, address='Via Roma')
+        spots = [Spot.objects.create(parking=self.parking, number=str(i)) for i in range(3)]
+        Spot.objects.create(parking=other, number='1')
+        self.parking.refresh_from_db()
+        self.assertEqual(self.parking.spots_count, 3)
+
+        spots[0].delete()
+        self.parking.refresh_from_db()
+        self.assertEqual(self.parking.spots_count, 2)
+        # A queryset delete sends post_delete for each spot
+        Spot.objects.filter(parking=self.parking).delete()
+        self.parking.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.parking.spots_count, other.spots_count), (0, 1))
+
+        # bulk_create sends no signal: the rebuild recounts
+        Spot.objects.bulk_create(Spot(parking=self.parking, number=str(i)) for i in range(2))
+        self.parking.refresh_from_db()
+        self.assertEqual(self.parking.spots_count, 0)
+        call_command('rebuild_parking_stats', stdout=StringIO())
+        self.parking.refresh_from_db()
+        self.assertEqual(self.parking.spots_count, 2)
+
+    def test_rebuild_after_drift(self):
+        Spot.objects.create(parking=self.parking, number='1')
+        first = self.start(self.vehicles[0])
+        second = self.start(self.vehicles[1])
+        yesterday = timezone.now() - timedelta(days=1)
+        ParkingSession.objects.create(user=self.driver, vehicle=self.vehicles[2], parking_lot=self.parking,
+                                      start_time=yesterday, end_time=yesterday, is_active=False,
+                                      total_cost=Decimal('4.00'))
+        # Drift: writes that bypassed the counters
+        Parking.objects.filter(pk=self.parking.pk).update(active_sessions_count=7, spots_count=0)
+        ParkingDailyStats.objects.all().delete()
+
+        out = StringIO()
+        call_command('rebuild_parking_stats', stdout=out)
+        self.assertIn('2 daily stats rows', out.getvalue())
+        self.parking.refresh_from_db()
+        self.assertEqual((self.parking.active_sessions_count, self.parking.spots_count), (2, 1))
+        self.assertEqual((self.daily().entries, self.daily().revenue), (2, first.total_cost + second.total_cost))
+        older = ParkingDailyStats.objects.get(parking=self.parking, date=timezone.localdate(yesterday))
+        self.assertEqual((older.entries, older.revenue), (1, Decimal('4.00')))
+
+
+class DashboardMetricsTests(TestCase):
+    """DashboardMetrics rollup (parkings/metrics.py)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        driver = CustomUser.objects.create_user(email='driver@example.com')
+        milano = Parking.objects.create(name='M', city='Milano', address='Via Roma')
+        roma = Parking.objects.create(name='R', city='Roma', address='Via Milano')
+        vehicle = Vehicle.objects.create(user=driver, plate='AB123CD')
+
+        def session(parking, start, cost):
+            return ParkingSession.objects.create(
+                user=driver, vehicle=vehicle, parking_lot=parking, start_time=start,
+                end_time=start + timedelta(hours=1), is_active=False, total_cost=Decimal(cost),
+            )
+
+        session(milano, at(10, day=15), '10.00')
+        # Nothing on the 16th
+        milano_session = session(milano, at(9, day=17), '2.50')
+        session(roma, at(11, day=17), '4.00')
+        Fine.objects.create(vehicle=vehicle, session=milano_session, amount=Decimal('50.00'), issued_at=at(10, day=17))
+        Fine.objects.create(vehicle=vehicle, amount=Decimal('30.00'), issued_at=at(10, day=17))
+
+    def rows(self):
+        return {
+            (row['date'].day, row['city']): row
+            for row in DashboardMetrics.objects.values(
+                'date', 'city', 'sessions_started', 'revenue', 'revenue_total',
+                'fines_issued', 'fines_amount', 'open_violations',
+            )
+        }
+
+    def test_per_city_figures(self):
+        refresh_dashboard_metrics(days=None, now=at(12, day=17))
+        rows = self.rows()
+        milano, roma, no_city = rows[17, 'Milano'], rows[17, 'Roma'], rows[17, '']
+        self.assertEqual((milano['sessions_started'], milano['revenue']), (1, Decimal('2.50')))
+        self.assertEqual((milano['fines_issued'], milano['fines_amount']), (1, Decimal('50.00')))
+        self.assertEqual((roma['sessions_started'], roma['revenue'], roma['fines_issued']), (1, Decimal('4.00'), 0))
+        # The fine without a session has no city
+        self.assertEqual((no_city['fines_issued'], no_city['fines_amount']), (1, Decimal('30.00')))
+        self.assertEqual((milano['open_violations'], no_city['open_violations']), (1, 1))
+
+    def test_revenue_total_carried_forward(self):
+        refresh_dashboard_metrics(days=None, now=at(12, day=17))
+        rows = self.rows()
+        self.assertEqual(rows[15, 'Milano']['revenue_total'], Decimal('10.00'))
+        self.assertEqual((rows[16, 'Milano']['sessions_started'], rows[16, 'Milano']['revenue_total']),
+                         (0, Decimal('10.00')))
+        self.assertEqual(rows[17, 'Milano']['revenue_total'], Decimal('12.50'))
+        self.assertEqual(rows[17, 'Roma']['revenue_total'], Decimal('4.00'))
+
+    def test_refresh_is_idempotent(self):
+        refresh_dashboard_metrics(days=None, now=at(12, day=17))
+        full = self.rows()
+        # The default window carries the total forward from the stored day before
+        refresh_dashboard_metrics(now=at(12, day=17))
+        self.assertEqual(self.rows(), full)
+        refresh_dashboard_metrics(now=at(12, day=17))
+        self.assertEqual(self.rows(), full)
+        # Without a stored day before, the window starts from the session history
+        DashboardMetrics.objects.filter(date__lt=at(0, day=16)).delete()
+        refresh_dashboard_metrics(now=at(12, day=17))
+        self.assertEqual(self.rows(), {key: row for key, row in full.items() if key[0] != 15})
+
+    def test_current_metrics_show_the_last_snapshot(self):
+        """The admin home never refreshes inline: until the job runs, yesterday's snapshot is shown"""
+        refresh_dashboard_metrics(days=1, now=timezone.now() - timedelta(days=1))
+        with self.assertNumQueries(1):
+            metrics = current_metrics()
+        self.assertFalse(DashboardMetrics.objects.filter(date=timezone.localdate()).exists())
+        self.assertEqual(metrics['revenue_total'], Decimal('16.50'))
+        self.assertEqual(metrics['open_violations'], 2)
+        self.assertEqual((metrics['sessions_started'], metrics['fines_issued']), (0, 0))
+        self.assertIsNotNone(metrics['refreshed_at'])
+
+        refresh_dashboard_metrics()
+        self.assertEqual(current_metrics()['revenue_total'], Decimal('16.50'))
+
+
+class ParkingGeometryTests(TestCase):
+    """Derived geometry columns of Parking, kept in sync on save"""
+
+    SQUARE = [{'lat': 45.0, 'lng': 9.0}, {'lat': 45.0, 'lng': 9.2}, {'lat': 45.2, 'lng': 9.2}, {'lat': 45.2, 'lng': 9.0}]
+
+    def stored(self, parking, *fields):
+        return tuple(Parking.objects.filter(pk=parking.pk).values_list(*fields).get())
+
+    def assertPoint(self, point, expected):
+        for value, expected_value in zip(point, expected, strict=True):
+            self.assertAlmostEqual(value, expected_value)
+
+    def test_update_fields_polygon_saves_derived_columns(self):
+        parking = Parking.objects.create(name='P', city=CITY, address='Via Roma')
+        self.assertEqual(self.stored(parking, 'min_latitude', 'marker_latitude'), (None, None))
+
+        parking.polygon_coordinates = self.SQUARE
+        parking.save(update_fields=['polygon_coordinates'])
+        self.assertEqual(self.stored(parking, 'min_latitude', 'min_longitude', 'max_latitude', 'max_longitude'),
+                         (45.0, 9.0, 45.2, 9.2))
+        self.assertPoint(self.stored(parking, 'centroid_latitude', 'centroid_longitude'), (45.1, 9.1))
+        # No entrance nor lat/lng: the marker sits on the centroid
+        self.assertPoint(self.stored(parking, 'marker_latitude', 'marker_longitude'), (45.1, 9.1))
+
+    def test_legacy_json_text(self):
+        parking = Parking(name='P', city=CITY, address='Via Roma', polygon_coordinates=json.dumps(self.SQUARE))
+        parking.save()
+        self.assertEqual(parking.polygon_coordinates, self.SQUARE)
+        self.assertEqual(self.stored(parking, 'max_latitude', 'max_longitude'), (45.2, 9.2))
+
+    def test_unrelated_update_fields_leave_geometry_alone(self):
+        parking = Parking.objects.create(name='P', city=CITY, address='Via Roma', polygon_coordinates=self.SQUARE)
+        Parking.objects.filter(pk=parking.pk).update(min_latitude=0.0)
+        parking.name = 'Renamed'
+        parking.save(update_fields=['name'])
+        self.assertEqual(self.stored(parking, 'name', 'min_latitude'), ('Renamed', 0.0))
+
+    def test_entrances_move_the_marker(self):
+        parking = Parking.objects.create(name='P', city=CITY, address='Via Roma', latitude=45.5, longitude=9.5)
+        self.assertEqual(self.stored(parking, 'marker_latitude', 'marker_longitude'), (45.5, 9.5))
+
+        first = ParkingEntrance.objects.create(parking=parking, address_line='A', latitude=45.1, longitude=9.1)
+        self.assertEqual(self.stored(parking, 'marker_latitude', 'marker_longitude'), (45.1, 9.1))
+        second = ParkingEntrance.objects.create(parking=parking, address_line='B', latitude=45.2, longitude=9.2)
+        # The first entrance keeps the marker
+        self.assertEqual(self.stored(parking, 'marker_latitude', 'marker_longitude'), (45.1, 9.1))
+
+        first.delete()
+        self.assertEqual(self.stored(parking, 'marker_latitude', 'marker_longitude'), (45.2, 9.2))
+        second.delete()
+        self.assertEqual(self.stored(parking, 'marker_latitude', 'marker_longitude'), (45.5, 9.5))
+
+
+class ParkingMapSearchTests(TestCase):
+    """GET /api/parkings/search_map/ viewport modes (parkings/geo.py)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = CustomUser.objects.create_user(email='driver@example.com')
+
+        def parking(name, lat, lng, polygon=()):
+            return Parking.objects.create(name=name, city=CITY, address='Via Roma', latitude=lat, longitude=lng,
+                                          polygon_coordinates=[{'lat': a, 'lng': b} for a, b in polygon])
+
+        cls.duomo = parking('Duomo', 45.464, 9.190)
+        # Marker far from the centre, but the lot reaches into it
+        cls.wide = parking('Wide', 45.500, 9.300, polygon=[(45.465, 9.195), (45.500, 9.300), (45.500, 9.195)])
+        cls.brera = parking('Brera', 45.468, 9.190)
+        cls.monza = parking('Monza', 45.584, 9.274)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.driver)
+
+    def search(self, **params):
+        return self.client.get('/api/parkings/search_map/', params)
+
+    def names(self, **params):
+        response = self.search(**params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [parking['name'] for parking in response.data]
+
+    def test_bbox(self):
+        self.assertEqual(sorted(self.names(bbox='45.460,9.180,45.466,9.200')), ['Duomo', 'Wide'])
+        self.assertEqual(sorted(self.names(bbox='45.467,9.185,45.469,9.192')), ['Brera'])
+        self.assertEqual(self.names(bbox='45.000,8.000,45.100,8.100'), [])
+
+    def test_polygon_overlapping_the_box(self):
+        wide = self.search(bbox='45.464,9.194,45.466,9.196').data
+        self.assertEqual([parking['name'] for parking in wide], ['Wide'])
+        # The marker itself lies outside the box
+        self.assertEqual((wide[0]['marker_latitude'], wide[0]['marker_longitude']), (45.5, 9.3))
+
+    def test_near_ordered_by_distance(self):
+        self.assertEqual(self.names(near='45.464,9.190', radius_m='1000'), ['Duomo', 'Wide', 'Brera'])
+        # Wide's edge is about 400 m away, Brera about 445 m
+        self.assertEqual(self.names(near='45.464,9.190', radius_m='420'), ['Duomo', 'Wide'])
+        self.assertEqual(self.names(near='45.464,9.190', radius_m='50'), ['Duomo'])
+        # Default radius: 500 m
+        self.assertEqual(self.names(near='45.464,9.190'), ['Duomo', 'Wide', 'Brera'])
+
+    def test_invalid_parameters(self):
+        for params in (
+            {'bbox': '45.46,9.18,45.47'},
+            {'bbox': '45.47,9.18,45.46,9.20'},
+            {'bbox': '95,9.18,96,9.20'},
+            {'bbox': 'a,b,c,d'},
+            {'near': '45.46'},
+            {'near': '45.46,9.19', 'radius_m': 'far'},
+            {'near': '45.46,9.19', 'radius_m': '0'},
+            {'near': '45.46,9.19', 'radius_m': '100000'},
+        ):
+            with self.subTest(**params):
+                response = self.search(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('detail', response.data)
+
+
+class ParkingQuoteTests(TestCase):
+    """GET /api/parkings/{id}/quote/"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = CustomUser.objects.create_user(email='driver@example.com')
+        cls.parking = Parking.objects.create(name='P', city=CITY, address='Via Roma',
+                                             tariff_config_json=DEFAULT_TARIFF_JSON)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.driver)
+
+    def quote(self, parking=None, **params):
+        return self.client.get(f'/api/parkings/{(parking or self.parking).pk}/quote/', params)
+
+    def prices(self, **params):
+        response = self.quote(**params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return {q['duration_minutes']: q['price'] for q in response.data['quotes']}
+
+    def test_price_table(self):
+        start = at(10)
+        response = self.quote(durations='30,60,120', start=start.isoformat())
+        self.assertEqual(response.data['parking_id'], self.parking.pk)
+        self.assertEqual(response.data['start_time'], start)
+        self.assertEqual([q['duration_minutes'] for q in response.data['quotes']], [30, 60, 120])
+        self.assertEqual(response.data['quotes'][1]['price'], '2.50')
+        # The price a session of that length is charged
+        for quote in response.data['quotes']:
+            self.assertEqual(quote['price'],
+                             str(calculate_prepaid_cost(self.parking, quote['duration_minutes'], start)))
+
+    def test_start_time_changes_the_price(self):
+        evening = self.prices(durations='600', start=at(20).isoformat())
+        self.assertEqual(evening[600], str(compile_tariff(DEFAULT_TARIFF_JSON).quote(600, at(20))))
+        # Naive datetimes are local time
+        self.assertEqual(self.prices(durations='600', start='2026-06-15T20:00:00'), evening)
+
+    def test_follows_tariff_edits(self):
+        self.assertEqual(self.prices(durations='60', start=at(10).isoformat()), {60: '2.50'})
+        self.parking.tariff_config_json = config(day_base_rate=4.0)
+        self.parking.save()
+        self.assertEqual(self.prices(durations='60', start=at(10).isoformat()),
+                         {60: str(compile_tariff(config(day_base_rate=4.0)).quote(60, at(10)))})
+
+    def test_no_tariff_is_free(self):
+        free = Parking.objects.create(name='F', city=CITY, address='Via Roma', tariff_config_json='')
+        response = self.quote(parking=free, durations='30,60')
+        self.assertEqual([q['price'] for q in response.data['quotes']], ['0.00', '0.00'])
+
+    def test_invalid_parameters(self):
+        for params in ({}, {'durations': 'a,b'}, {'durations': '0'}, {'durations': str(7 * 24 * 60 + 1)},
+                       {'durations': ','.join(['30'] * 51)}, {'durations': '30', 'start': 'tomorrow'}):
+            with self.subTest(**params):
+                self.assertEqual(self.quote(**params).status_code, 400)
+
+
+class ParkingQueryCountTests(QueryCountTestCase):
+    """Parking endpoints run the same number of queries with N and 10 x N rows"""
+
+    def first_parking(self):
+        return Parking.objects.order_by('id').first().pk
+
+    def test_parking_list(self):
+        self.assertConstantQueries(self.driver, '/api/parkings/')
+
+    def test_parking_list_manager(self):
+        self.assertConstantQueries(self.manager, f'/api/parkings/?city={CITY}')
+
+    def test_parking_list_paginated(self):
+        self.assertConstantQueries(self.driver, '/api/parkings/?page_size=50')
+
+    def test_parking_export(self):
+        self.assertConstantQueries(self.manager, '/api/parkings/export/')
+
+    def test_parking_detail(self):
+        self.assertConstantQueries(self.driver, lambda: f'/api/parkings/{self.first_parking()}/')
+
+    def test_parking_spots(self):
+        self.assertConstantQueries(self.manager, lambda: f'/api/parkings/{self.first_parking()}/spots/')
+
+    def test_parking_sessions(self):
+        self.assertConstantQueries(self.manager, lambda: f'/api/parkings/{self.first_parking()}/sessions/')
+
+    def test_parking_quote(self):
+        self.assertConstantQueries(self.driver, lambda: f'/api/parkings/{self.first_parking()}/quote/?durations=30,60,120')
+
+    def test_search_map(self):
+        self.assertConstantQueries(self.driver, f'/api/parkings/search_map/?city={CITY}')
+
+    def test_search_map_near(self):
+        self.assertConstantQueries(self.driver, '/api/parkings/search_map/?near=45.46,9.19&radius_m=1000')
+
+    def test_spot_list(self):
+        self.assertConstantQueries(self.manager, '/api/spots/')
+
+    def test_spot_export(self):
+        self.assertConstantQueries(self.manager, '/api/spots/export/')
+
+    def test_city_list(self):
+        self.assertConstantQueries(self.admin, '/api/cities/')
+
+    def test_city_list_with_coordinates(self):
+        self.assertConstantQueries(self.admin, '/api/cities/list_with_coordinates/')
+
+    def test_authorized_cities(self):
+        self.assertConstantQueries(self.admin, '/api/cities/authorized/')
+
+    def test_admin_changelists(self):
+        self.assertConstantChangelists('parkings')
@@ -2,13 +2,16 @@ from os import path
 from rest_framework import viewsets, permissions
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from django.db.models import Count, Q, OuterRef, Subquery, IntegerField, DecimalField, Sum, Value
+from django.db.models import F, FilteredRelation, Q, DecimalField, Value
 from django.db.models.functions import Coalesce
 from django.utils import timezone
 from decimal import Decimal
 from datetime import timedelta
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from .models import Parking, Spot, City
+from . import geo
+from .tariffs import get_tariff_plan, parse_durations
 from .serializers import ParkingMapSerializer, ParkingSerializer, SpotSerializer, CitySerializer
 from vehicles.models import ParkingSession
 from vehicles.serializers import ParkingSessionSerializer
@@ -16,50 +19,31 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.pagination import LimitOffsetPagination
+from tps_backend.pagination import KeysetPagination
+from tps_backend.export import NDJSONExportMixin
 
-class ParkingViewSet(viewsets.ModelViewSet):
+def _can_export(user):
+    return user.is_superuser or getattr(user, 'role', None) in ('manager', 'superuser')
+
+
+class ParkingViewSet(NDJSONExportMixin, viewsets.ModelViewSet):
     serializer_class = ParkingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering = ('id',)
 
 
     def get_queryset(self):
-        today = timezone.now().date()
-
-        
-        active_sessions_qs = ParkingSession.objects.filter(
-            parking_lot=OuterRef('pk'),
-            is_active=True
-        ).values('parking_lot').annotate(cnt=Count('id')).values('cnt')
+        today = timezone.localdate()
 
-        
-        today_entries_qs = ParkingSession.objects.filter(
-            parking_lot=OuterRef('pk'),
-            start_time__date=today
-        ).values('parking_lot').annotate(cnt=Count('id')).values('cnt')
-        
-       
-        today_revenue_qs = ParkingSession.objects.filter(
-            parking_lot=OuterRef('pk'),
-            start_time__date=today
-        ).values('parking_lot').annotate(total=Sum('total_cost')).values('total')
-
-       
-        queryset = Parking.objects.annotate(
-            annotated_total_spots=Count('spots', distinct=True),
-            
-            annotated_occupied_spots=Coalesce(
-                Subquery(active_sessions_qs, output_field=IntegerField()), 
-                0
-            ),
-            
-            annotated_today_entries=Coalesce(
-                Subquery(today_entries_qs, output_field=IntegerField()), 
-                0
-            ),
-            
+        # Counters are maintained incrementally (parkings/stats.py): the list
+        # is a plain read plus one indexed join on today's stats row
+        queryset = Parking.objects.prefetch_related('entrances').annotate(
+            today_stats=FilteredRelation('daily_stats', condition=Q(daily_stats__date=today)),
+        ).annotate(
+            annotated_today_entries=Coalesce(F('today_stats__entries'), 0),
             annotated_today_revenue=Coalesce(
-                Subquery(today_revenue_qs, output_field=DecimalField()), 
+                F('today_stats__revenue'),
                 Value(Decimal('0.00'), output_field=DecimalField()),
                 output_field=DecimalField()
             )
@@ -99,6 +83,13 @@ class ParkingViewSet(viewsets.ModelViewSet):
         
         serializer.save()
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Full parking list as NDJSON, for managers"""
+        if not _can_export(request.user):
+            return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
+        return self.stream_ndjson(self.get_queryset().order_by('id'), 'parkings.ndjson')
+
     @action(detail=True, methods=['get'])
     def spots(self, request, pk=None):
         parking = self.get_object()
@@ -108,14 +99,63 @@ class ParkingViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def sessions(self, request, pk=None):
-        sessions = ParkingSession.objects.filter(parking_lot_id=pk, is_active=True).order_by('-start_time')
+        sessions = ParkingSession.objects.filter(
+            parking_lot_id=pk, is_active=True
+        ).select_related('vehicle', 'parking_lot').order_by('-start_time')
         serializer = ParkingSessionSerializer(sessions, many=True)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def quote(self, request, pk=None):
+        """
+        Price table for the duration picker, from the cached tariff plan.
+          ?durations=15,30,60,120[&start=ISO datetime, default now]
+        """
+        try:
+            durations = parse_durations(request.query_params.get('durations', ''))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        start_param = request.query_params.get('start')
+        start_time = timezone.now()
+        if start_param:
+            try:
+                start_time = parse_datetime(start_param)
+            except ValueError:
+                start_time = None
+            if start_time is None:
+                return Response({"detail": "start must be an ISO 8601 datetime."}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(start_time):
+                start_time = timezone.make_aware(start_time)
+
+        parking = self.get_object()
+        if parking.tariff_config_json:
+            prices = get_tariff_plan(parking).quote_many(durations, start_time)
+        else:
+            # Same rule as calculate_prepaid_cost: no tariff, no charge
+            prices = [Decimal('0.00')] * len(durations)
+
+        return Response({
+            "parking_id": parking.id,
+            "start_time": start_time,
+            "quotes": [
+                {"duration_minutes": d, "price": str(price)}
+                for d, price in zip(durations, prices)
+            ],
+        })
+
     @action(detail=False, methods=['get'])
     def search_map(self, request):
+        """
+        Parkings to draw on the map.
+        Optional viewport modes, answered by the extent GiST index:
+          ?bbox=minLat,minLng,maxLat,maxLng
+          ?near=lat,lng&radius_m=500
+        """
         user = self.request.user
         city_param = self.request.query_params.get('city')
+        bbox_param = self.request.query_params.get('bbox')
+        near_param = self.request.query_params.get('near')
         queryset = Parking.objects.all().defer('tariff_config_json') 
         if not user.is_superuser and hasattr(user, 'role') and (user.role == 'manager'):
             allowed = getattr(user, 'allowed_cities', [])
@@ -125,13 +165,42 @@ class ParkingViewSet(viewsets.ModelViewSet):
                 return Response([])
         if city_param:
             queryset = queryset.filter(city__icontains=city_param)
+
+        near = None
+        try:
+            if bbox_param:
+                bbox = geo.parse_bbox(bbox_param)
+            elif near_param:
+                near = geo.parse_near(near_param, self.request.query_params.get('radius_m'))
+                bbox = geo.radius_bbox(*near)
+            else:
+                bbox = None
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if bbox:
+            queryset = queryset.filter(geo.Overlaps(geo.extent_box(), geo.query_box(*bbox)))
+
+        if near:
+            lat, lng, radius = near
+            with_distance = []
+            for parking in queryset:
+                extent = (parking.min_latitude, parking.min_longitude, parking.max_latitude, parking.max_longitude)
+                distance = geo.distance_to_extent_m(lat, lng, extent)
+                if distance <= radius:
+                    with_distance.append((distance, parking))
+            with_distance.sort(key=lambda item: item[0])
+            queryset = [parking for _, parking in with_distance]
+
         serializer = ParkingMapSerializer(queryset, many=True)
         return Response(serializer.data)
 
 
-class SpotViewSet(viewsets.ModelViewSet):
+class SpotViewSet(NDJSONExportMixin, viewsets.ModelViewSet):
     serializer_class = SpotSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering = ('id',)
 
     def get_queryset(self):
         queryset = Spot.objects.all()
@@ -154,6 +223,13 @@ class SpotViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save()
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Full spot list as NDJSON, for managers"""
+        if not _can_export(request.user):
+            return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
+        return self.stream_ndjson(self.get_queryset().order_by('id'), 'spots.ndjson')
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_authorized_cities(request):
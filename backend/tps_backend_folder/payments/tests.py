@@ -1,3 +1,7 @@
-from django.test import TestCase
+from tps_backend.testing import QueryCountTestCase
 
-# Create your tests here.
+
+class PaymentQueryCountTests(QueryCountTestCase):
+
+    def test_card_list(self):
+        self.assertConstantQueries(self.driver, '/api/payments/cards/')
@@ -1,71 +1,16 @@
-from django.utils import timezone
-from django.db.models import Sum
-from vehicles.models import Fine, ParkingSession, GlobalSettings
-from users.models import CustomUser
+from vehicles.models import GlobalSettings
+from users.activity import recent_activity
+from parkings.metrics import current_metrics
 
 def dashboard_callback(request, context):
-    now = timezone.now()
-    today = now.date()
+    # Counters come from the DashboardMetrics rollup (parkings/metrics.py),
+    # refreshed by a scheduled job: one small query whatever the history
+    metrics = current_metrics()
 
-    total_users = CustomUser.objects.filter(role='user').count()
-    new_users_today = CustomUser.objects.filter(role='user').filter(date_joined__date=today).count()
-    active_sessions = ParkingSession.objects.filter(is_active=True).count()
+    # Latest events from the ActivityLog feed (users/activity.py), one query
+    final_activity = recent_activity(10)
 
-    all_revenue = ParkingSession.objects.aggregate(sum=Sum('total_cost'))['sum'] or 0
-    today_revenue = ParkingSession.objects.filter(start_time__date=today).aggregate(sum=Sum('total_cost'))['sum'] or 0
-
-    active_violations_count = Fine.objects.exclude(status__in=['paid', 'cancelled']).count()
-    pending_disputes = Fine.objects.filter(status='disputed').count()
-
-    activity_feed = []
-
-    recent_users = CustomUser.objects.filter(role='user').order_by('-date_joined')[:5]
-    for user in recent_users:
-        activity_feed.append({
-            'type': 'user',
-            'timestamp': user.date_joined,
-            'identifier': user.email,
-            'title': 'New User',
-            'amount': None,
-        })
-
-    recent_sessions = ParkingSession.objects.select_related('vehicle').order_by('-start_time')[:5]
-    for session in recent_sessions:
-        plate = session.vehicle.plate if session.vehicle else "Unknown"
-        activity_feed.append({
-            'type': 'session',
-            'timestamp': session.start_time,
-            'identifier': plate,
-            'title': 'Session Started',
-            'amount': session.total_cost, 
-        })
-
-    recent_paid_fines = Fine.objects.filter(status='paid', paid_at__isnull=False).select_related('vehicle').order_by('-paid_at')[:5]
-    for fine in recent_paid_fines:
-        plate = fine.vehicle.plate if fine.vehicle else "Unknown"
-        activity_feed.append({
-            'type': 'fine_payment',
-            'timestamp': fine.paid_at,
-            'identifier': plate,
-            'title': 'Fine Paid',
-            'amount': fine.amount,
-        })
-
-    recent_issued_fines = Fine.objects.select_related('vehicle').order_by('-issued_at')[:5]
-    for fine in recent_issued_fines:
-        plate = fine.vehicle.plate if fine.vehicle else "Unknown"
-        activity_feed.append({
-            'type': 'fine_issued',
-            'timestamp': fine.issued_at,
-            'identifier': plate,
-            'title': 'Violation Issued',
-            'amount': fine.amount,
-        })
-
-    activity_feed.sort(key=lambda x: x['timestamp'], reverse=True)
-    final_activity = activity_feed[:10]
-
-    system_config = GlobalSettings.objects.first()
+    system_config = GlobalSettings.get_active()
 
     if not system_config:
         violation_types = []
@@ -76,13 +21,14 @@ def dashboard_callback(request, context):
 
     context.update({
         "stats": {
-            "total_users": total_users,
-            "new_users_today": new_users_today,
-            "active_sessions": active_sessions,
-            "all_revenue": round(all_revenue, 2),
-            "today_revenue": round(today_revenue, 2),
-            "active_violations_count": active_violations_count,
-            "pending_disputes": pending_disputes,
+            "total_users": metrics['users_total'],
+            "new_users_today": metrics['new_users'],
+            "active_sessions": metrics['active_sessions'],
+            "all_revenue": round(metrics['revenue_total'], 2),
+            "today_revenue": round(metrics['revenue'], 2),
+            "active_violations_count": metrics['open_violations'],
+            "pending_disputes": metrics['pending_disputes'],
+            "refreshed_at": metrics['refreshed_at'],
         },
         "recent_activity": final_activity,
         "system_config": system_config,
@@ -0,0 +1,26 @@
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class NDJSONExportMixin:
+    """
+    Streams a queryset as newline-delimited JSON, one serialized object per
+    line, reading the database in chunks so memory stays flat however large
+    the table is.
+    """
+    export_chunk_size = 500
+
+    def stream_ndjson(self, queryset, filename):
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+
+        def rows():
+            for obj in queryset.iterator(chunk_size=self.export_chunk_size):
+                data = serializer_class(obj, context=context).data
+                yield json.dumps(data, cls=JSONEncoder) + '\n'
+
+        response = StreamingHttpResponse(rows(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -0,0 +1,96 @@
+"""
+Server-side downscaling of uploaded photos (OCR input, fine evidence).
+
+Clients are expected to send photos already scaled so that the longest side
+is at most settings.UPLOAD_IMAGE_MAX_DIMENSION pixels (the officer app does,
+see the "_scaled_" file names under fines/). Such uploads pass through
+untouched; anything larger is decoded at reduced size and re-encoded as JPEG.
+
+Memory stays bounded for large files: Pillow reads only the header on open,
+JPEG draft mode decodes straight to 1/2, 1/4 or 1/8 scale, and uploads over
+Django's in-memory limit are read from their temporary file.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def _limits():
+    return (
+        getattr(settings, 'UPLOAD_IMAGE_MAX_DIMENSION', 1600),
+        getattr(settings, 'UPLOAD_IMAGE_JPEG_QUALITY', 85),
+        getattr(settings, 'UPLOAD_IMAGE_MAX_PIXELS', 64_000_000),
+    )
+
+
+def _open(uploaded):
+    uploaded.seek(0)
+    try:
+        img = Image.open(uploaded)
+    except (UnidentifiedImageError, OSError):
+        raise InvalidImage("Uploaded file is not a valid image.")
+    except Image.DecompressionBombError:
+        raise InvalidImage("Uploaded image is too large.")
+    return img
+
+
+def _resize_to_jpeg(img, max_dimension, quality):
+    try:
+        if img.format == 'JPEG':
+            # Decoder-side reduction: never materializes the full-size bitmap
+            img.draft('RGB', (max_dimension, max_dimension))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_dimension, max_dimension), Image.LANCZOS, reducing_gap=3.0)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        out = io.BytesIO()
+        img.save(out, format='JPEG', quality=quality, optimize=True)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise InvalidImage("Uploaded file is not a valid image.")
+    finally:
+        img.close()
+    return out.getvalue()
+
+
+def downscale_image(uploaded):
+    """
+    Return ``uploaded`` itself when it already fits, else a ContentFile
+    holding the downscaled JPEG (named after the upload, with .jpg).
+    Raises InvalidImage for files Pillow cannot read.
+    """
+    max_dimension, quality, max_pixels = _limits()
+    img = _open(uploaded)
+    width, height = img.size
+    if width * height > max_pixels:
+        raise InvalidImage("Uploaded image is too large.")
+
+    orientation = img.getexif().get(0x0112, 1)
+    if max(width, height) <= max_dimension and orientation == 1:
+        uploaded.seek(0)
+        return uploaded
+
+    name = os.path.splitext(os.path.basename(uploaded.name or 'upload'))[0] + '.jpg'
+    return ContentFile(_resize_to_jpeg(img, max_dimension, quality), name=name)
+
+
+def read_downscaled(uploaded):
+    """Bytes, file name and content type of the (downscaled) upload"""
+    image = downscale_image(uploaded)
+    if image is uploaded:
+        return uploaded.read(), uploaded.name, getattr(uploaded, 'content_type', None)
+    return image.read(), image.name, 'image/jpeg'
+
+
+def make_thumbnail(image_file, size=None):
+    """JPEG thumbnail (ContentFile) of a stored or uploaded image"""
+    size = size or getattr(settings, 'EVIDENCE_THUMBNAIL_SIZE', 320)
+    _, quality, _ = _limits()
+    return ContentFile(_resize_to_jpeg(_open(image_file), size, quality), name='thumbnail.jpg')
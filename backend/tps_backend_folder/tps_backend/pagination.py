@@ -0,0 +1,38 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination on a stable ordering.
+
+    The mobile apps still expect a bare list, so a response is paginated only
+    when the client asks for it with ?page_size= or follows a ?cursor= link,
+    unless ``paginate_by_default`` is set.
+    Views pick their ordering with a ``cursor_ordering`` attribute.
+
+    As with DRF's CursorPagination, the cursor holds only the value of the
+    first ordering field, plus an offset that counts the rows already served
+    with that same value. The other fields are not part of the cursor. They
+    make the order of tied rows deterministic, so end the ordering with a
+    unique field (e.g. ('-start_time', '-id')) or tied rows may be skipped or
+    repeated. Each tie costs an OFFSET scan, so lead with an indexed field
+    that rarely repeats.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('-id',)
+    paginate_by_default = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if (not self.paginate_by_default
+                and self.cursor_query_param not in params and self.page_size_query_param not in params):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', self.ordering)
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
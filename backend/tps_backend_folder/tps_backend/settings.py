@@ -114,6 +114,24 @@ PASSWORD_HASHERS = [
 ]
 
 MEDIA_URL = '/media/'
+# Uploads live next to manage.py (fines/...) unless overridden
+MEDIA_ROOT = os.environ.get("MEDIA_ROOT", str(BASE_DIR))
+
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    # Fine evidence and thumbnails: content-addressed, cacheable forever
+    "evidence": {
+        "BACKEND": "tps_backend.storage.ContentAddressedStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+# Longest side of fine evidence thumbnails
+EVIDENCE_THUMBNAIL_SIZE = 320
 
 
 LANGUAGE_CODE = 'en-us'
@@ -278,6 +296,23 @@ SIMPLE_JWT = {
     "ROTATE_REFRESH_TOKENS": True,
 }
 
+# In-process index of active sessions for plate checks (vehicles/session_index.py)
+ACTIVE_SESSION_INDEX_ENABLED = os.environ.get("ACTIVE_SESSION_INDEX_ENABLED", "1") == "1"
+# Seconds between background syncs with writes of other processes (0: no sync thread)
+ACTIVE_SESSION_INDEX_SYNC_INTERVAL = float(os.environ.get("ACTIVE_SESSION_INDEX_SYNC_INTERVAL", "2"))
+
+# Uploaded photos are downscaled to this longest side (tps_backend/images.py)
+UPLOAD_IMAGE_MAX_DIMENSION = int(os.environ.get("UPLOAD_IMAGE_MAX_DIMENSION", "1600"))
+UPLOAD_IMAGE_JPEG_QUALITY = int(os.environ.get("UPLOAD_IMAGE_JPEG_QUALITY", "85"))
+
+# Plate OCR (vehicles/ocr.py): "platerecognizer" or the offline "stub"
+PLATE_OCR_PROVIDER = os.environ.get("PLATE_OCR_PROVIDER", "platerecognizer")
+PLATE_OCR_WORKERS = int(os.environ.get("PLATE_OCR_WORKERS", "2"))
+PLATE_OCR_CACHE_SIZE = int(os.environ.get("PLATE_OCR_CACHE_SIZE", "512"))
+PLATE_OCR_CACHE_TTL = int(os.environ.get("PLATE_OCR_CACHE_TTL", "3600"))
+# Jobs unfinished after this many seconds were lost by their worker
+PLATE_OCR_JOB_TIMEOUT = int(os.environ.get("PLATE_OCR_JOB_TIMEOUT", "120"))
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 EMAIL_HOST_USER = 'test@example.com' 
 DEFAULT_FROM_EMAIL = 'TPS Support <test@example.com>'
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""
+Content-addressed media storage.
+
+Files are stored as ``<upload_to dir>/<sha256><ext>``: identical uploads are
+written once and a name never changes content, so the bucket or CDN that
+serves them can cache them forever (Django serves media only with DEBUG).
+This backend writes to the local filesystem with the same contract an
+object store bucket would have.
+"""
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+
+CONTENT_HASH_LENGTH = 64
+
+
+def is_content_addressed(name):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return len(stem) == CONTENT_HASH_LENGTH and all(c in '0123456789abcdef' for c in stem)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        validate_file_name(name, allow_relative_path=True)
+
+        # chunks() rewinds the file, for the hash and again for the write
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+
+        ext = os.path.splitext(name)[1].lower()
+        name = os.path.join(os.path.dirname(name), digest.hexdigest() + ext).replace('\\', '/')
+        validate_file_name(name, allow_relative_path=True)
+        if self.exists(name):
+            # Same bytes already stored
+            return name
+        return self._save(name, content)
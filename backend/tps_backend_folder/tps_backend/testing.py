@@ -0,0 +1,148 @@
+"""
+Query-count regression tests.
+
+Each endpoint is requested once with N rows of every model and once with
+10 x N rows; both requests must execute the same number of queries, so a
+change that reads a relation per row (an N+1) fails the build. The app
+tests.py files subclass QueryCountTestCase and list their endpoints, writes
+included (session start/end, reports, fine payments, shifts, login, OCR).
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib import admin
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+CITY = 'Milano'
+
+
+class QueryCountTestCase(TestCase):
+    N = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        from parkings.models import City
+        from users.models import CustomUser
+        from vehicles.models import GlobalSettings
+
+        City.objects.create(name=CITY, center_latitude=45.4642, center_longitude=9.19)
+        # Every fine counts: keep the driver below the ban threshold
+        GlobalSettings.objects.create(max_violations=1000, grace_period_minutes=15)
+        cls.driver = CustomUser.objects.create_user(email='driver@example.com', role='user')
+        cls.controller = CustomUser.objects.create_user(
+            email='controller@example.com', role='controller', allowed_cities=[CITY])
+        cls.manager = CustomUser.objects.create_user(
+            email='manager@example.com', role='manager', allowed_cities=[CITY])
+        cls.admin = CustomUser.objects.create_superuser(email='admin@example.com', password=None)
+
+    def setUp(self):
+        self.rows = 0
+
+    def populate(self, n):
+        """Add n more rows of every model the endpoints list (names are numbered from self.rows)"""
+        from parkings.models import City, Parking, ParkingEntrance, Spot
+        from payments.models import PaymentCard
+        from users.models import ActivityLog, CustomUser, Shift
+        from vehicles.models import Fine, ParkingSession, PlateOCRJob, Vehicle
+
+        now = timezone.now()
+        for i in range(self.rows, self.rows + n):
+            City.objects.create(name=f'City {i}', center_latitude=45.0, center_longitude=9.0)
+            parking = Parking.objects.create(
+                name=f'P{i}', city=CITY, address='Via Roma', latitude=45.46, longitude=9.19,
+                polygon_coordinates=[{"lat": 45.46, "lng": 9.19}, {"lat": 45.461, "lng": 9.19},
+                                     {"lat": 45.461, "lng": 9.191}],
+            )
+            ParkingEntrance.objects.create(parking=parking, address_line=f'Ingresso {i}', latitude=45.46, longitude=9.19)
+            Spot.objects.create(parking=parking, number=str(i))
+
+            vehicle = Vehicle.objects.create(user=self.driver, plate=f'AB{i:03d}CD', name=f'Car {i}')
+            ParkingSession.objects.create(
+                user=self.driver, vehicle=vehicle, parking_lot=parking, start_time=now - timedelta(days=1),
+                end_time=now - timedelta(days=1, hours=-1), is_active=False, total_cost=Decimal('2.50'),
+            )
+            session = ParkingSession.objects.create(
+                user=self.driver, vehicle=vehicle, parking_lot=parking, start_time=now,
+                planned_end_time=now + timedelta(hours=1), duration_purchased_minutes=60,
+                prepaid_cost=Decimal('2.50'), total_cost=Decimal('2.50'),
+            )
+            Fine.objects.create(vehicle=vehicle, session=session, issued_by=self.controller, amount=Decimal('50.00'))
+
+            officer = CustomUser.objects.create_user(
+                email=f'officer{i}@example.com', role='controller', allowed_cities=[CITY])
+            Shift.objects.create(officer=officer)
+            Shift.objects.create(officer=self.controller, start_time=now - timedelta(days=i + 1),
+                                 end_time=now - timedelta(days=i + 1, hours=-8), status='CLOSED')
+            # Normally written on commit, which TestCase never reaches
+            ActivityLog.objects.create(type='session', title='Session Started', identifier=vehicle.plate,
+                                       city=CITY, user=self.driver)
+            PlateOCRJob.objects.create(user=self.controller, status='done', result={'plate': vehicle.plate})
+            PaymentCard.objects.create(user=self.driver, card_number=f'{i:04d}')
+        self.rows += n
+
+    def reset_caches(self):
+        """Process caches start cold on every measured request"""
+        from parkings.metrics import refresh_dashboard_metrics
+        from vehicles.models import GlobalSettings
+        from vehicles.ocr import result_cache
+        from vehicles.session_index import session_index
+
+        GlobalSettings.invalidate_cache()
+        session_index.clear()
+        result_cache.clear()
+        refresh_dashboard_metrics()
+
+    def count_queries(self, user, method, path, data=None, format=None):
+        """``user`` None sends the request anonymously"""
+        client = APIClient()
+        if path.startswith('/admin/'):
+            client.force_login(user)
+        elif user is not None:
+            client.force_authenticate(user)
+        self.reset_caches()
+        if format is None and method != 'get':
+            format = 'json'
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(path, data, format=format)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f'{method.upper()} {path}: {response.status_code}')
+        return queries
+
+    def assertConstantQueries(self, user, path, method='get', data=None, format=None):
+        """
+        ``user``, ``path`` and ``data`` may be callables, evaluated after each
+        populate() so they can refer to the rows just created: a write needs
+        a fresh target (an unpaid fine, an officer without a shift) each time.
+        ``format`` is the request encoding of writes, JSON by default.
+        """
+        counts = []
+        for n in (self.N, 9 * self.N):
+            self.populate(n)
+            url = path() if callable(path) else path
+            counts.append(self.count_queries(
+                user() if callable(user) else user, method, url, data() if callable(data) else data, format))
+        small, large = counts
+        self.assertEqual(
+            len(small), len(large),
+            f'{method.upper()} {url}: {len(small)} queries with {self.N} rows, '
+            f'{len(large)} with {10 * self.N} rows\n'
+            + '\n'.join(q['sql'] for q in large.captured_queries),
+        )
+
+    def assertConstantChangelists(self, app_label):
+        """Every admin changelist of the app, as a superuser"""
+        models = [model for model in admin.site._registry if model._meta.app_label == app_label]
+        self.assertTrue(models, f'No admin registered for {app_label}')
+        for model in models:
+            url = reverse(f'admin:{app_label}_{model._meta.model_name}_changelist')
+            with self.subTest(model=model.__name__), transaction.atomic():
+                self.assertConstantQueries(self.admin, url)
+                # Start the next changelist from N rows again
+                transaction.set_rollback(True)
+            self.rows = 0
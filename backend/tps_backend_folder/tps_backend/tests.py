@@ -0,0 +1,194 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import Resolver404, resolve
+from django.utils import timezone
+from PIL import Image, JpegImagePlugin
+from rest_framework.test import APIClient
+
+from parkings.models import Parking, Spot
+from users.models import CustomUser
+from vehicles.models import ParkingSession, Vehicle
+from .export import NDJSONExportMixin
+from .images import InvalidImage, downscale_image, make_thumbnail, read_downscaled
+from .pagination import KeysetPagination
+from .testing import CITY, QueryCountTestCase
+from .views import IMMUTABLE_CACHE_CONTROL, serve_media
+
+
+class AdminDashboardQueryCountTests(QueryCountTestCase):
+
+    def test_admin_index(self):
+        self.assertConstantQueries(self.admin, '/admin/')
+
+
+class KeysetPaginationTests(TestCase):
+    """tps_backend/pagination.py, on the session history (ordered by -start_time, -id)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.driver = CustomUser.objects.create_user(email='driver@example.com')
+        parking = Parking.objects.create(name='P', city=CITY, address='Via Roma')
+        vehicle = Vehicle.objects.create(user=cls.driver, plate='AB123CD')
+        now = timezone.now()
+        # Three sessions per start time: ties resolved by id
+        ParkingSession.objects.bulk_create(
+            ParkingSession(user=cls.driver, vehicle=vehicle, parking_lot=parking, is_active=False,
+                           start_time=now - timedelta(hours=i // 3))
+            for i in range(12)
+        )
+        cls.expected = list(ParkingSession.objects.order_by('-start_time', '-id').values_list('id', flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.driver)
+
+    def test_bare_list_without_page_size_or_cursor(self):
+        response = self.client.get('/api/sessions/')
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(sorted(session['id'] for session in response.data), sorted(self.expected))
+
+    def test_following_the_cursor(self):
+        seen = []
+        url = '/api/sessions/?page_size=5'
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.data['results']), 5)
+            seen += [session['id'] for session in response.data['results']]
+            url = response.data['next']
+        # No row skipped or repeated, across tied start times
+        self.assertEqual(seen, self.expected)
+
+    def test_page_size_capped(self):
+        with mock.patch.object(KeysetPagination, 'max_page_size', 4):
+            response = self.client.get('/api/sessions/?page_size=100')
+        self.assertEqual(len(response.data['results']), 4)
+
+
+class NDJSONExportTests(TestCase):
+    """tps_backend/export.py, on the spot export"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = CustomUser.objects.create_user(email='manager@example.com', role='manager', allowed_cities=[CITY])
+        cls.driver = CustomUser.objects.create_user(email='driver@example.com')
+        parking = Parking.objects.create(name='P', city=CITY, address='Via Roma')
+        Spot.objects.bulk_create(Spot(parking=parking, number=str(i)) for i in range(7))
+
+    def export(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get('/api/spots/export/')
+
+    def test_one_object_per_line(self):
+        # Read in chunks smaller than the table
+        with mock.patch.object(NDJSONExportMixin, 'export_chunk_size', 3):
+            response = self.export(self.manager)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            body = b''.join(response.streaming_content).decode()
+        self.assertTrue(body.endswith('\n'))
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['number'] for row in rows], [str(i) for i in range(7)])
+
+    def test_managers_only(self):
+        self.assertEqual(self.export(self.driver).status_code, 403)
+
+
+def upload(size, fmt='PNG', name='photo.png', orientation=None):
+    """In-memory image upload; ``orientation`` sets the EXIF tag"""
+    out = BytesIO()
+    kwargs = {}
+    if orientation is not None:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        kwargs['exif'] = exif
+    Image.new('RGB', size, 'white').save(out, format=fmt, **kwargs)
+    return SimpleUploadedFile(name, out.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+def decoded(data):
+    img = Image.open(data if hasattr(data, 'read') else BytesIO(data))
+    return img.format, img.size
+
+
+@override_settings(UPLOAD_IMAGE_MAX_DIMENSION=100)
+class ImageDownscaleTests(SimpleTestCase):
+    """tps_backend/images.py"""
+
+    def test_fitting_upload_passes_through(self):
+        photo = upload((100, 60))
+        content = photo.read()
+        self.assertIs(downscale_image(photo), photo)
+        self.assertEqual(read_downscaled(photo), (content, 'photo.png', 'image/png'))
+
+    def test_larger_upload_downscaled_to_jpeg(self):
+        image = downscale_image(upload((400, 200)))
+        self.assertEqual(image.name, 'photo.jpg')
+        self.assertEqual(decoded(image), ('JPEG', (100, 50)))
+        data, name, content_type = read_downscaled(upload((200, 400)))
+        self.assertEqual((decoded(data), name, content_type), (('JPEG', (50, 100)), 'photo.jpg', 'image/jpeg'))
+
+    def test_jpeg_decoded_in_draft_mode(self):
+        draft = JpegImagePlugin.JpegImageFile.draft
+        with mock.patch.object(JpegImagePlugin.JpegImageFile, 'draft', autospec=True, side_effect=draft) as spy:
+            image = downscale_image(upload((800, 400), fmt='JPEG', name='photo.jpg'))
+        spy.assert_called_once_with(mock.ANY, 'RGB', (100, 100))
+        self.assertEqual(decoded(image), ('JPEG', (100, 50)))
+
+    def test_exif_orientation_applied(self):
+        # Small enough to pass through, but rotated 90 degrees
+        image = downscale_image(upload((80, 40), fmt='JPEG', name='photo.jpg', orientation=6))
+        self.assertEqual(decoded(image), ('JPEG', (40, 80)))
+        self.assertNotIn(0x0112, Image.open(image).getexif())
+
+    @override_settings(UPLOAD_IMAGE_MAX_PIXELS=1000)
+    def test_too_many_pixels(self):
+        with self.assertRaisesMessage(InvalidImage, 'too large'):
+            downscale_image(upload((40, 40)))
+
+    def test_not_an_image(self):
+        junk = SimpleUploadedFile('photo.png', b'not an image', content_type='image/png')
+        for function in (downscale_image, read_downscaled, make_thumbnail):
+            with self.subTest(function=function.__name__), self.assertRaises(InvalidImage):
+                function(junk)
+
+    def test_thumbnail(self):
+        thumbnail = make_thumbnail(upload((400, 200)), size=32)
+        self.assertEqual(thumbnail.name, 'thumbnail.jpg')
+        self.assertEqual(decoded(thumbnail), ('JPEG', (32, 16)))
+
+
+class MediaRouteTests(SimpleTestCase):
+
+    def test_media_not_routed_without_debug(self):
+        """Evidence photos are never served by Django in production (tests run with DEBUG off)"""
+        with self.assertRaises(Resolver404):
+            resolve('/media/fines/0123abcd.jpg')
+
+    def test_content_addressed_media_cached_forever(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(MEDIA_ROOT=root):
+            os.makedirs(os.path.join(root, 'fines'))
+            for name in ('a' * 64 + '.jpg', 'AB123CD_photo.jpg'):
+                with open(os.path.join(root, 'fines', name), 'wb') as f:
+                    f.write(b'jpeg')
+            request = RequestFactory().get('/media/')
+
+            response = serve_media(request, 'fines/' + 'a' * 64 + '.jpg')
+            self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+            response.close()
+            # Legacy names may be overwritten: no long-lived caching
+            response = serve_media(request, 'fines/AB123CD_photo.jpg')
+            self.assertNotIn('Cache-Control', response)
+            response.close()
+
+            with self.assertRaises(Http404):
+                serve_media(request, 'fines/../db.sqlite3')
@@ -0,0 +1,28 @@
+import posixpath
+
+from django.conf import settings
+from django.http import Http404
+from django.views.static import serve
+
+from .storage import is_content_addressed
+
+# MEDIA_ROOT defaults to the project folder: only upload folders are served
+SERVED_MEDIA_PREFIXES = ('fines/',)
+
+
+# Content-addressed names never change content (tps_backend/storage.py).
+# In production the bucket/CDN serving MEDIA_URL must send the same header
+# for <sha256>.<ext> names, e.g. in nginx:
+#   location ~ "^/media/fines/(.+/)?[0-9a-f]{64}\.\w+$" { add_header Cache-Control "public, max-age=31536000, immutable"; }
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def serve_media(request, path):
+    """Uploaded media, development only (mounted when DEBUG is on)"""
+    path = posixpath.normpath(path).lstrip('/')
+    if not path.startswith(SERVED_MEDIA_PREFIXES):
+        raise Http404("Not found.")
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if is_content_addressed(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
@@ -14,3 +14,17 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tps_backend.settings')
 
 application = get_wsgi_application()
+
+# Load the plate index before the first officer check instead of during it
+from django.conf import settings  # noqa: E402
+from django.db import DatabaseError  # noqa: E402
+
+if settings.ACTIVE_SESSION_INDEX_ENABLED:
+    from vehicles.session_index import session_index
+
+    try:
+        session_index.warm()
+        session_index.start()
+    except DatabaseError:
+        # Warmed lazily on the first lookup instead
+        pass
@@ -0,0 +1,80 @@
+"""
+Activity feed writes.
+
+log_activities() does not insert right away: the events logged during a
+transaction are written with one bulk INSERT when it commits, through
+transaction.on_commit() callbacks. Each call registers its own callback,
+so that the callbacks registered inside a savepoint that is rolled back are
+discarded by Django together with their events, at any nesting level. The
+first callback to run at commit writes the events of every callback still
+pending in the thread (the discarded ones are no longer referenced, so they
+have left the weak set); the others find nothing left to write. Outside a
+transaction the events are written at once.
+"""
+import itertools
+import logging
+import threading
+import weakref
+
+from django.db import DatabaseError, transaction
+
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+
+def _write(entries):
+    try:
+        ActivityLog.objects.bulk_create(entries, batch_size=500)
+    except DatabaseError:
+        # The feed is informational: never fail the write that produced it
+        logger.exception(f'Could not write {len(entries)} activity log entries')
+
+
+class _Pending(threading.local):
+    """Callbacks of the current thread's transaction not written yet"""
+
+    def __init__(self):
+        self.callbacks = weakref.WeakSet()
+
+
+_pending = _Pending()
+_order = itertools.count()
+
+
+class _WriteOnCommit:
+    """on_commit() callback of one log_activities() call"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.order = next(_order)
+
+    def __call__(self):
+        if self not in _pending.callbacks:
+            # Already written by an earlier callback of the transaction
+            return
+        callbacks = sorted(_pending.callbacks, key=lambda callback: callback.order)
+        _pending.callbacks.clear()
+        _write([entry for callback in callbacks for entry in callback.entries])
+
+
+def log_activities(entries):
+    """Queue ActivityLog instances (unsaved) for the current transaction"""
+    entries = list(entries)
+    if entries:
+        callback = _WriteOnCommit(entries)
+        _pending.callbacks.add(callback)
+        # Runs at once outside a transaction
+        transaction.on_commit(callback)
+
+
+def log_activity(**fields):
+    """Queue one event; ``fields`` are ActivityLog field values"""
+    if fields.get('timestamp') is None:
+        fields.pop('timestamp', None)
+    log_activities([ActivityLog(**fields)])
+
+
+def recent_activity(limit=10):
+    """Latest events, newest first (one query on activity_timestamp_idx)"""
+    return list(ActivityLog.objects.order_by('-timestamp', '-id')[:limit])
@@ -5,3 +5,6 @@ class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
     verbose_name = 'User Management'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (activity feed receivers)
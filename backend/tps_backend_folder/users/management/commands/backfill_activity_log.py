@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from users.models import ActivityLog, CustomUser
+from vehicles.models import Fine, ParkingSession
+
+
+class Command(BaseCommand):
+    help = "Seed the activity feed with the latest users, sessions and fines recorded before it existed."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=50,
+            help='Events per type (default: 50).',
+        )
+
+    def handle(self, *args, **options):
+        if ActivityLog.objects.exists():
+            self.stdout.write("Activity log is not empty, nothing to do.")
+            return
+        limit = options['limit']
+        entries = []
+
+        for user in CustomUser.objects.filter(role='user').order_by('-date_joined')[:limit]:
+            entries.append(ActivityLog(
+                type='user', title='New User', identifier=user.email, user=user, timestamp=user.date_joined,
+            ))
+
+        sessions = ParkingSession.objects.select_related('vehicle', 'parking_lot').order_by('-start_time')[:limit]
+        for session in sessions:
+            entries.append(ActivityLog(
+                type='session', title='Session Started',
+                identifier=session.vehicle.plate if session.vehicle else "Unknown",
+                amount=session.total_cost, user_id=session.user_id, timestamp=session.start_time,
+                city=session.parking_lot.city if session.parking_lot else '',
+            ))
+
+        fines = Fine.objects.select_related('vehicle', 'session__parking_lot')
+        for fine in fines.order_by('-issued_at')[:limit]:
+            entries.append(ActivityLog(
+                type='fine_issued', title='Violation Issued', identifier=fine.vehicle.plate,
+                amount=fine.amount, user_id=fine.vehicle.user_id, timestamp=fine.issued_at,
+                city=fine.session.parking_lot.city if fine.session and fine.session.parking_lot else '',
+            ))
+        for fine in fines.filter(status='paid', paid_at__isnull=False).order_by('-paid_at')[:limit]:
+            entries.append(ActivityLog(
+                type='fine_payment', title='Fine Paid', identifier=fine.vehicle.plate,
+                amount=fine.amount, user_id=fine.vehicle.user_id, timestamp=fine.paid_at,
+                city=fine.session.parking_lot.city if fine.session and fine.session.parking_lot else '',
+            ))
+
+        ActivityLog.objects.bulk_create(entries, batch_size=500)
+        self.stdout.write(self.style.SUCCESS(f"{len(entries)} activity log entries written."))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('type', models.CharField(choices=[('user', 'New User'), ('session', 'Session Started'), ('fine_issued', 'Violation Issued'), ('fine_payment', 'Fine Paid'), ('parking', 'Parking Added')], max_length=20)),
+                ('title', models.CharField(max_length=100)),
+                ('identifier', models.CharField(blank=True, max_length=255)),
+                ('amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('city', models.CharField(blank=True, default='', max_length=50)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Activity Log',
+                'verbose_name_plural': 'Activity Log',
+                'ordering': ['-timestamp', '-id'],
+                'indexes': [models.Index(fields=['-timestamp', '-id'], name='activity_timestamp_idx'), models.Index(fields=['city', '-timestamp'], name='activity_city_timestamp_idx')],
+            },
+        ),
+    ]
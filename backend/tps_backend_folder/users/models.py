@@ -130,3 +130,45 @@ class Shift(models.Model):
         ordering = ["-start_time"]
         verbose_name = "Controller Shift"
         verbose_name_plural = "Controller Shifts"
+
+
+class ActivityLog(models.Model):
+    """
+    Append-only event feed of the admin dashboard and /api/users/activity/.
+    Rows are written in batches by users/activity.py when the transaction
+    that produced them commits; never updated.
+    """
+    TYPE_CHOICES = [
+        ("user", "New User"),
+        ("session", "Session Started"),
+        ("fine_issued", "Violation Issued"),
+        ("fine_payment", "Fine Paid"),
+        ("parking", "Parking Added"),
+    ]
+
+    timestamp = models.DateTimeField(default=timezone.now)
+    type = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    title = models.CharField(max_length=100)
+    # Plate, e-mail or parking name shown under the title
+    identifier = models.CharField(max_length=255, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    city = models.CharField(max_length=50, blank=True, default='')
+    user = models.ForeignKey(
+        "users.CustomUser",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="activity",
+    )
+
+    class Meta:
+        ordering = ["-timestamp", "-id"]
+        verbose_name = "Activity Log"
+        verbose_name_plural = "Activity Log"
+        indexes = [
+            models.Index(fields=["-timestamp", "-id"], name="activity_timestamp_idx"),
+            models.Index(fields=["city", "-timestamp"], name="activity_city_timestamp_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.timestamp:%d/%m %H:%M} {self.title} {self.identifier}"
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import CustomUser,Shift
+from .models import CustomUser, Shift, ActivityLog
 from django.contrib.auth.password_validation import validate_password
 from django.core import exceptions
 from django.contrib.auth.tokens import default_token_generator
@@ -21,7 +21,7 @@ class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
         if self.user.role != 'user' and not self.user.is_superuser:
             raise serializers.ValidationError({"detail": "Accesso negato. Questa app è solo per clienti."})
         if self.user.role == 'user':
-            config = GlobalSettings.objects.first()
+            config = GlobalSettings.get_active()
             limit = config.max_violations if config else 3
             if self.user.violations_count >= limit:
                 raise serializers.ValidationError(
@@ -193,3 +193,9 @@ class ShiftSerializer(serializers.ModelSerializer):
         model = Shift
         fields = ("id", "officer", "start_time", "end_time", "status", "created_at")
         read_only_fields = fields
+
+class ActivityLogSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ActivityLog
+        fields = ("id", "timestamp", "type", "title", "identifier", "amount", "city")
+        read_only_fields = fields
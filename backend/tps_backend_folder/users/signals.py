@@ -1,68 +1,72 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from .models import RegularUser, Manager, Patroller, Admin, ActivityLog
-from vehicles.models import ParkingSession, Violation
-from payments.models import Payment
-from parkings.models import Parking, City
+from .models import CustomUser
+from .activity import log_activity
+from vehicles.models import Fine, ParkingSession
+from parkings.models import Parking
 
-@receiver(post_save, sender=RegularUser)
-def log_user_registration(sender, instance, created, **kwargs):
-    if created:
-        ActivityLog.log_action(
-            action_type='USER_REGISTERED',
-            description='New user registered',
-            details=instance.email,
-            user_email=instance.email,
-            icon='person_add',
-            color='#3b82f6'
-        )
+# Activity feed entries (users/activity.py), written when the transaction commits
 
-@receiver(post_save, sender=Payment)
-def log_payment(sender, instance, created, **kwargs):
-    if instance.status == 'COMPLETED':
-        ActivityLog.log_action(
-            action_type='PAYMENT_RECEIVED',
-            description='Payment received',
-            details=f'€{instance.amount} from session #{instance.parking_session_id}',
-            user_email=getattr(instance.parking_session.vehicle, 'owner_email', None) if hasattr(instance, 'parking_session') else None,
-            icon='payment',
-            color='#10b981'
+@receiver(post_save, sender=CustomUser)
+def log_user_registration(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.role == 'user':
+        log_activity(
+            type='user',
+            title='New User',
+            identifier=instance.email,
+            user=instance,
+            timestamp=instance.date_joined,
         )
 
-@receiver(post_save, sender=Violation)
-def log_violation(sender, instance, created, **kwargs):
-    if created:
-        ActivityLog.log_action(
-            action_type='VIOLATION_ISSUED',
-            description='Violation issued',
-            details=f'Plate: {instance.license_plate} - {instance.violation_type}',
-            user_email=instance.user_email,
-            icon='report_problem',
-            color='#ef4444'
+@receiver(post_save, sender=ParkingSession)
+def log_session(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        log_activity(
+            type='session',
+            title='Session Started',
+            identifier=instance.vehicle.plate if instance.vehicle_id else "Unknown",
+            amount=instance.total_cost,
+            city=instance.parking_lot.city if instance.parking_lot_id else '',
+            user_id=instance.user_id,
+            timestamp=instance.start_time,
         )
 
-@receiver(post_save, sender=Parking)
-def log_parking_added(sender, instance, created, **kwargs):
+@receiver(post_save, sender=Fine)
+def log_fine(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # Previous status as loaded from the database (see Fine.from_db)
+    was_paid = instance.loaded_state is not None and instance.loaded_state[1] == 'paid'
     if created:
-        # city is now a CharField, not a ForeignKey
-        city_name = instance.city if instance.city else "N/A"
-        
-        ActivityLog.log_action(
-            action_type='PARKING_ADDED',
-            description='New parking added',
-            details=f'{instance.name} - {city_name}',
-            icon='local_parking',
-            color='#f59e0b'
-        )
+        entry = dict(type='fine_issued', title='Violation Issued', timestamp=instance.issued_at)
+    elif instance.status == 'paid' and not was_paid:
+        entry = dict(type='fine_payment', title='Fine Paid', timestamp=instance.paid_at)
+    else:
+        return
 
-@receiver(post_save, sender=ParkingSession)
-def log_session(sender, instance, created, **kwargs):
-    if created:
-        ActivityLog.log_action(
-            action_type='SESSION_STARTED',
-            description='Session started',
-            details=f'{instance.parking_lot.name} - Spot {getattr(instance, "spot_number", "N/A")}',
-            user_email=getattr(instance.vehicle, 'owner_email', None) if hasattr(instance, 'vehicle') else None,
-            icon='directions_car',
-            color='#6366f1'
+    city = ''
+    if instance.session_id:
+        # Callers that write fines load them with select_related('session__parking_lot')
+        if Fine.session.is_cached(instance) and ParkingSession.parking_lot.is_cached(instance.session):
+            parking = instance.session.parking_lot
+            city = parking.city if parking else ''
+        else:
+            city = Parking.objects.filter(sessions__pk=instance.session_id).values_list('city', flat=True).first()
+        city = city or ''
+    log_activity(
+        identifier=instance.vehicle.plate,
+        amount=instance.amount,
+        city=city,
+        user_id=instance.vehicle.user_id,
+        **entry,
+    )
+
+@receiver(post_save, sender=Parking)
+def log_parking_added(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        log_activity(
+            type='parking',
+            title='Parking Added',
+            identifier=instance.name,
+            city=instance.city or '',
         )
@@ -1,3 +1,186 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import transaction
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from parkings.models import Parking
+from tps_backend.testing import CITY, QueryCountTestCase
+from vehicles.models import Fine, GlobalSettings, ParkingSession, Vehicle
+from vehicles.violations import bulk_set_fine_status
+from .activity import log_activity
+from .models import ActivityLog, CustomUser, Shift
+
+
+class ActivityLogTests(TestCase):
+    """Feed events are written when their transaction commits (users/activity.py)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        GlobalSettings.objects.create(max_violations=1000)
+        cls.driver = CustomUser.objects.create_user(email='driver@example.com')
+        cls.milano = Parking.objects.create(name='M', city='Milano', address='Via Roma')
+        cls.roma = Parking.objects.create(name='R', city='Roma', address='Via Milano')
+        cls.vehicle = Vehicle.objects.create(user=cls.driver, plate='AB123CD')
+
+    def events(self, **filters):
+        return list(ActivityLog.objects.filter(**filters).order_by('id').values_list('type', 'city', 'identifier'))
+
+    def start_session(self, parking):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ParkingSession.objects.create(user=self.driver, vehicle=self.vehicle, parking_lot=parking,
+                                                 total_cost=Decimal('2.50'))
+
+    def issue_fine(self, session):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Fine.objects.create(vehicle=self.vehicle, session=session, amount=Decimal('50.00'))
+
+    def test_session_started(self):
+        self.start_session(self.milano)
+        self.assertEqual(self.events(type='session'), [('session', 'Milano', 'AB123CD')])
+
+    def test_fine_issued_and_paid(self):
+        fine = self.issue_fine(self.start_session(self.milano))
+        self.assertEqual(self.events(type='fine_issued'), [('fine_issued', 'Milano', 'AB123CD')])
+
+        client = APIClient()
+        client.force_authenticate(self.driver)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(f'/api/users/fines/{fine.pk}/pay/')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.events(type='fine_payment'), [('fine_payment', 'Milano', 'AB123CD')])
+
+    def test_bulk_paid(self):
+        session = self.start_session(self.roma)
+        fines = [self.issue_fine(session) for _ in range(3)]
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            bulk_set_fine_status(Fine.objects.filter(pk__in=[f.pk for f in fines]), 'mark_paid')
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.events(type='fine_payment'), [('fine_payment', 'Roma', 'AB123CD')] * 3)
+
+    def test_not_written_before_commit(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            log_activity(type='parking', title='Parking Added', identifier='P')
+        self.assertEqual(self.events(type='parking'), [])
+
+    def test_rolled_back_savepoint_drops_its_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            log_activity(type='parking', title='Parking Added', identifier='kept')
+            try:
+                with transaction.atomic():
+                    log_activity(type='parking', title='Parking Added', identifier='dropped')
+                    raise ValueError
+            except ValueError:
+                pass
+            with transaction.atomic():
+                log_activity(type='parking', title='Parking Added', identifier='inner')
+        self.assertEqual([identifier for _, _, identifier in self.events(type='parking')], ['kept', 'inner'])
+
+    def test_one_insert_per_transaction(self):
+        session = self.start_session(self.milano)
+        with self.captureOnCommitCallbacks() as callbacks:
+            # Savepoint, insert, counter update, release: the city comes from
+            # the cached session, without a Parking query
+            with self.assertNumQueries(12):
+                for _ in range(3):
+                    Fine.objects.create(vehicle=self.vehicle, session=session, amount=Decimal('50.00'))
+        with self.assertNumQueries(1):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(self.events(type='fine_issued'), [('fine_issued', 'Milano', 'AB123CD')] * 3)
+
+    def test_feed_limited_to_manager_cities(self):
+        self.start_session(self.milano)
+        self.start_session(self.roma)
+        manager = CustomUser.objects.create_user(email='manager@example.com', role='manager', allowed_cities=['Roma'])
+        client = APIClient()
+        client.force_authenticate(manager)
+        response = client.get('/api/users/activity/')
+        self.assertEqual(response.status_code, 200)
+        # Paginated even without ?page_size=
+        self.assertEqual([event['city'] for event in response.data['results']], ['Roma'])
+
+        client.force_authenticate(self.driver)
+        self.assertEqual(client.get('/api/users/activity/').status_code, 403)
+
+
+class UserQueryCountTests(QueryCountTestCase):
+    """Account, shift, activity and fine endpoints run the same number of queries with N and 10 x N rows"""
+
+    def test_profile(self):
+        self.assertConstantQueries(self.driver, '/api/users/profile/')
+
+    def test_user_fines(self):
+        self.assertConstantQueries(self.driver, '/api/users/me/fines/')
+
+    def test_violation_types(self):
+        self.assertConstantQueries(self.controller, '/api/users/violations/types/')
+
+    def test_current_shift(self):
+        self.assertConstantQueries(self.controller, '/api/users/shifts/current/')
+
+    def test_shift_history(self):
+        self.assertConstantQueries(self.controller, '/api/users/shifts/history/')
+
+    def test_active_officers(self):
+        self.assertConstantQueries(self.manager, f'/api/users/shifts/active-officers/?city={CITY}')
+
+    def test_activity_feed(self):
+        self.assertConstantQueries(self.manager, '/api/users/activity/?page_size=100')
+
+    def test_report_violation(self):
+        self.assertConstantQueries(
+            self.controller, '/api/users/violations/report/', method='post', format='multipart',
+            data=lambda: {'plate': Vehicle.objects.latest('id').plate, 'reason': 'Parking Violation'})
+
+    def latest_fine_path(self, action):
+        fine = Fine.objects.filter(vehicle__user=self.driver, status='unpaid').latest('id')
+        return f'/api/users/fines/{fine.pk}/{action}/'
+
+    def test_pay_fine(self):
+        self.assertConstantQueries(self.driver, lambda: self.latest_fine_path('pay'), method='post')
+
+    def test_contest_fine(self):
+        self.assertConstantQueries(
+            self.driver, lambda: self.latest_fine_path('contest'), method='post', data={'reason': 'Ticket shown'})
+
+    def new_officer(self):
+        return CustomUser.objects.create_user(
+            email=f'new-officer{self.rows}@example.com', role='controller', allowed_cities=[CITY])
+
+    def test_shift_start(self):
+        self.assertConstantQueries(self.new_officer, '/api/users/shifts/start/', method='post')
+
+    def test_shift_end(self):
+        def officer():
+            officer = self.new_officer()
+            Shift.objects.create(officer=officer)
+            return officer
+        self.assertConstantQueries(officer, '/api/users/shifts/end/', method='post')
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_register(self):
+        self.assertConstantQueries(None, '/api/users/register/', method='post', data=lambda: {
+            'email': f'new{self.rows}@example.com', 'first_name': 'A', 'last_name': 'B',
+            'password': 'secret', 'password2': 'secret',
+        })
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_token_obtain(self):
+        for user, path in ((self.driver, 'user'), (self.controller, 'controller'), (self.manager, 'manager')):
+            user.set_password('secret')
+            user.save(update_fields=['password'])
+            with self.subTest(path=path), transaction.atomic():
+                self.assertConstantQueries(None, f'/api/users/token/{path}/', method='post',
+                                           data={'email': user.email, 'password': 'secret'})
+                # Start the next login from N rows again
+                transaction.set_rollback(True)
+            self.rows = 0
+
+    def test_token_refresh(self):
+        self.assertConstantQueries(None, '/api/users/token/refresh/', method='post',
+                                   data=lambda: {'refresh': str(RefreshToken.for_user(self.driver))})
+
+    def test_admin_changelists(self):
+        self.assertConstantChangelists('users')
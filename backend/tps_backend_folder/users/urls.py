@@ -18,7 +18,8 @@ from .views import (
     CurrentShiftView,
     ShiftHistoryView,
     ActiveOfficersView,
-    ReportViolationView
+    ReportViolationView,
+    ActivityFeedView,
 )
 from rest_framework_simplejwt.views import TokenRefreshView
 
@@ -48,6 +49,9 @@ urlpatterns = [
     path('shifts/history/', ShiftHistoryView.as_view(), name='shift_history'),
     path('shifts/active-officers/', ActiveOfficersView.as_view(), name='active_officers'),
 
+    # Activity feed (managers)
+    path('activity/', ActivityFeedView.as_view(), name='activity_feed'),
+
     # Violations & Fines
     path('violations/report/', ReportViolationView.as_view(), name='report_violation'),
     path('me/fines/', UserFinesView.as_view(), name='user-fines'),
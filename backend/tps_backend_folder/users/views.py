@@ -26,11 +26,16 @@ from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .models import Shift
-from .serializers import ShiftSerializer
+from .serializers import ShiftSerializer, ActivityLogSerializer
+from .models import ActivityLog
 from django.utils import timezone
-from vehicles.models import Vehicle, Fine, GlobalSettings, ParkingSession
+from django.db import transaction
+from vehicles.models import Vehicle, Fine, GlobalSettings
+from vehicles.enforcement import city_denied, get_plate_status
+from tps_backend.images import InvalidImage, downscale_image
 from rest_framework.parsers import MultiPartParser, FormParser
-from datetime import timedelta
+from rest_framework.generics import ListAPIView
+from tps_backend.pagination import KeysetPagination
 
 # --- SERIALIZERS LOGIN ---
 class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
@@ -51,7 +56,7 @@ class UserTokenObtainPairSerializer(TokenObtainPairSerializer):
             raise serializers.ValidationError({"detail": "Access denied."})
 
         if self.user.role == 'user':
-            config = GlobalSettings.objects.first()
+            config = GlobalSettings.get_active()
             limit = config.max_violations if config else 3
             if self.user.violations_count >= limit:
                 raise serializers.ValidationError(
@@ -326,6 +331,42 @@ class ActiveOfficersView(APIView):
         
         return Response({'city': city, 'active_officers': active_officers, 'count': len(active_officers)}, status=status.HTTP_200_OK)
 
+# --- ACTIVITY FEED ---
+
+class ActivityFeedPagination(KeysetPagination):
+    # The dashboard feed has always been paginated
+    paginate_by_default = True
+    page_size = 20
+    max_page_size = 100
+
+
+class ActivityFeedView(ListAPIView):
+    """
+    GET /api/users/activity/?type=&cursor=
+    Latest events first, cursor paginated on the timestamp index.
+    Managers only see events of their allowed cities.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = ActivityLogSerializer
+    pagination_class = ActivityFeedPagination
+    cursor_ordering = ('-timestamp', '-id')
+
+    def list(self, request, *args, **kwargs):
+        if not (request.user.is_superuser or request.user.role in ['manager', 'superuser']):
+            return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
+        return super().list(request, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = ActivityLog.objects.all()
+        user = self.request.user
+        if not user.is_superuser and user.role == 'manager':
+            queryset = queryset.filter(city__in=user.allowed_cities or [])
+
+        event_type = self.request.query_params.get('type')
+        if event_type:
+            queryset = queryset.filter(type=event_type)
+        return queryset
+
 # --- VIOLAZIONI E MULTE (MODIFICATO PER USARE GLOBAL SETTINGS) ---
 
 class ReportViolationView(APIView):
@@ -344,14 +385,18 @@ class ReportViolationView(APIView):
         if not plate or not reason:
             return Response({"detail": "Plate and reason are required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        config = GlobalSettings.objects.first()
+        if image:
+            try:
+                image = downscale_image(image)
+            except InvalidImage as e:
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        config = GlobalSettings.get_active()
         
         if config and config.violation_config:
             violation_prices = {item['name']: float(item['amount']) for item in config.violation_config}
-            max_violations = config.max_violations
         else:
             violation_prices = {'Parking Violation': 50.00}
-            max_violations = 3
 
         if reason not in violation_prices:
             valid_reasons = list(violation_prices.keys())
@@ -362,14 +407,11 @@ class ReportViolationView(APIView):
         amount = violation_prices[reason]
 
         try:
-            vehicle = Vehicle.objects.get(plate__iexact=plate)
+            # The vehicle a plate check would show, also when two share the plate
+            vehicle = Vehicle.objects.select_related('user').get(pk=get_plate_status(plate).get('vehicle_id'))
             user = vehicle.user
 
-            user.violations_count += 1
-            if user.violations_count >= max_violations:
-                user.is_active = False 
-            user.save()
-
+            # Fine.save() updates the owner's violation count and ban status
             fine = Fine.objects.create(
                 vehicle=vehicle,
                 issued_by=request.user,  
@@ -379,6 +421,7 @@ class ReportViolationView(APIView):
                 evidence_image=image,
                 status='unpaid'
             )
+            user.refresh_from_db(fields=['violations_count'])
 
             return Response({
                 "message": "Violation reported successfully.",
@@ -395,7 +438,7 @@ class UserFinesView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        fines = Fine.objects.filter(vehicle__user=request.user).order_by('-issued_at')
+        fines = Fine.objects.filter(vehicle__user=request.user).select_related('vehicle').order_by('-issued_at')
         data = []
         for fine in fines:
             data.append({
@@ -406,7 +449,8 @@ class UserFinesView(APIView):
                 'status': fine.status,
                 'issued_at': fine.issued_at,
                 'notes': fine.notes if hasattr(fine, 'notes') else "",
-                'contestation_reason': fine.contestation_reason 
+                'contestation_reason': fine.contestation_reason,
+                'evidence_thumbnail': request.build_absolute_uri(fine.evidence_thumbnail.url) if fine.evidence_thumbnail else None,
             })
         return Response(data, status=status.HTTP_200_OK)
 
@@ -415,25 +459,21 @@ class PayFineView(APIView):
 
     def post(self, request, pk):
         user = request.user
-        fine = get_object_or_404(Fine, pk=pk, vehicle__user=user)
-
-        if fine.status == 'paid':
-            return Response({"detail": "Fine is already paid."}, status=status.HTTP_400_BAD_REQUEST)
-
-        fine.status = 'paid'
-        fine.paid_at = timezone.now()
-        fine.save()
+        with transaction.atomic():
+            # Row lock: a concurrent pay of the same fine waits, then sees it
+            # paid. The activity feed entry reads the vehicle and the city
+            fine = get_object_or_404(
+                Fine.objects.select_related('vehicle', 'session__parking_lot').select_for_update(of=('self',)),
+                pk=pk, vehicle__user=user,
+            )
 
-        if user.violations_count > 0:
-            user.violations_count -= 1
-            
-            config = GlobalSettings.objects.first()
-            limit = config.max_violations if config else 3
+            if fine.status == 'paid':
+                return Response({"detail": "Fine is already paid."}, status=status.HTTP_400_BAD_REQUEST)
 
-            if user.violations_count < limit and not user.is_active:
-                user.is_active = True
-            
-            user.save()
+            fine.status = 'paid'
+            fine.paid_at = timezone.now()
+            fine.save()
+        user.refresh_from_db(fields=['violations_count', 'is_active'])
 
         return Response({
             "message": "Fine paid successfully", 
@@ -445,18 +485,20 @@ class ContestFineView(APIView):
 
     def post(self, request, pk):
         user = request.user
-        fine = get_object_or_404(Fine, pk=pk, vehicle__user=user)
-        
         reason = request.data.get('reason')
-        if not reason:
-            return Response({"detail": "Reason is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if fine.status != 'unpaid':
-            return Response({"detail": "Only unpaid fines can be contested."}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            fine = get_object_or_404(Fine.objects.select_for_update(of=('self',)), pk=pk, vehicle__user=user)
+
+            if not reason:
+                return Response({"detail": "Reason is required."}, status=status.HTTP_400_BAD_REQUEST)
 
-        fine.status = 'disputed'
-        fine.contestation_reason = reason
-        fine.save()
+            if fine.status != 'unpaid':
+                return Response({"detail": "Only unpaid fines can be contested."}, status=status.HTTP_400_BAD_REQUEST)
+
+            fine.status = 'disputed'
+            fine.contestation_reason = reason
+            fine.save()
 
         return Response({"message": "Fine contested successfully. Status is now pending review."}, status=status.HTTP_200_OK)
 
@@ -469,44 +511,41 @@ class CheckPlateView(APIView):
         if request.user.role not in ['controller', 'manager', 'superuser']:
             return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
             
-        try:
-            vehicle = Vehicle.objects.get(plate__iexact=plate)
-        except Vehicle.DoesNotExist:
-            return Response({"status": "NO_VEHICLE", "message": "Vehicle not found in the system."}, status=status.HTTP_404_NOT_FOUND)
+        plate_status = get_plate_status(plate)
 
-        last_session = ParkingSession.objects.filter(vehicle=vehicle).order_by('-end_time').first()
+        if plate_status['status'] == 'no_vehicle':
+            return Response({"status": "NO_VEHICLE", "message": "Vehicle not found in the system."}, status=status.HTTP_404_NOT_FOUND)
 
-        if not last_session:
+        if plate_status['status'] == 'no_session':
             return Response({"status": "NO_SESSION", "message": "No session found."}, status=status.HTTP_200_OK)
 
-        now = timezone.now()
+        denied_city = city_denied(request.user, plate_status)
+        if denied_city:
+            return Response({"detail": f"Unauthorized city: {denied_city}"}, status=status.HTTP_403_FORBIDDEN)
 
-        if last_session.is_active and last_session.end_time and last_session.end_time > now:
+        if plate_status['status'] == 'active':
             return Response({
                 "status": "VALID",
                 "message": "Valid parking",
-                "expires_at": last_session.end_time
+                "expires_at": plate_status['expires_at']
             }, status=status.HTTP_200_OK)
 
-        config = GlobalSettings.objects.first()
-        grace_minutes = config.grace_period_minutes if config else 15
-        
-        expiration_time = last_session.end_time if last_session.end_time else now
-        grace_end_time = expiration_time + timedelta(minutes=grace_minutes)
+        now = timezone.now()
+        grace_end_time = plate_status['grace_ends_at']
 
-        if now <= grace_end_time:
+        if plate_status['status'] == 'grace_period':
             minutes_left = int((grace_end_time - now).total_seconds() / 60)
             return Response({
                 "status": "GRACE_PERIOD",
                 "message": f"Grace period active ({minutes_left} min remaining)",
-                "expires_at": last_session.end_time,
+                "expires_at": plate_status['expires_at'],
                 "grace_ends_at": grace_end_time
             }, status=status.HTTP_200_OK)
 
         return Response({
             "status": "EXPIRED",
             "message": "Ticket expired",
-            "expired_at": last_session.end_time
+            "expired_at": plate_status['expires_at']
         }, status=status.HTTP_200_OK)
     
 # In api/views.py
@@ -519,7 +558,7 @@ class ViolationTypesView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        config = GlobalSettings.objects.first()
+        config = GlobalSettings.get_active()
         
         if not config or not config.violation_config:
             return Response([
@@ -2,6 +2,7 @@ from django.contrib import admin
 from django import forms
 from unfold.admin import ModelAdmin
 from .models import Vehicle, ParkingSession, Fine, GlobalSettings
+from . import violations
 from users.models import CustomUser
 from unfold.decorators import display
 from django.contrib import messages
@@ -26,36 +27,54 @@ class VehicleAdmin(ModelAdmin):
 @admin.register(ParkingSession)
 class ParkingSessionAdmin(ModelAdmin):
     list_display = ('id', 'user', 'vehicle', 'parking_lot', 'start_time', 'is_active', 'total_cost')
+    # vehicle and parking_lot are nullable: the admin's default select_related() skips them
+    list_select_related = ('user', 'vehicle', 'parking_lot')
     list_filter = ('is_active',)
     search_fields = ('vehicle__plate', 'user__email', 'parking_lot__name')
 
-@admin.action(description="🔄 Reset Owner's Standing (Unban & Zero Count)")
+@admin.action(description="🔄 Reset Owner's Standing (Unban, Zero Count & Cancel Open Fines)")
 def reset_owner_standing(modeladmin, request, queryset):
-    count = 0
-    for fine in queryset:
-        user = fine.vehicle.user
-        if user and (user.violations_count > 0 or not user.is_active):
-            user.violations_count = 0
-            user.is_active = True
-            user.save()
-            count += 1
-            
+    cancelled, count = violations.reset_owner_standing(queryset)
+
     modeladmin.message_user(
         request, 
-        f"Successfully reset account standing for {count} users associated with selected fines.", 
+        f"Successfully reset account standing for {count} users associated with selected fines "
+        f"({cancelled} open fines cancelled).", 
+        messages.SUCCESS
+    )
+
+# Set-based: one UPDATE for the fines, one for the owners' counts
+@admin.action(description="Cancel selected fines")
+def cancel_fines(modeladmin, request, queryset):
+    updated, owners = violations.bulk_set_fine_status(queryset, 'cancel')
+    modeladmin.message_user(
+        request,
+        f"Cancelled {updated} fines; violation counts updated for {owners} users.",
+        messages.SUCCESS
+    )
+
+@admin.action(description="Mark selected fines as paid")
+def mark_fines_paid(modeladmin, request, queryset):
+    updated, owners = violations.bulk_set_fine_status(queryset, 'mark_paid')
+    modeladmin.message_user(
+        request,
+        f"Marked {updated} fines as paid; violation counts updated for {owners} users.",
         messages.SUCCESS
     )
 
 @admin.register(Fine)
 class FineAdmin(ModelAdmin):
-    list_display = ('id', 'vehicle_plate', 'amount_display', 'status_badge', 'contest_info', 'issued_at')
+    list_display = ('id', 'evidence_preview', 'vehicle_plate', 'amount_display', 'status_badge', 'contest_info', 'issued_at')
+    list_select_related = ('vehicle',)
     
     # FILTRI: Aggiungi 'is_disputed_filter' per trovare subito le contestazioni
     list_filter = ('status', 'reason', 'issued_at')
     
     search_fields = ('vehicle__plate', 'reason', 'id', 'vehicle__user__email', 'contestation_reason')
     
-    readonly_fields = ("issued_at", "contest_text_display")
+    readonly_fields = ("issued_at", "contest_text_display", "evidence_thumbnail_display")
+
+    actions = [cancel_fines, mark_fines_paid, reset_owner_standing]
 
     fieldsets = (
         ("Violation Details", {
@@ -68,7 +87,7 @@ class FineAdmin(ModelAdmin):
             "fields": ("contestation_reason", "contest_text_display", "notes") 
         }),
         ("Evidence", { 
-            "fields": ("evidence_image",) 
+            "fields": ("evidence_thumbnail_display", "evidence_image",) 
         }),
         ("Status & Action", {
             "fields": ("status", "issued_at")
@@ -105,6 +124,25 @@ class FineAdmin(ModelAdmin):
         return obj.vehicle.plate
     vehicle_plate.short_description = "Plate"
 
+    # Solo la miniatura: la lista non scarica mai le immagini originali
+    def evidence_preview(self, obj):
+        if not obj.evidence_thumbnail:
+            return "-"
+        return format_html(
+            '<img src="{}" style="height:40px; border-radius:4px;" loading="lazy" alt="">',
+            obj.evidence_thumbnail.url,
+        )
+    evidence_preview.short_description = "Evidence"
+
+    def evidence_thumbnail_display(self, obj):
+        if not obj.evidence_thumbnail:
+            return "-"
+        return format_html(
+            '<a href="{}" target="_blank"><img src="{}" style="max-height:240px; border-radius:4px;" alt=""></a>',
+            obj.evidence_image.url, obj.evidence_thumbnail.url,
+        )
+    evidence_thumbnail_display.short_description = "Preview"
+
     def amount_display(self, obj):
         return f"€ {obj.amount}"
     amount_display.short_description = "Amount"
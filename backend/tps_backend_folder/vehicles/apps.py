@@ -5,3 +5,8 @@ class VehiclesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'vehicles'
     verbose_name = 'Vehicle Management'
+
+    def ready(self):
+        from . import ocr  # noqa: F401  (PLATE_OCR_PROVIDER system check)
+        from . import session_index  # noqa: F401  (index refresh receivers)
+        from . import violations  # noqa: F401  (violation counter receivers)
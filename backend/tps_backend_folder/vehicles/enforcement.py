@@ -0,0 +1,157 @@
+"""
+Plate status for officers.
+
+The vehicle and its latest session are read in one statement: the session
+columns are correlated subqueries on the (vehicle, -end_time) index, so a
+check never loads or serializes the full session. Plates with an active or
+recently ended session are answered from the in-process index
+(session_index.py) without touching the database.
+"""
+from datetime import timedelta
+
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import GlobalSettings, ParkingSession, normalize_plate, plate_key, vehicles_with_plates
+from .session_index import session_index
+
+MAX_BATCH_PLATES = 500
+
+# Latest session columns annotated on the vehicle as last_<field>
+SESSION_FIELDS = (
+    'id', 'start_time', 'end_time', 'planned_end_time', 'is_active',
+    'parking_lot_id', 'parking_lot__city', 'parking_lot__name',
+)
+
+
+def _annotation_name(field):
+    return 'last_' + field.replace('__', '_')
+
+
+def status_rows(vehicles):
+    """
+    Vehicle queryset -> dict rows carrying the latest session as last_*
+    columns, and the normalized plate as plate_key
+    """
+    latest = ParkingSession.objects.filter(vehicle=OuterRef('pk')).order_by('-end_time', '-start_time')
+    return (
+        vehicles
+        .annotate(plate_key=plate_key(), **{
+            _annotation_name(field): Subquery(latest.values(field)[:1])
+            for field in SESSION_FIELDS
+        })
+        .values('id', 'plate', 'plate_key', *(_annotation_name(f) for f in SESSION_FIELDS))
+    )
+
+
+def plate_status_queryset(normalized_plates):
+    return status_rows(vehicles_with_plates(normalized_plates))
+
+
+def _session_rank(row):
+    return (row['last_id'] is not None, bool(row['last_is_active']), row['last_start_time'])
+
+
+def add_status_row(rows, row):
+    """
+    Add a row to a plate_key -> row dict. Two vehicles can share a plate
+    once normalized (see migration 0003): the one with the latest session
+    is the one on the street.
+    """
+    current = rows.get(row['plate_key'])
+    if current is None or current['id'] == row['id'] or _session_rank(row) > _session_rank(current):
+        rows[row['plate_key']] = row
+
+
+def grace_minutes():
+    return GlobalSettings.grace_minutes()
+
+
+def build_status(plate, row, now=None, grace=None):
+    """
+    Compact status of a plate from a plate_status_queryset row (None when
+    the vehicle is unknown). ``status`` is one of no_vehicle, no_session,
+    active, grace_period, expired.
+    """
+    now = now or timezone.now()
+    grace = grace_minutes() if grace is None else grace
+
+    if row is None:
+        return {"plate": plate, "status": "no_vehicle", "can_issue_ticket": False}
+
+    result = {
+        "plate": row['plate'],
+        "vehicle_id": row['id'],
+        "status": "no_session",
+        "can_issue_ticket": True,
+        "session_id": row['last_id'],
+        "parking_id": row['last_parking_lot_id'],
+        "parking_name": row['last_parking_lot_name'],
+        "city": row['last_parking_lot_city'],
+        "expires_at": None,
+        "grace_ends_at": None,
+    }
+    if row['last_id'] is None:
+        return result
+
+    end_time = row['last_end_time']
+    planned_end_time = row['last_planned_end_time']
+
+    # A session ends at its planned end, or earlier if closed before it
+    if planned_end_time and end_time:
+        reference_time = min(end_time, planned_end_time)
+    else:
+        reference_time = planned_end_time or end_time
+
+    if row['last_is_active'] and not end_time and (not planned_end_time or now < planned_end_time):
+        status = "active"
+    elif reference_time is None:
+        # Closed without any end time recorded
+        status = "expired"
+    elif now < reference_time:
+        status = "active"
+    elif now < reference_time + timedelta(minutes=grace):
+        status = "grace_period"
+    else:
+        status = "expired"
+
+    result.update({
+        "status": status,
+        "can_issue_ticket": status == "expired",
+        "expires_at": reference_time,
+        "grace_ends_at": reference_time + timedelta(minutes=grace) if reference_time else None,
+    })
+    return result
+
+
+def get_plate_status(plate, now=None):
+    return get_plate_statuses([plate], now=now)[0]
+
+
+def get_plate_statuses(plates, now=None):
+    """Statuses for many plates, in request order, from one query."""
+    now = now or timezone.now()
+    grace = grace_minutes()
+    normalized = [normalize_plate(p) for p in plates]
+    rows = session_index.lookup(n for n in normalized if n)
+    missing = {n for n in normalized if n and n not in rows}
+    if missing:
+        for row in plate_status_queryset(missing):
+            add_status_row(rows, row)
+    return [
+        build_status(plate, rows.get(n), now=now, grace=grace)
+        for plate, n in zip(plates, normalized)
+    ]
+
+
+def city_denied(user, status):
+    """
+    City a controller is not allowed to check (None if allowed).
+    Evaluated on the compact status, before any session serialization.
+    """
+    if user.is_superuser or getattr(user, 'role', None) != 'controller':
+        return None
+    city = status.get('city')
+    if city and city not in (getattr(user, 'allowed_cities', None) or []):
+        return city
+    return None
@@ -0,0 +1,61 @@
+"""
+Expiry sweeper: closes active sessions whose purchased time plus the
+grace period (GlobalSettings) has elapsed.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from parkings.stats import record_sessions_ended
+from .models import GlobalSettings, ParkingSession
+from .session_index import session_index
+
+logger = logging.getLogger(__name__)
+
+
+def expire_overdue_sessions(now=None, batch_size=500):
+    """
+    Close overdue sessions with set-based UPDATEs of at most ``batch_size``
+    rows each. Rows locked by a concurrent sweeper are skipped.
+    Returns the number of sessions expired.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(minutes=GlobalSettings.grace_minutes())
+
+    overdue = ParkingSession.objects.filter(
+        is_active=True,
+        planned_end_time__isnull=False,
+        planned_end_time__lt=cutoff,
+    )
+
+    expired = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                overdue.select_for_update(skip_locked=True)
+                .order_by('planned_end_time')
+                .values_list('id', 'parking_lot_id', 'vehicle_id')[:batch_size]
+            )
+            if not batch:
+                break
+            ParkingSession.objects.filter(id__in=[pk for pk, _, _ in batch]).update(
+                is_active=False,
+                is_expired=True,
+                is_in_grace_period=False,
+                expired_at=F('planned_end_time'),
+                end_time=F('planned_end_time'),
+                total_cost=F('prepaid_cost'),
+                updated_at=timezone.now(),
+            )
+            record_sessions_ended([parking_id for _, parking_id, _ in batch])
+        session_index.refresh_vehicles(vehicle_id for _, _, vehicle_id in batch)
+        expired += len(batch)
+        if len(batch) < batch_size:
+            break
+
+    if expired:
+        logger.info(f'Expired {expired} sessions past grace period')
+    return expired
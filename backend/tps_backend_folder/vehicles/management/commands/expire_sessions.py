@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from vehicles.expiry import expire_overdue_sessions
+
+
+class Command(BaseCommand):
+    help = "Close active sessions past their planned end time plus the grace period."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Sessions closed per UPDATE (default: 500).',
+        )
+        parser.add_argument(
+            '--loop', type=int, default=None, metavar='SECONDS',
+            help='Keep sweeping every SECONDS seconds instead of running once.',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_overdue_sessions(batch_size=options['batch_size'])
+            self.stdout.write(f"{expired} sessions expired.")
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
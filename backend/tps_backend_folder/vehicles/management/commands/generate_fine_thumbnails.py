@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from vehicles.models import Fine
+
+
+class Command(BaseCommand):
+    help = "Generate evidence thumbnails for fines uploaded before thumbnails existed."
+
+    def handle(self, *args, **options):
+        fines = Fine.objects.exclude(
+            Q(evidence_image='') | Q(evidence_image__isnull=True)
+        ).filter(Q(evidence_thumbnail='') | Q(evidence_thumbnail__isnull=True))
+        done = failed = 0
+        for fine in fines.iterator():
+            fine.refresh_thumbnail()
+            if fine.evidence_thumbnail:
+                Fine.objects.filter(pk=fine.pk).update(evidence_thumbnail=fine.evidence_thumbnail.name)
+                done += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f"{done} thumbnails generated, {failed} images unreadable."))
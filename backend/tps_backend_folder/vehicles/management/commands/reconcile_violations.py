@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from vehicles.violations import reconcile_violation_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute users' violation counts and ban status from their fines."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids', metavar='ID',
+            help='Only reconcile this user (repeatable). Default: all users.',
+        )
+
+    def handle(self, *args, **options):
+        fixed = reconcile_violation_counts(options['user_ids'])
+        self.stdout.write(f"{fixed} users reconciled.")
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-18 16:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parkings', '0006_parking_occupancy_counters'),
+        ('vehicles', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parkingsession',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['parking_lot', '-start_time'], name='session_lot_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingsession',
+            index=models.Index(fields=['parking_lot', 'start_time'], name='session_lot_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingsession',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['vehicle'], name='session_vehicle_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingsession',
+            index=models.Index(fields=['vehicle', '-end_time'], name='session_vehicle_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingsession',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user', '-start_time'], name='session_user_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingsession',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['planned_end_time'], name='session_active_end_idx'),
+        ),
+    ]
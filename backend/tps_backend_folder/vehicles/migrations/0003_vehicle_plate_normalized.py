@@ -0,0 +1,46 @@
+from django.db import migrations, models
+
+import vehicles.models
+
+
+def backfill_plate_normalized(apps, schema_editor):
+    """
+    Fill plate_normalized for existing vehicles. Plates that collide once
+    normalized ('AB123CD' / 'ab 123 cd') keep the oldest vehicle; the others
+    are left NULL. Plate lookups match those on normalize_plate(plate)
+    computed in SQL (models.vehicles_with_plates), and migration 0007
+    reports them so they can be merged.
+    """
+    Vehicle = apps.get_model('vehicles', 'Vehicle')
+    seen = set()
+    to_update = []
+    for vehicle in Vehicle.objects.only('id', 'plate').order_by('id').iterator():
+        normalized = vehicles.models.normalize_plate(vehicle.plate) or None
+        if normalized in seen:
+            normalized = None
+        elif normalized:
+            seen.add(normalized)
+        vehicle.plate_normalized = normalized
+        to_update.append(vehicle)
+    Vehicle.objects.bulk_update(to_update, ['plate_normalized'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0002_parkingsession_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='plate_normalized',
+            field=models.CharField(editable=False, max_length=15, null=True),
+        ),
+        migrations.RunPython(backfill_plate_normalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='vehicle',
+            name='plate_normalized',
+            field=models.CharField(editable=False, max_length=15, null=True, unique=True),
+        ),
+    ]
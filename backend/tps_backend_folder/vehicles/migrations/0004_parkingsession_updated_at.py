@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0003_vehicle_plate_normalized'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkingsession',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
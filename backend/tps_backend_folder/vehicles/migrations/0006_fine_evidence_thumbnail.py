@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:07
+
+import vehicles.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0005_plateocrjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fine',
+            name='evidence_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=vehicles.models.evidence_storage, upload_to='fines/thumbnails/'),
+        ),
+        migrations.AlterField(
+            model_name='fine',
+            name='evidence_image',
+            field=models.ImageField(blank=True, null=True, storage=vehicles.models.evidence_storage, upload_to=vehicles.models.fine_evidence_path),
+        ),
+    ]
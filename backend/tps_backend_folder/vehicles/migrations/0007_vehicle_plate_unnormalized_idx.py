@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:40
+
+import logging
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+import vehicles.models
+
+logger = logging.getLogger(__name__)
+
+
+def report_plate_collisions(apps, schema_editor):
+    """
+    List the vehicles left without plate_normalized by 0003 next to the
+    vehicle owning their plate, so the duplicates can be merged by hand.
+    Plate checks find them either way.
+    """
+    Vehicle = apps.get_model('vehicles', 'Vehicle')
+    for vehicle in Vehicle.objects.filter(plate_normalized__isnull=True).order_by('id'):
+        normalized = vehicles.models.normalize_plate(vehicle.plate)
+        owner = Vehicle.objects.filter(plate_normalized=normalized).values_list('id', flat=True).first()
+        if owner is not None:
+            logger.warning(f'Vehicle {vehicle.id} ({vehicle.plate!r}) shares plate {normalized} with vehicle {owner}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehicles', '0006_fine_evidence_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(django.db.models.functions.text.Upper(models.Func(models.F('plate'), models.Value('[^A-Za-z0-9]'), models.Value(''), models.Value('g'), function='REGEXP_REPLACE')), condition=models.Q(('plate_normalized__isnull', True)), name='vehicle_plate_unnormalized_idx'),
+        ),
+        migrations.RunPython(report_plate_collisions, migrations.RunPython.noop),
+    ]
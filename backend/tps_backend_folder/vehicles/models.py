@@ -1,15 +1,36 @@
-from django.db import models
+import re
+import time
+import uuid
+from django.db import models, transaction
+from django.db.models import F, Func, Q, Value
+from django.db.models.functions import Coalesce, Upper
 from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import storages
 from django.dispatch import receiver
 from django.db.models.signals import post_save, post_delete
 from django.utils import timezone
 from parkings.models import Parking
+from tps_backend.images import InvalidImage, make_thumbnail
+
+GLOBAL_SETTINGS_CACHE_KEY = 'vehicles:global_settings'
+# Shared cache entry lifetime; bounds staleness when the backend is per-process
+GLOBAL_SETTINGS_CACHE_TIMEOUT = 60
+# Process-local copy lifetime, so hot endpoints skip even the cache backend
+GLOBAL_SETTINGS_LOCAL_TTL = 5
+
+_local_global_settings = {'value': None, 'expires_at': 0.0}
+
+# Grace period when no GlobalSettings row exists: the sweeper, plate checks
+# and the apps (ParkingSessionSerializer) must all use the same value
+DEFAULT_GRACE_PERIOD_MINUTES = 15
 
 
 class GlobalSettings(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     max_violations = models.IntegerField(default=3, help_text="Soglia Ban")
-    grace_period_minutes = models.IntegerField(default=15, help_text="Tolleranza")
+    grace_period_minutes = models.IntegerField(default=DEFAULT_GRACE_PERIOD_MINUTES, help_text="Tolleranza")
 
     violation_config = models.JSONField(
         default=list, 
@@ -25,21 +46,124 @@ class GlobalSettings(models.Model):
     def __str__(self):
         return f"Config {self.created_at.strftime('%d/%m %H:%M')}"
 
+    @classmethod
+    def get_active(cls):
+        """
+        Active configuration (the latest row) or None.
+        Read from a process-local copy, then the shared cache, then the DB.
+        """
+        now = time.monotonic()
+        if now < _local_global_settings['expires_at']:
+            return _local_global_settings['value']
+
+        # Wrapped in a tuple so a missing configuration is cached too
+        cached = cache.get(GLOBAL_SETTINGS_CACHE_KEY)
+        if cached is None:
+            cached = (cls.objects.first(),)
+            cache.set(GLOBAL_SETTINGS_CACHE_KEY, cached, GLOBAL_SETTINGS_CACHE_TIMEOUT)
+
+        _local_global_settings['value'] = cached[0]
+        _local_global_settings['expires_at'] = now + GLOBAL_SETTINGS_LOCAL_TTL
+        return cached[0]
+
+    @classmethod
+    def grace_minutes(cls):
+        """Active grace period, DEFAULT_GRACE_PERIOD_MINUTES without a configuration"""
+        config = cls.get_active()
+        return config.grace_period_minutes if config else DEFAULT_GRACE_PERIOD_MINUTES
+
+    @staticmethod
+    def invalidate_cache():
+        cache.delete(GLOBAL_SETTINGS_CACHE_KEY)
+        _local_global_settings['expires_at'] = 0.0
+
+
+@receiver(post_save, sender=GlobalSettings)
+@receiver(post_delete, sender=GlobalSettings)
+def invalidate_global_settings_cache(sender, **kwargs):
+    GlobalSettings.invalidate_cache()
+
 # --- VEHICLE MODELS ---
 
+def normalize_plate(raw: str) -> str:
+    """Canonical plate: upper case, letters and digits only ('ab 123-cd' -> 'AB123CD')"""
+    if not raw:
+        return ""
+    s = raw.strip().upper()
+    s = re.sub(r"[^A-Z0-9]", "", s)
+    return s
+
+
+def plate_sql_normalized(field='plate'):
+    """normalize_plate() as a SQL expression, for rows without plate_normalized"""
+    return Upper(Func(F(field), Value('[^A-Za-z0-9]'), Value(''), Value('g'), function='REGEXP_REPLACE'))
+
+
+def plate_key():
+    """Normalized plate of any vehicle, stored or computed"""
+    return Coalesce('plate_normalized', plate_sql_normalized())
+
+
+def vehicles_with_plates(normalized_plates):
+    """
+    Vehicles by normalized plate. Vehicles whose plate collided with another
+    one once normalized have plate_normalized NULL (migration 0003); they are
+    matched on the plate itself through vehicle_plate_unnormalized_idx.
+    """
+    plates = list(normalized_plates)
+    return Vehicle.objects.alias(plate_sql=plate_sql_normalized()).filter(
+        Q(plate_normalized__in=plates) | Q(plate_normalized__isnull=True, plate_sql__in=plates)
+    )
+
+
 class Vehicle(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     plate = models.CharField(max_length=15, unique=True)
+    # normalize_plate(plate), kept in sync on save: plate lookups are
+    # exact matches on this unique index instead of UPPER(plate) scans
+    plate_normalized = models.CharField(max_length=15, unique=True, null=True, editable=False)
     name = models.CharField(max_length=50, null=True)
     is_favorite = models.BooleanField(default=False)
+    # Delta sync of plate changes into the active session index
+    # (vehicles/session_index.py), like ParkingSession.updated_at
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = "Vehicle"
         verbose_name_plural = "Vehicles"
+        indexes = [
+            models.Index(
+                plate_sql_normalized(), name='vehicle_plate_unnormalized_idx',
+                condition=Q(plate_normalized__isnull=True),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.plate} ({self.name})"
 
+    def validate_unique(self, exclude=None):
+        # Plates differing only by spaces or dashes are the same plate; the
+        # admin form reports it like the API serializer does
+        super().validate_unique(exclude=exclude)
+        if exclude and 'plate' in exclude:
+            return
+        normalized = normalize_plate(self.plate)
+        if normalized and vehicles_with_plates([normalized]).exclude(pk=self.pk).exists():
+            raise ValidationError({'plate': "A vehicle with this plate already exists."})
+
+    def save(self, *args, **kwargs):
+        self.plate_normalized = normalize_plate(self.plate) or None
+        # A vehicle whose plate collides with another one once normalized
+        # (left by 0003, or written without validation: shell, fixtures) has
+        # plate_normalized NULL while the other vehicle owns it
+        if self.plate_normalized and Vehicle.objects.filter(
+                plate_normalized=self.plate_normalized).exclude(pk=self.pk).exists():
+            self.plate_normalized = None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'plate' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'plate_normalized', 'updated_at'}
+        super().save(*args, **kwargs)
+
 class ParkingSession(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, null=True)
@@ -65,17 +189,44 @@ class ParkingSession(models.Model):
     expired_at = models.DateTimeField(null=True, blank=True) 
     grace_period_minutes = models.IntegerField(default=5)
     is_in_grace_period = models.BooleanField(default=False)
+    # Bumped on every write (bulk updates set it explicitly): delta sync of
+    # the in-process active session index (vehicles/session_index.py)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = "Parking Session"
         verbose_name_plural = "Parking Sessions"
         ordering = ['-start_time']
+        indexes = [
+            # Active sessions of a parking (ParkingViewSet.sessions, counters rebuild)
+            models.Index(fields=['parking_lot', '-start_time'], condition=Q(is_active=True), name='session_lot_active_idx'),
+            # Per-day history of a parking (daily stats)
+            models.Index(fields=['parking_lot', 'start_time'], name='session_lot_start_idx'),
+            # Duplicate active session check in perform_create
+            models.Index(fields=['vehicle'], condition=Q(is_active=True), name='session_vehicle_active_idx'),
+            # Latest session of a vehicle (CheckPlateView)
+            models.Index(fields=['vehicle', '-end_time'], name='session_vehicle_end_idx'),
+            # Active sessions of a user, newest first
+            models.Index(fields=['user', '-start_time'], condition=Q(is_active=True), name='session_user_active_idx'),
+            # Expiry sweeper
+            models.Index(fields=['planned_end_time'], condition=Q(is_active=True), name='session_active_end_idx'),
+        ]
 
     def end_session(self):
-        self.end_time = timezone.now()
-        self.is_active = False
-        self.total_cost = self.prepaid_cost 
-        self.save()
+        """
+        Close the session. Returns False when it was no longer active: the
+        row is locked first, so a concurrent end or the expiry sweeper
+        (vehicles/expiry.py) closes it only once.
+        """
+        with transaction.atomic():
+            if not ParkingSession.objects.select_for_update().filter(pk=self.pk, is_active=True).exists():
+                self.refresh_from_db()
+                return False
+            self.end_time = timezone.now()
+            self.is_active = False
+            self.total_cost = self.prepaid_cost
+            self.save()
+        return True
 
     def __str__(self):
         if self.vehicle:
@@ -87,6 +238,11 @@ class ParkingSession(models.Model):
 def fine_evidence_path(instance, filename):
     return f'fines/{instance.vehicle.plate}_{timezone.now().strftime("%Y%m%d%H%M%S")}_{filename}'
 
+
+def evidence_storage():
+    # Content-addressed: the file name is the SHA-256 of its bytes (tps_backend/storage.py)
+    return storages['evidence']
+
 class Fine(models.Model):
     STATUS_CHOICES = (
         ('unpaid', 'Unpaid'),
@@ -107,7 +263,9 @@ class Fine(models.Model):
     paid_at = models.DateTimeField(null=True, blank=True)
 
     notes = models.TextField(blank=True, null=True)
-    evidence_image = models.ImageField(upload_to=fine_evidence_path, blank=True, null=True)
+    evidence_image = models.ImageField(upload_to=fine_evidence_path, storage=evidence_storage, blank=True, null=True)
+    # Generated from evidence_image on save; lists and the admin show only this
+    evidence_thumbnail = models.ImageField(upload_to='fines/thumbnails/', storage=evidence_storage, blank=True, null=True, editable=False)
 
     contestation_reason = models.TextField(blank=True, null=True, help_text="Reason provided by user for disputing the fine")
 
@@ -116,35 +274,100 @@ class Fine(models.Model):
         verbose_name_plural = "Violations / Fines"
         ordering = ['-issued_at']
 
+    # (vehicle_id, status) as stored in the database, for the violation
+    # counter deltas (vehicles/violations.py); None for unsaved fines
+    loaded_state = None
+
     def __str__(self):
         return f"Fine #{self.id} - {self.vehicle.plate}"
+
+    # evidence_image name as stored: the thumbnail is rebuilt only when it changes
+    loaded_evidence = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if {'vehicle_id', 'status'} <= instance.__dict__.keys():
+            instance.loaded_state = (instance.vehicle_id, instance.status)
+        instance.loaded_evidence = instance.__dict__.get('evidence_image') or None
+        return instance
+
+    def refresh_thumbnail(self):
+        """Rebuild evidence_thumbnail from evidence_image (not saved)"""
+        if not self.evidence_image:
+            self.evidence_thumbnail = None
+            return
+        try:
+            thumbnail = make_thumbnail(self.evidence_image)
+        except (InvalidImage, OSError):
+            self.evidence_thumbnail = None
+            return
+        self.evidence_thumbnail.save(thumbnail.name, thumbnail, save=False)
+
+    def save(self, *args, **kwargs):
+        # A new upload is not committed to storage yet. An unreadable image
+        # is not retried on every save: generate_fine_thumbnails does that
+        update_fields = kwargs.get('update_fields')
+        if 'evidence_image' in self.get_deferred_fields() or (
+                update_fields is not None and 'evidence_image' not in update_fields):
+            image_changed = new_upload = False
+        else:
+            new_upload = bool(self.evidence_image) and not self.evidence_image._committed
+            image_changed = (self.evidence_image.name or None) != self.loaded_evidence
+        if new_upload or image_changed:
+            self.refresh_thumbnail()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'evidence_thumbnail'}
+        # The owner's violation counter is updated in the same transaction
+        with transaction.atomic(using=kwargs.get('using')):
+            if not self._state.adding and self.pk is not None:
+                # The counter delta is computed from the stored row, locked
+                # until commit: a concurrent save of a stale copy waits and
+                # then sees this one's status instead of applying it twice
+                self.loaded_state = self._locked_state(kwargs.get('using'))
+            super().save(*args, **kwargs)
+        # After post_save, so every receiver sees the previous state
+        self.loaded_state = (self.vehicle_id, self.status)
+        if 'evidence_image' not in self.get_deferred_fields():
+            self.loaded_evidence = self.evidence_image.name or None
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            # (None, None) when another transaction already deleted it: nothing to uncount
+            self.loaded_state = self._locked_state(kwargs.get('using')) or (None, None)
+            return super().delete(*args, **kwargs)
+
+    def _locked_state(self, using=None):
+        """(vehicle_id, status) of the stored row, locked for update; None if missing"""
+        return (
+            Fine.objects.using(using or self._state.db or 'default').select_for_update()
+            .filter(pk=self.pk).values_list('vehicle_id', 'status').first()
+        )
     
-@receiver(post_save, sender=Fine)
-@receiver(post_delete, sender=Fine)
-def update_user_violation_count(sender, instance, **kwargs):
-    if not instance.vehicle or not instance.vehicle.user:
-        return
-    user = instance.vehicle.user
-    
-    # Conta le multe attive
-    current_count = Fine.objects.filter(
-        vehicle__user=user
-    ).exclude(
-        status__in=['paid', 'cancelled']
-    ).count()
-    user.violations_count = current_count
-    
-    # --- LOGICA DINAMICA (MAX VIOLATIONS) ---
-    # 1. Recuperiamo la configurazione attiva
-    config = GlobalSettings.objects.first()
-    
-    # 2. Se esiste, usiamo il suo valore, altrimenti fallback a 3
-    limit = config.max_violations if config else 3
-    
-    # 3. Applichiamo la regola
-    if user.violations_count >= limit:
-        user.is_active = False 
-    else:
-        user.is_active = True 
-        
-    user.save(update_fields=['violations_count', 'is_active'])
\ No newline at end of file
+# --- PLATE OCR ---
+
+class PlateOCRJob(models.Model):
+    """An officer photo queued for plate recognition (vehicles/ocr.py)"""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='ocr_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    provider = models.CharField(max_length=50, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Plate OCR Job"
+        verbose_name_plural = "Plate OCR Jobs"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"OCR job {self.id} ({self.status})"
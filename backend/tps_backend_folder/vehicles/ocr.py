@@ -0,0 +1,318 @@
+"""
+Plate OCR.
+
+Providers turn image bytes into {"plate", "confidence", "candidates"}.
+The provider is chosen with settings.PLATE_OCR_PROVIDER:
+  platerecognizer  api.platerecognizer.com (PLATE_RECOGNIZER_TOKEN), through
+                   a pooled HTTP session shared by all requests
+  stub             offline provider for development and tests: the plate is
+                   the upload file name ("AB123CD.jpg" -> "AB123CD")
+
+Photos sent to the async endpoint become PlateOCRJob rows processed by a
+small thread pool (settings.PLATE_OCR_WORKERS), so a slow provider never
+holds a request worker; clients poll the job for the result. The pool is
+in-process and the photo is not stored, so a restart loses queued jobs:
+jobs still unfinished after PLATE_OCR_JOB_TIMEOUT seconds are marked
+failed (see fail_stale_jobs) and the client sends the photo again.
+
+Results are cached by SHA-256 of the image bytes (PLATE_OCR_CACHE_SIZE
+entries, PLATE_OCR_CACHE_TTL seconds), so re-shot or retried photos do not
+reach the provider again.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.core import checks
+from django.db import close_old_connections
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+from .models import PlateOCRJob, normalize_plate
+
+logger = logging.getLogger(__name__)
+
+
+class OCRError(Exception):
+    """Provider failure; ``payload`` and ``status_code`` are the API response"""
+
+    def __init__(self, payload, status_code):
+        super().__init__(payload.get('error'))
+        self.payload = payload
+        self.status_code = status_code
+
+
+def empty_result():
+    return {"plate": "", "confidence": 0.0, "candidates": []}
+
+
+class PlateRecognizerProvider:
+    name = 'platerecognizer'
+    url = "https://api.platerecognizer.com/v1/plate-reader/"
+    timeout = 8
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        # requests.Session is not thread safe: one pooled session per thread
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=1))
+            self._local.session = session
+        return session
+
+    def recognize(self, image_bytes, filename, content_type=None):
+        token = os.getenv("PLATE_RECOGNIZER_TOKEN")
+        if not token:
+            raise OCRError(
+                {"error": "Server missing PLATE_RECOGNIZER_TOKEN environment variable."}, 500
+            )
+
+        try:
+            resp = self.session.post(
+                self.url,
+                headers={"Authorization": f"Token {token}"},
+                data={"regions": "it"},
+                files={"upload": (filename, image_bytes, content_type or "application/octet-stream")},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            raise OCRError({"error": f"OCR request failed: {str(e)}"}, 502)
+
+        if resp.status_code not in (200, 201):
+            raise OCRError(
+                {
+                    "error": "OCR provider returned error",
+                    "provider_status": resp.status_code,
+                    "provider_body": resp.text[:500],
+                },
+                502,
+            )
+
+        results = resp.json().get("results") or []
+        if not results:
+            return empty_result()
+
+        best = results[0]
+        best_plate = normalize_plate(best.get("plate", ""))
+        best_score = float(best.get("score") or 0.0)
+
+        candidates = []
+        raw_candidates = best.get("candidates") or []
+        if raw_candidates:
+            for c in raw_candidates[:3]:
+                candidates.append({
+                    "plate": normalize_plate(c.get("plate", "")),
+                    "confidence": float(c.get("score") or 0.0)
+                })
+        else:
+            candidates.append({"plate": best_plate, "confidence": best_score})
+
+        return {"plate": best_plate, "confidence": best_score, "candidates": candidates}
+
+
+class StubProvider:
+    name = 'stub'
+
+    def recognize(self, image_bytes, filename, content_type=None):
+        plate = normalize_plate(os.path.splitext(os.path.basename(filename or ''))[0])
+        if not plate:
+            return empty_result()
+        return {"plate": plate, "confidence": 0.99, "candidates": [{"plate": plate, "confidence": 0.99}]}
+
+
+class OCRResultCache:
+    """Process-local LRU cache with a TTL, keyed by provider and image hash"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (expires_at, result)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(provider_name, image_bytes):
+        return f"{provider_name}:{hashlib.sha256(image_bytes).hexdigest()}"
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, result):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+result_cache = OCRResultCache(
+    max_size=getattr(settings, 'PLATE_OCR_CACHE_SIZE', 512),
+    ttl=getattr(settings, 'PLATE_OCR_CACHE_TTL', 3600),
+)
+
+
+PROVIDERS = {
+    PlateRecognizerProvider.name: PlateRecognizerProvider,
+    StubProvider.name: StubProvider,
+}
+
+_providers = {}
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _provider_name():
+    return getattr(settings, 'PLATE_OCR_PROVIDER', PlateRecognizerProvider.name)
+
+
+@checks.register()
+def check_provider(app_configs, **kwargs):
+    """Refuse to start with an unknown PLATE_OCR_PROVIDER"""
+    name = _provider_name()
+    if name in PROVIDERS:
+        return []
+    return [checks.Error(
+        f"Unknown PLATE_OCR_PROVIDER {name!r}.",
+        hint=f"Use one of {sorted(PROVIDERS)}.",
+        id='vehicles.E001',
+    )]
+
+
+def get_provider():
+    name = _provider_name()
+    if name not in _providers:
+        if name not in PROVIDERS:
+            raise OCRError({"error": f"Unknown PLATE_OCR_PROVIDER {name!r}."}, 500)
+        _providers[name] = PROVIDERS[name]()
+    return _providers[name]
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'PLATE_OCR_WORKERS', 2),
+                    thread_name_prefix='plate-ocr',
+                )
+    return _executor
+
+
+def recognize(image_bytes, filename, content_type=None, provider=None):
+    """Provider result for an image, from the cache when the same bytes were seen"""
+    provider = provider or get_provider()
+    key = result_cache.key(provider.name, image_bytes)
+    result = result_cache.get(key)
+    if result is None:
+        # Failures are not cached: a retry goes back to the provider
+        result = provider.recognize(image_bytes, filename, content_type)
+        result_cache.set(key, result)
+    return result
+
+
+def submit_job(user, image_bytes, filename, content_type=None):
+    """Queue a photo and return its PlateOCRJob right away"""
+    provider = get_provider()
+    cached = result_cache.get(result_cache.key(provider.name, image_bytes))
+    if cached is not None:
+        return PlateOCRJob.objects.create(
+            user=user, provider=provider.name, status='done', result=cached, finished_at=timezone.now()
+        )
+    job = PlateOCRJob.objects.create(user=user, provider=provider.name)
+    _get_executor().submit(_run_job, job.pk, provider, image_bytes, filename, content_type)
+    return job
+
+
+UNFINISHED_STATUSES = ('pending', 'processing')
+
+
+def _stale_cutoff():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'PLATE_OCR_JOB_TIMEOUT', 120))
+
+
+def fail_stale_jobs(jobs=None):
+    """
+    Mark failed the jobs still unfinished after PLATE_OCR_JOB_TIMEOUT
+    seconds: their worker is gone. Returns how many were failed.
+    """
+    jobs = PlateOCRJob.objects.all() if jobs is None else jobs
+    return jobs.filter(status__in=UNFINISHED_STATUSES, created_at__lt=_stale_cutoff()).update(
+        status='failed',
+        error={"error": "OCR job timed out, please send the photo again."},
+        finished_at=timezone.now(),
+    )
+
+
+def expire_if_stale(job):
+    """A polled job, failed first if it is stale"""
+    if job.status in UNFINISHED_STATUSES and job.created_at < _stale_cutoff():
+        # The worker may finish in between: only an unfinished row is failed
+        if fail_stale_jobs(PlateOCRJob.objects.filter(pk=job.pk)):
+            job.refresh_from_db()
+    return job
+
+
+def _run_job(job_id, provider, image_bytes, filename, content_type):
+    try:
+        PlateOCRJob.objects.filter(pk=job_id).update(status='processing')
+        try:
+            result = provider.recognize(image_bytes, filename, content_type)
+        except OCRError as e:
+            PlateOCRJob.objects.filter(pk=job_id).update(
+                status='failed', error=e.payload, finished_at=timezone.now()
+            )
+            return
+        # submit_job already counted the cache miss
+        result_cache.set(result_cache.key(provider.name, image_bytes), result)
+        PlateOCRJob.objects.filter(pk=job_id).update(
+            status='done', result=result, finished_at=timezone.now()
+        )
+    except Exception:
+        logger.exception(f'Plate OCR job {job_id} crashed')
+        PlateOCRJob.objects.filter(pk=job_id).update(
+            status='failed', error={"error": "OCR processing failed."}, finished_at=timezone.now()
+        )
+    finally:
+        # Worker threads own their DB connection
+        close_old_connections()
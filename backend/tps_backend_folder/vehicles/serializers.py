@@ -1,7 +1,8 @@
+from django.urls import reverse
 from rest_framework import serializers
-from .models import GlobalSettings, Vehicle, ParkingSession
+from .models import GlobalSettings, Vehicle, ParkingSession, PlateOCRJob, normalize_plate, vehicles_with_plates
 from parkings.models import Parking 
-from parkings.serializers import ParkingSerializer 
+from parkings.serializers import ParkingSummarySerializer
 
 class ControllerVehicleSerializer(serializers.ModelSerializer):
     class Meta:
@@ -15,9 +16,20 @@ class VehicleSerializer(serializers.ModelSerializer):
         fields = ['id', 'plate', 'name', 'is_favorite']
         read_only_fields = ['id']
 
+    def validate_plate(self, value):
+        normalized = normalize_plate(value)
+        if not normalized:
+            raise serializers.ValidationError("Plate must contain letters or digits.")
+        duplicates = vehicles_with_plates([normalized])
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        if duplicates.exists():
+            raise serializers.ValidationError("A vehicle with this plate already exists.")
+        return value
+
 class ParkingSessionSerializer(serializers.ModelSerializer):
     vehicle = VehicleSerializer(read_only=True)
-    parking_lot = ParkingSerializer(read_only=True)
+    parking_lot = ParkingSummarySerializer(read_only=True)
     
     vehicle_id = serializers.PrimaryKeyRelatedField(
         queryset=Vehicle.objects.all(), 
@@ -51,15 +63,14 @@ class ParkingSessionSerializer(serializers.ModelSerializer):
 
     # Metodo per recuperare il valore dinamico dalle impostazioni globali
     def get_grace_period_minutes(self, obj):
-        config = GlobalSettings.objects.first()
-        return config.grace_period_minutes if config else 5
+        return GlobalSettings.grace_minutes()
 
 class ControllerParkingSessionSerializer(ParkingSessionSerializer):
     """
     Serializzatore specializzato per il Controllore. 
     """
     vehicle = ControllerVehicleSerializer(read_only=True)
-    parking_lot = ParkingSerializer(read_only=True)
+    parking_lot = ParkingSummarySerializer(read_only=True)
     
     class Meta:
         model = ParkingSession
@@ -77,4 +88,18 @@ class ControllerParkingSessionSerializer(ParkingSessionSerializer):
             'id', 'vehicle', 'parking_lot', 'start_time', 
             'is_active', 'planned_end_time', 'is_expired', 
             'expired_at', 'duration_purchased_minutes', 'prepaid_cost'
-        ]
\ No newline at end of file
+        ]
+
+
+class PlateOCRJobSerializer(serializers.ModelSerializer):
+    poll_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = PlateOCRJob
+        fields = ['id', 'status', 'result', 'error', 'created_at', 'finished_at', 'poll_url']
+        read_only_fields = fields
+
+    def get_poll_url(self, obj):
+        path = reverse('plate-ocr-job', kwargs={'job_id': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(path) if request else path
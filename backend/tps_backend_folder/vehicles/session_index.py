@@ -0,0 +1,277 @@
+"""
+In-process index of active and recently ended sessions, keyed by normalized
+plate, so officer plate checks are answered without a database round trip.
+
+Entries are the same rows enforcement.status_rows() returns, so a hit and a
+database read produce the same status. The index is:
+  - warmed on first use (or at startup, see tps_backend/wsgi.py);
+  - refreshed on commit of every ParkingSession/Vehicle write in this
+    process, and by the expiry sweeper;
+  - delta-synced every ACTIVE_SESSION_INDEX_SYNC_INTERVAL seconds from
+    ParkingSession.updated_at and Vehicle.updated_at, which picks up
+    sessions and plate changes written by other processes;
+  - compared in full with the database every CHECK_INTERVAL seconds, which
+    also catches vehicles deleted elsewhere; each worker logs the result.
+Syncing and checking run on a background thread; lookups only read the
+current dict, and database reads happen outside the lock, which is held
+just to swap rows in. A plate not in the index falls back to the database,
+so staleness is bounded by the sync interval for writes of other processes.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ParkingSession, Vehicle
+
+logger = logging.getLogger(__name__)
+
+# How long an ended session stays in the index
+RECENT_WINDOW = timedelta(hours=24)
+SYNC_INTERVAL = 2.0
+# Re-read a little before the last sync to cover commit/clock skew
+SYNC_OVERLAP = timedelta(seconds=5)
+# Full comparison with the database, repairing any drift
+CHECK_INTERVAL = 300.0
+
+
+def _is_recent(row, cutoff):
+    if row['last_id'] is None:
+        return False
+    if row['last_is_active']:
+        return True
+    ends = [t for t in (row['last_end_time'], row['last_planned_end_time']) if t]
+    return bool(ends) and max(ends) >= cutoff
+
+
+def _recent_vehicle_ids(cutoff):
+    return ParkingSession.objects.filter(
+        Q(is_active=True) | Q(end_time__gte=cutoff) | Q(planned_end_time__gte=cutoff),
+        vehicle__isnull=False,
+    ).values('vehicle_id')
+
+
+def _recent_rows(vehicles, cutoff):
+    """plate -> row of the vehicles with a recent session"""
+    from .enforcement import add_status_row, status_rows
+
+    rows = {}
+    for row in status_rows(vehicles).iterator():
+        if row['plate_key'] and _is_recent(row, cutoff):
+            add_status_row(rows, row)
+    return rows
+
+
+class ActiveSessionIndex:
+
+    def __init__(self):
+        self._rows = {}          # normalized plate -> status row
+        self._plates = {}        # vehicle id -> normalized plate
+        self._lock = threading.RLock()
+        # One full read (warm/check) at a time; refreshes landing meanwhile
+        # are collected in _touched and re-applied after the swap
+        self._full_lock = threading.Lock()
+        self._touched = None
+        self._warm = False
+        self._synced_at = None   # DB time of the last sync
+        self._thread = None
+        self._stop = None
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'ACTIVE_SESSION_INDEX_ENABLED', True)
+
+    @property
+    def sync_interval(self):
+        """Seconds between background syncs; 0 disables the thread"""
+        return getattr(settings, 'ACTIVE_SESSION_INDEX_SYNC_INTERVAL', SYNC_INTERVAL)
+
+    @property
+    def is_warm(self):
+        return self._warm
+
+    def __len__(self):
+        return len(self._rows)
+
+    def lookup(self, normalized_plates):
+        """Rows found in the index, by normalized plate; misses are left out"""
+        if not self.enabled:
+            return {}
+        if not self._warm:
+            with self._full_lock:
+                if not self._warm:
+                    self._load()
+            self.start()
+        rows = self._rows
+        return {plate: rows[plate] for plate in normalized_plates if plate in rows}
+
+    def warm(self):
+        """(Re)load every plate with an active or recently ended session"""
+        with self._full_lock:
+            return self._load()
+
+    def _load(self):
+        with self._lock:
+            self._touched = set()
+        started = timezone.now()
+        cutoff = started - RECENT_WINDOW
+        rows = _recent_rows(Vehicle.objects.filter(pk__in=_recent_vehicle_ids(cutoff)), cutoff)
+        with self._lock:
+            self._rows = rows
+            self._plates = {row['id']: plate for plate, row in rows.items()}
+            self._synced_at = started
+            self._warm = True
+            touched, self._touched = self._touched, None
+        self.refresh_vehicles(touched)
+        logger.info(f'Active session index warmed with {len(rows)} plates')
+        return len(rows)
+
+    def refresh_vehicles(self, vehicle_ids):
+        """Re-read the latest session of some vehicles (one query)"""
+        from .enforcement import add_status_row, status_rows
+
+        vehicle_ids = {pk for pk in vehicle_ids if pk}
+        if not self._warm or not vehicle_ids:
+            return
+        cutoff = timezone.now() - RECENT_WINDOW
+        fresh = list(status_rows(Vehicle.objects.filter(pk__in=vehicle_ids)))
+        with self._lock:
+            if self._touched is not None:
+                self._touched.update(vehicle_ids)
+            for vehicle_id in vehicle_ids:
+                old_plate = self._plates.pop(vehicle_id, None)
+                if old_plate:
+                    self._rows.pop(old_plate, None)
+            for row in fresh:
+                if row['plate_key'] and _is_recent(row, cutoff):
+                    previous = self._rows.get(row['plate_key'])
+                    add_status_row(self._rows, row)
+                    if self._rows[row['plate_key']] is row:
+                        if previous is not None:
+                            self._plates.pop(previous['id'], None)
+                        self._plates[row['id']] = row['plate_key']
+
+    def sync(self):
+        """
+        Re-read the vehicles whose sessions or plate changed since the last
+        sync, in any process, and drop sessions that left the recent window
+        """
+        if not self._warm:
+            return
+        started = timezone.now()
+        since = self._synced_at - SYNC_OVERLAP
+        changed = set(
+            ParkingSession.objects.filter(updated_at__gte=since, vehicle__isnull=False)
+            .values_list('vehicle_id', flat=True)
+            .union(Vehicle.objects.filter(updated_at__gte=since).values_list('id', flat=True))
+        )
+        cutoff = started - RECENT_WINDOW
+        with self._lock:
+            changed.update(
+                vehicle_id for vehicle_id, plate in self._plates.items()
+                if not _is_recent(self._rows[plate], cutoff)
+            )
+        self.refresh_vehicles(changed)
+        self._synced_at = started
+
+    def check(self, repair=True):
+        """
+        Compare the index with the database. Returns the plates whose entry
+        is missing, extra or different; with ``repair`` they are reloaded.
+        """
+        if not self._warm:
+            self.warm()
+            return []
+        with self._full_lock:
+            with self._lock:
+                self._touched = set()
+                known = list(self._plates)
+            cutoff = timezone.now() - RECENT_WINDOW
+            expected = _recent_rows(
+                Vehicle.objects.filter(Q(pk__in=_recent_vehicle_ids(cutoff)) | Q(pk__in=known)), cutoff
+            )
+            with self._lock:
+                touched, self._touched = self._touched, None
+                mismatched = []
+                for plate in sorted(set(expected) | set(self._rows)):
+                    rows = [row for row in (expected.get(plate), self._rows.get(plate)) if row]
+                    # Vehicles refreshed during the read may differ either way
+                    if expected.get(plate) != self._rows.get(plate) and not touched & {r['id'] for r in rows}:
+                        mismatched.append(plate)
+                if mismatched and repair:
+                    self._rows = expected
+                    self._plates = {row['id']: plate for plate, row in expected.items()}
+            if mismatched and repair:
+                self.refresh_vehicles(touched)
+        return mismatched
+
+    def start(self):
+        """Run sync() and check() on a background thread"""
+        with self._lock:
+            if self.sync_interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, args=(self._stop,), name='session-index-sync', daemon=True,
+            )
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            if self._thread is not None:
+                self._stop.set()
+            self._thread = self._stop = None
+
+    def _run(self, stop):
+        next_check = time.monotonic() + CHECK_INTERVAL
+        while not stop.wait(self.sync_interval):
+            try:
+                self.sync()
+                if time.monotonic() >= next_check:
+                    next_check = time.monotonic() + CHECK_INTERVAL
+                    mismatched = self.check()
+                    if mismatched:
+                        logger.warning(f'Active session index repaired {len(mismatched)} plates: '
+                                       f'{", ".join(mismatched[:20])}')
+                    else:
+                        logger.info(f'Active session index consistent ({len(self)} plates)')
+            except Exception:
+                logger.exception('Active session index sync failed')
+                # The thread keeps its own connection between syncs, since
+                # reconnecting every few seconds is costly on a remote pooled
+                # database (close_old_connections() would, with CONN_MAX_AGE
+                # 0); it is dropped after an error and reopened on next use
+                connection.close()
+
+    def clear(self):
+        self.stop()
+        with self._lock:
+            self._rows, self._plates = {}, {}
+            self._warm = False
+            self._synced_at = None
+
+
+session_index = ActiveSessionIndex()
+
+
+@receiver(post_save, sender=ParkingSession)
+@receiver(post_delete, sender=ParkingSession)
+def refresh_session_index(sender, instance, **kwargs):
+    if session_index.is_warm and instance.vehicle_id:
+        vehicle_id = instance.vehicle_id
+        transaction.on_commit(lambda: session_index.refresh_vehicles([vehicle_id]))
+
+
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Vehicle)
+def refresh_session_index_vehicle(sender, instance, **kwargs):
+    if session_index.is_warm:
+        vehicle_id = instance.pk
+        transaction.on_commit(lambda: session_index.refresh_vehicles([vehicle_id]))
@@ -1,8 +1,15 @@
-from celery import shared_task
 from django.utils import timezone
-from .models import ParkingSession
+from .expiry import expire_overdue_sessions
+from .violations import reconcile_violation_counts
 import logging
 
+try:
+    from celery import shared_task
+except ImportError:
+    # Celery is optional: without it run `manage.py expire_sessions --loop`
+    def shared_task(func):
+        return func
+
 logger = logging.getLogger(__name__)
 
 @shared_task
@@ -12,24 +19,39 @@ def auto_terminate_expired_sessions():
     Does NOT create violations - those are only created by controllers
     Run this every 2-5 minutes via Celery Beat
     """
-    now = timezone.now()
-    
-    # Find active sessions that are past grace deadline
-    expired_sessions = ParkingSession.objects.filter(
-        is_active=True,
-        grace_deadline__isnull=False,
-        grace_deadline__lt=now
-    )
-    
-    terminated_count = 0
-    
-    for session in expired_sessions:
-        logger.info(f'Auto-terminating session #{session.id} - grace period expired')
-        
-        if session.auto_terminate_after_grace():
-            terminated_count += 1
-    
+    terminated_count = expire_overdue_sessions(now=timezone.now())
+
     if terminated_count > 0:
         logger.info(f'Auto-terminated {terminated_count} sessions')
-    
+
     return {'terminated': terminated_count}
+
+
+@shared_task
+def reconcile_violations():
+    """
+    Nightly safety net for the violation counters (vehicles/violations.py):
+    fixes counts left stale by bulk updates that bypass Fine.save()
+    """
+    fixed = reconcile_violation_counts()
+
+    if fixed > 0:
+        logger.warning(f'Reconciled violation counts of {fixed} users')
+
+    return {'reconciled': fixed}
+
+
+@shared_task
+def fail_stale_ocr_jobs():
+    """
+    Plate OCR jobs lost with their process (vehicles/ocr.py) are failed so
+    clients stop polling them. Run this every few minutes via Celery Beat
+    """
+    from .ocr import fail_stale_jobs
+
+    failed = fail_stale_jobs()
+
+    if failed > 0:
+        logger.warning(f'Failed {failed} stale plate OCR jobs')
+
+    return {'failed': failed}
@@ -1,3 +1,972 @@
-from django.test import TestCase
+import tempfile
+import threading
+from contextlib import nullcontext
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from parkings.models import Parking
+from tps_backend.testing import QueryCountTestCase
+from users.models import CustomUser
+from . import ocr
+from .enforcement import MAX_BATCH_PLATES, get_plate_status, get_plate_statuses
+from .expiry import expire_overdue_sessions
+from .models import DEFAULT_GRACE_PERIOD_MINUTES, Fine, GlobalSettings, ParkingSession, PlateOCRJob, Vehicle
+from .session_index import session_index
+from .violations import reconcile_violation_counts
+
+
+@skipUnless(connection.vendor == 'postgresql', "EXPLAIN output is Postgres specific")
+def photo(name='AB123CD.png', color='white'):
+    """A small PNG upload; the stub OCR provider reads the plate from its name"""
+    out = BytesIO()
+    Image.new('RGB', (8, 8), color).save(out, format='PNG')
+    return SimpleUploadedFile(name, out.getvalue(), content_type='image/png')
+
+
+def drain_ocr_jobs():
+    """Wait for the queued plate OCR jobs"""
+    with ocr._executor_lock:
+        if ocr._executor is not None:
+            ocr._executor.shutdown(wait=True)
+            ocr._executor = None
+
+
+class ParkingSessionIndexTests(TestCase):
+    """The hot ParkingSession queries are answered by the indexes in Meta.indexes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = CustomUser.objects.bulk_create([
+            CustomUser(email=f'driver{i}@example.com', first_name='A', last_name='B')
+            for i in range(200)
+        ])
+        cls.parkings = Parking.objects.bulk_create([
+            Parking(name=f'P{i}', city='Milano', address='Via Roma', latitude=45.46, longitude=9.19)
+            for i in range(100)
+        ])
+        cls.vehicles = Vehicle.objects.bulk_create(
+            [Vehicle(user=cls.users[i % 200], plate=f'AB{i:03d}CD') for i in range(500)]
+        )
+        now = timezone.now()
+        sessions = []
+        for i in range(20000):
+            start = now - timedelta(minutes=10 * i)
+            active = i % 23 == 0
+            sessions.append(ParkingSession(
+                user=cls.users[i % 200],
+                vehicle=cls.vehicles[i % 500],
+                parking_lot=cls.parkings[i % 100],
+                start_time=start,
+                planned_end_time=start + timedelta(hours=1),
+                end_time=None if active else start + timedelta(hours=1),
+                is_active=active,
+            ))
+        ParkingSession.objects.bulk_create(sessions, batch_size=2000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE vehicles_parkingsession')
+        cls.user = cls.users[0]
+
+    def setUp(self):
+        # The test dataset is small enough for a sequential scan to win;
+        # ask the planner which index it would use on a real-sized table
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+
+    def test_active_sessions_of_parking(self):
+        qs = ParkingSession.objects.filter(parking_lot=self.parkings[0], is_active=True).order_by('-start_time')
+        self.assertUsesIndex(qs, 'session_lot_active_idx')
+
+    def test_parking_history_by_start_time(self):
+        since = timezone.now() - timedelta(days=1)
+        qs = ParkingSession.objects.filter(parking_lot=self.parkings[0], start_time__gte=since)
+        self.assertUsesIndex(qs, 'session_lot_start_idx')
+
+    def test_duplicate_active_session_check(self):
+        qs = ParkingSession.objects.filter(vehicle=self.vehicles[0], is_active=True)
+        self.assertUsesIndex(qs, 'session_vehicle_active_idx')
+
+    def test_latest_session_of_vehicle(self):
+        qs = ParkingSession.objects.filter(vehicle=self.vehicles[0]).order_by('-end_time')[:1]
+        self.assertUsesIndex(qs, 'session_vehicle_end_idx')
+
+    def test_active_sessions_of_user(self):
+        qs = ParkingSession.objects.filter(user=self.user, is_active=True).order_by('-start_time')
+        self.assertUsesIndex(qs, 'session_user_active_idx')
+
+    def test_expiry_sweep(self):
+        qs = ParkingSession.objects.filter(is_active=True, planned_end_time__lt=timezone.now()).order_by('planned_end_time')
+        self.assertUsesIndex(qs, 'session_active_end_idx')
+
+
+class ViolationCounterTests(TestCase):
+    """CustomUser.violations_count follows fine writes (vehicles/violations.py)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        GlobalSettings.objects.create(max_violations=2)
+        cls.owner = CustomUser.objects.create_user(email='owner@example.com')
+        cls.other = CustomUser.objects.create_user(email='other@example.com')
+        cls.vehicle = Vehicle.objects.create(user=cls.owner, plate='AB123CD')
+        cls.other_vehicle = Vehicle.objects.create(user=cls.other, plate='EF456GH')
+
+    def assertStanding(self, user, count, active):
+        user.refresh_from_db(fields=['violations_count', 'is_active'])
+        self.assertEqual((user.violations_count, user.is_active), (count, active))
+
+    def test_create_counts_and_bans(self):
+        Fine.objects.create(vehicle=self.vehicle)
+        self.assertStanding(self.owner, 1, True)
+        Fine.objects.create(vehicle=self.vehicle)
+        self.assertStanding(self.owner, 2, False)
+        Fine.objects.create(vehicle=self.vehicle, status='paid')
+        self.assertStanding(self.owner, 2, False)
+
+    def test_pay_uncounts_and_unbans(self):
+        fines = [Fine.objects.create(vehicle=self.vehicle) for _ in range(2)]
+        fine = Fine.objects.get(pk=fines[0].pk)
+        fine.status = 'paid'
+        fine.save()
+        self.assertStanding(self.owner, 1, True)
+        # Saving again without a status change moves nothing
+        fine.save()
+        self.assertStanding(self.owner, 1, True)
+
+    def test_stale_copies_apply_once(self):
+        """Two requests paying the same fine each loaded it unpaid"""
+        Fine.objects.create(vehicle=self.vehicle)
+        fine = Fine.objects.create(vehicle=self.vehicle)
+        first, second = Fine.objects.get(pk=fine.pk), Fine.objects.get(pk=fine.pk)
+        for copy in (first, second):
+            copy.status = 'paid'
+            copy.save()
+        self.assertStanding(self.owner, 1, True)
+
+    def test_cancel_and_dispute(self):
+        fine = Fine.objects.create(vehicle=self.vehicle)
+        fine.status = 'disputed'
+        fine.save()
+        self.assertStanding(self.owner, 1, True)
+        fine.status = 'cancelled'
+        fine.save()
+        self.assertStanding(self.owner, 0, True)
+        fine.status = 'unpaid'
+        fine.save()
+        self.assertStanding(self.owner, 1, True)
+
+    def test_delete(self):
+        fine = Fine.objects.create(vehicle=self.vehicle)
+        stale = Fine.objects.get(pk=fine.pk)
+        Fine.objects.get(pk=fine.pk).delete()
+        self.assertStanding(self.owner, 0, True)
+        # Already gone: nothing left to uncount
+        stale.delete()
+        self.assertStanding(self.owner, 0, True)
+        Fine.objects.create(vehicle=self.vehicle, status='paid').delete()
+        self.assertStanding(self.owner, 0, True)
+
+    def test_vehicle_reassignment(self):
+        fine = Fine.objects.create(vehicle=self.vehicle)
+        fine.vehicle = self.other_vehicle
+        fine.save()
+        self.assertStanding(self.owner, 0, True)
+        self.assertStanding(self.other, 1, True)
+
+    def test_pay_fine_view_twice(self):
+        fine = Fine.objects.create(vehicle=self.vehicle)
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.post(f'/api/users/fines/{fine.pk}/pay/')
+        self.assertEqual(response.data['new_violation_count'], 0)
+        response = client.post(f'/api/users/fines/{fine.pk}/pay/')
+        self.assertEqual(response.status_code, 400)
+        self.assertStanding(self.owner, 0, True)
+
+    def test_reconcile_violations(self):
+        Fine.objects.create(vehicle=self.vehicle)
+        Fine.objects.create(vehicle=self.other_vehicle)
+        # Writes that bypass save() leave the counters behind
+        Fine.objects.filter(vehicle=self.vehicle).update(status='cancelled')
+        CustomUser.objects.filter(pk=self.other.pk).update(violations_count=5, is_active=False)
+        out = StringIO()
+        call_command('reconcile_violations', '--user', str(self.owner.pk), stdout=out)
+        self.assertIn('1 users reconciled', out.getvalue())
+        self.assertStanding(self.owner, 0, True)
+        self.assertStanding(self.other, 5, False)
+
+        call_command('reconcile_violations', stdout=out)
+        self.assertStanding(self.other, 1, True)
+
+
+class FineBulkViewTests(TestCase):
+    """POST /api/fines/bulk/: permissions, city scoping and counter reconciliation"""
+
+    @classmethod
+    def setUpTestData(cls):
+        GlobalSettings.objects.create(max_violations=2)
+        cls.manager = CustomUser.objects.create_user(email='manager@example.com', role='manager', allowed_cities=['Milano'])
+        cls.admin = CustomUser.objects.create_superuser(email='admin@example.com', password=None)
+        cls.owner = CustomUser.objects.create_user(email='owner@example.com')
+        cls.other = CustomUser.objects.create_user(email='other@example.com')
+        milano = Parking.objects.create(name='M', city='Milano', address='Via Roma')
+        roma = Parking.objects.create(name='R', city='Roma', address='Via Milano')
+
+        def fine(user, plate, parking, **fields):
+            vehicle = Vehicle.objects.create(user=user, plate=plate)
+            session = ParkingSession.objects.create(user=user, vehicle=vehicle, parking_lot=parking, is_active=False)
+            return Fine.objects.create(vehicle=vehicle, session=session, **fields)
+
+        cls.milano_fines = [fine(cls.owner, 'MI001AA', milano), fine(cls.owner, 'MI002AA', milano)]
+        cls.paid_fine = fine(cls.owner, 'MI003AA', milano, status='paid')
+        cls.roma_fine = fine(cls.other, 'RM001AA', roma)
+
+    def post(self, user, action, ids):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post('/api/fines/bulk/', {'action': action, 'ids': ids}, format='json')
+
+    def ids(self, fines):
+        return [fine.pk for fine in fines]
+
+    def test_owner_banned_by_counts(self):
+        self.owner.refresh_from_db()
+        self.assertEqual(self.owner.violations_count, 2)
+        self.assertFalse(self.owner.is_active)
+
+    def test_requires_manager(self):
+        for role in ('user', 'controller'):
+            user = CustomUser.objects.create_user(email=f'{role}@example.com', role=role, allowed_cities=['Milano'])
+            response = self.post(user, 'cancel', self.ids(self.milano_fines))
+            self.assertEqual(response.status_code, 403, role)
+        self.assertFalse(Fine.objects.filter(status='cancelled').exists())
+
+    def test_invalid_payload(self):
+        self.assertEqual(self.post(self.manager, 'delete', self.ids(self.milano_fines)).status_code, 400)
+        self.assertEqual(self.post(self.manager, 'cancel', []).status_code, 400)
+        self.assertEqual(self.post(self.manager, 'cancel', ['1']).status_code, 400)
+
+    def test_manager_limited_to_allowed_cities(self):
+        response = self.post(self.manager, 'cancel', self.ids(self.milano_fines) + [self.roma_fine.pk])
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['ids'], [self.roma_fine.pk])
+        self.assertFalse(Fine.objects.filter(status='cancelled').exists())
+
+        response = self.post(self.manager, 'reset_standing', [self.roma_fine.pk])
+        self.assertEqual(response.status_code, 403)
+
+    def test_fine_without_session_is_out_of_scope(self):
+        vehicle = Vehicle.objects.create(user=self.owner, plate='XX000XX')
+        orphan = Fine.objects.create(vehicle=vehicle)
+        response = self.post(self.manager, 'cancel', self.ids(self.milano_fines) + [orphan.pk])
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['ids'], [orphan.pk])
+        self.assertIn('without a session', response.data['detail'])
+        self.assertFalse(Fine.objects.filter(status='cancelled').exists())
+        self.assertEqual(self.post(self.admin, 'cancel', [orphan.pk]).status_code, 200)
+
+    def test_cancel_reconciles_counts(self):
+        response = self.post(self.manager, 'cancel', self.ids(self.milano_fines) + [self.paid_fine.pk])
+        self.assertEqual(response.status_code, 200)
+        # The paid fine is not an open fine: left alone
+        self.assertEqual(response.data, {'action': 'cancel', 'updated': 2, 'users_updated': 1})
+        self.assertEqual(Fine.objects.filter(status='cancelled').count(), 2)
+        self.paid_fine.refresh_from_db()
+        self.assertEqual(self.paid_fine.status, 'paid')
+        self.owner.refresh_from_db()
+        self.assertEqual(self.owner.violations_count, 0)
+        self.assertTrue(self.owner.is_active)
+
+    def test_mark_paid_reconciles_counts(self):
+        response = self.post(self.manager, 'mark_paid', self.ids(self.milano_fines[:1]))
+        self.assertEqual(response.data, {'action': 'mark_paid', 'updated': 1, 'users_updated': 1})
+        fine = Fine.objects.get(pk=self.milano_fines[0].pk)
+        self.assertEqual(fine.status, 'paid')
+        self.assertIsNotNone(fine.paid_at)
+        self.owner.refresh_from_db()
+        self.assertEqual(self.owner.violations_count, 1)
+        self.assertTrue(self.owner.is_active)
+
+        # Nothing left to pay: no update, no reconciliation
+        response = self.post(self.manager, 'mark_paid', self.ids(self.milano_fines[:1]))
+        self.assertEqual(response.data, {'action': 'mark_paid', 'updated': 0, 'users_updated': 0})
+
+    def test_superuser_acts_in_every_city(self):
+        response = self.post(self.admin, 'cancel', [self.roma_fine.pk])
+        self.assertEqual(response.data['updated'], 1)
+
+    def test_reset_standing(self):
+        response = self.post(self.manager, 'reset_standing', self.ids(self.milano_fines[:1]))
+        self.assertEqual(response.data, {'action': 'reset_standing', 'cancelled': 2, 'users_reset': 1})
+        self.owner.refresh_from_db()
+        self.assertEqual(self.owner.violations_count, 0)
+        self.assertTrue(self.owner.is_active)
+        # Every open fine of the owner is waived, so reconciling keeps them unbanned
+        self.assertEqual(Fine.objects.filter(pk__in=self.ids(self.milano_fines), status='cancelled').count(), 2)
+        self.assertEqual(Fine.objects.get(pk=self.paid_fine.pk).status, 'paid')
+        self.assertEqual(reconcile_violation_counts([self.owner.pk]), 0)
+        self.owner.refresh_from_db()
+        self.assertTrue(self.owner.is_active)
+
+        response = self.post(self.manager, 'reset_standing', self.ids(self.milano_fines))
+        self.assertEqual(response.data, {'action': 'reset_standing', 'cancelled': 0, 'users_reset': 0})
+
+    def test_reset_standing_limited_to_allowed_cities(self):
+        # The owner's fine in Roma would be cancelled too
+        roma = Parking.objects.get(city='Roma')
+        vehicle = Vehicle.objects.create(user=self.owner, plate='RM002AA')
+        session = ParkingSession.objects.create(user=self.owner, vehicle=vehicle, parking_lot=roma, is_active=False)
+        roma_fine = Fine.objects.create(vehicle=vehicle, session=session)
+        response = self.post(self.manager, 'reset_standing', self.ids(self.milano_fines))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['ids'], [roma_fine.pk])
+        self.assertFalse(Fine.objects.filter(status='cancelled').exists())
+
+
+class FineThumbnailTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = CustomUser.objects.create_user(email='owner@example.com')
+        cls.vehicle = Vehicle.objects.create(user=owner, plate='AB123CD')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_thumbnail_built_once(self):
+        fine = Fine.objects.create(vehicle=self.vehicle, evidence_image=photo('evidence.png'))
+        self.assertTrue(fine.evidence_thumbnail)
+        with mock.patch('vehicles.models.make_thumbnail') as make:
+            fine.status = 'paid'
+            fine.save()
+            Fine.objects.get(pk=fine.pk).save()
+        make.assert_not_called()
+
+    def test_unreadable_image_not_retried_on_save(self):
+        upload = SimpleUploadedFile('evidence.jpg', b'not an image', content_type='image/jpeg')
+        fine = Fine.objects.create(vehicle=self.vehicle, evidence_image=upload)
+        self.assertFalse(fine.evidence_thumbnail)
+        with mock.patch('vehicles.models.make_thumbnail') as make:
+            fine.save()
+            Fine.objects.get(pk=fine.pk).save()
+            Fine.objects.get(pk=fine.pk).save(update_fields=['status'])
+        make.assert_not_called()
+
+    def test_new_image_rebuilds_thumbnail(self):
+        fine = Fine.objects.create(vehicle=self.vehicle, evidence_image=photo('evidence.png'))
+        first = fine.evidence_thumbnail.name
+        fine = Fine.objects.get(pk=fine.pk)
+        fine.evidence_image = photo('evidence.png', color='black')
+        fine.save()
+        self.assertNotEqual(fine.evidence_thumbnail.name, first)
+
+        fine.evidence_image = None
+        fine.save()
+        self.assertFalse(fine.evidence_thumbnail)
+
+
+class SessionPayloadTests(TestCase):
+
+    def test_parking_lot_carries_tariff(self):
+        """The apps price the live session from parking_lot.tariff_config_json"""
+        user = CustomUser.objects.create_user(email='driver@example.com')
+        parking = Parking.objects.create(name='P', city='Milano', address='Via Roma',
+                                         tariff_config_json='{"type": "FIXED_DAILY", "daily_rate": 12}')
+        vehicle = Vehicle.objects.create(user=user, plate='AB123CD')
+        ParkingSession.objects.create(user=user, vehicle=vehicle, parking_lot=parking)
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/api/sessions/active/')
+        self.assertEqual(response.data[0]['parking_lot']['tariff_config_json'], parking.tariff_config_json)
+
+
+@override_settings(ACTIVE_SESSION_INDEX_SYNC_INTERVAL=0)
+class ActiveSessionIndexTests(TestCase):
+    """vehicles/session_index.py; syncs are run by hand instead of by the background thread"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = CustomUser.objects.create_user(email='owner@example.com')
+        cls.parking = Parking.objects.create(name='P', city='Milano', address='Via Roma')
+        cls.active = Vehicle.objects.create(user=cls.owner, plate='AA111AA')
+        cls.old = Vehicle.objects.create(user=cls.owner, plate='BB222BB')
+        cls.idle = Vehicle.objects.create(user=cls.owner, plate='CC333CC')
+        now = timezone.now()
+        cls.session = ParkingSession.objects.create(user=cls.owner, vehicle=cls.active, parking_lot=cls.parking)
+        ParkingSession.objects.create(
+            user=cls.owner, vehicle=cls.old, parking_lot=cls.parking, is_active=False,
+            start_time=now - timedelta(days=3), end_time=now - timedelta(days=3, hours=-1),
+        )
+
+    def setUp(self):
+        session_index.clear()
+        session_index.warm()
+
+    def tearDown(self):
+        session_index.clear()
+
+    def other_process(self, model, pk, **fields):
+        """A write made elsewhere: no signals, updated_at bumped as the other process would"""
+        model.objects.filter(pk=pk).update(updated_at=timezone.now(), **fields)
+
+    def test_warm_loads_recent_sessions_only(self):
+        self.assertEqual(set(session_index.lookup(['AA111AA', 'BB222BB', 'CC333CC'])), {'AA111AA'})
+        self.assertEqual(len(session_index), 1)
+
+    def test_lookup_does_not_query_when_warm(self):
+        with self.assertNumQueries(0):
+            rows = session_index.lookup(['AA111AA', 'ZZ999ZZ'])
+        self.assertEqual(rows['AA111AA']['last_id'], self.session.pk)
+
+    def test_refresh_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ParkingSession.objects.create(user=self.owner, vehicle=self.idle, parking_lot=self.parking)
+        self.assertIn('CC333CC', session_index.lookup(['CC333CC']))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.active.plate = 'AA 999 AA'
+            self.active.save()
+        self.assertEqual(set(session_index.lookup(['AA111AA', 'AA999AA'])), {'AA999AA'})
+
+    def test_delta_sync_picks_up_other_processes(self):
+        session = ParkingSession.objects.create(user=self.owner, vehicle=self.idle, parking_lot=self.parking)
+        self.other_process(ParkingSession, session.pk)
+        self.other_process(Vehicle, self.active.pk, plate='AA999AA', plate_normalized='AA999AA')
+        self.assertEqual(session_index.lookup(['CC333CC', 'AA999AA']), {})
+
+        session_index.sync()
+        self.assertEqual(set(session_index.lookup(['AA111AA', 'AA999AA', 'CC333CC'])), {'AA999AA', 'CC333CC'})
+
+    def test_sync_drops_sessions_leaving_the_window(self):
+        self.other_process(ParkingSession, self.session.pk, is_active=False,
+                           end_time=timezone.now() - timedelta(days=2))
+        session_index.sync()
+        self.assertEqual(session_index.lookup(['AA111AA']), {})
+
+    def test_check_reports_and_repairs_drift(self):
+        self.assertEqual(session_index.check(), [])
+        # A vehicle deleted elsewhere leaves no updated_at to sync from
+        Vehicle.objects.filter(pk=self.active.pk).delete()
+        session = ParkingSession.objects.create(user=self.owner, vehicle=self.idle, parking_lot=self.parking)
+        self.other_process(ParkingSession, session.pk)
+
+        self.assertEqual(session_index.check(repair=False), ['AA111AA', 'CC333CC'])
+        self.assertIn('AA111AA', session_index.lookup(['AA111AA']))
+        self.assertEqual(session_index.check(), ['AA111AA', 'CC333CC'])
+        self.assertEqual(set(session_index.lookup(['AA111AA', 'CC333CC'])), {'CC333CC'})
+        self.assertEqual(session_index.check(), [])
+
+    @override_settings(ACTIVE_SESSION_INDEX_SYNC_INTERVAL=60)
+    def test_background_thread(self):
+        session_index.clear()
+        session_index.lookup(['AA111AA'])
+        thread = session_index._thread
+        self.assertTrue(thread.is_alive())
+        session_index.stop()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+
+
+    def test_sync_thread_keeps_its_connection(self):
+        stop = mock.Mock()
+        for error in (None, RuntimeError('connection lost')):
+            with self.subTest(error=error), \
+                    mock.patch.object(session_index, 'sync', side_effect=error), \
+                    mock.patch('vehicles.session_index.connection') as thread_connection, \
+                    self.assertLogs('vehicles.session_index', 'ERROR') if error else nullcontext():
+                stop.wait.side_effect = [False, True]
+                session_index._run(stop)
+                self.assertEqual(thread_connection.close.called, error is not None)
+
+class ExpirySweepTests(TestCase):
+    """vehicles/expiry.py"""
+
+    @classmethod
+    def setUpTestData(cls):
+        GlobalSettings.objects.create(grace_period_minutes=10)
+        cls.driver = CustomUser.objects.create_user(email='driver@example.com')
+        cls.parking = Parking.objects.create(name='P', city='Milano', address='Via Roma')
+
+    def setUp(self):
+        GlobalSettings.invalidate_cache()
+        self.now = timezone.now()
+
+    def session(self, overdue, **fields):
+        """Active session whose planned end was ``overdue`` ago, counted on the parking"""
+        vehicle = Vehicle.objects.create(user=self.driver, plate=f'EX{Vehicle.objects.count():03d}AA')
+        Parking.objects.filter(pk=self.parking.pk).update(active_sessions_count=F('active_sessions_count') + 1)
+        return ParkingSession.objects.create(
+            user=self.driver, vehicle=vehicle, parking_lot=self.parking,
+            start_time=self.now - overdue - timedelta(hours=1), planned_end_time=self.now - overdue,
+            prepaid_cost=Decimal('2.50'), **fields,
+        )
+
+    def active_count(self):
+        return Parking.objects.get(pk=self.parking.pk).active_sessions_count
+
+    def test_grace_boundary(self):
+        at_limit = self.session(timedelta(minutes=10))
+        past = self.session(timedelta(minutes=10, seconds=1))
+        self.assertEqual(expire_overdue_sessions(now=self.now), 1)
+        self.assertTrue(ParkingSession.objects.get(pk=at_limit.pk).is_active)
+        self.assertFalse(ParkingSession.objects.get(pk=past.pk).is_active)
+
+    def test_default_grace_without_configuration(self):
+        GlobalSettings.objects.all().delete()
+        GlobalSettings.invalidate_cache()
+        inside = self.session(timedelta(minutes=DEFAULT_GRACE_PERIOD_MINUTES - 1))
+        self.session(timedelta(minutes=DEFAULT_GRACE_PERIOD_MINUTES + 1))
+        self.assertEqual(expire_overdue_sessions(now=self.now), 1)
+        # The apps are told the same grace period
+        client = APIClient()
+        client.force_authenticate(self.driver)
+        response = client.get('/api/sessions/active/')
+        self.assertEqual([s['id'] for s in response.data], [inside.pk])
+        self.assertEqual(response.data[0]['grace_period_minutes'], DEFAULT_GRACE_PERIOD_MINUTES)
+
+    def test_expired_fields(self):
+        session = self.session(timedelta(hours=1))
+        expire_overdue_sessions(now=self.now)
+        session.refresh_from_db()
+        self.assertFalse(session.is_active)
+        self.assertTrue(session.is_expired)
+        self.assertEqual(session.expired_at, session.planned_end_time)
+        self.assertEqual(session.end_time, session.planned_end_time)
+        self.assertEqual(session.total_cost, Decimal('2.50'))
+
+    def test_batches_and_counter(self):
+        sessions = [self.session(timedelta(hours=1, minutes=i)) for i in range(5)]
+        self.session(timedelta(minutes=1))
+        self.assertEqual(self.active_count(), 6)
+        self.assertEqual(expire_overdue_sessions(now=self.now, batch_size=2), 5)
+        self.assertEqual(ParkingSession.objects.filter(pk__in=[s.pk for s in sessions], is_expired=True).count(), 5)
+        self.assertEqual(self.active_count(), 1)
+        # Nothing left: a second sweep changes nothing
+        self.assertEqual(expire_overdue_sessions(now=self.now, batch_size=2), 0)
+        self.assertEqual(self.active_count(), 1)
+
+
+class ExpirySweepLockTests(TransactionTestCase):
+    """A row locked by another transaction is skipped, then expired exactly once"""
+
+    def test_skip_locked(self):
+        GlobalSettings.objects.create(grace_period_minutes=10)
+        GlobalSettings.invalidate_cache()
+        driver = CustomUser.objects.create_user(email='driver@example.com')
+        parking = Parking.objects.create(name='P', city='Milano', address='Via Roma', active_sessions_count=2)
+        now = timezone.now()
+        sessions = [
+            ParkingSession.objects.create(
+                user=driver, vehicle=Vehicle.objects.create(user=driver, plate=f'LK{i}'), parking_lot=parking,
+                start_time=now - timedelta(hours=2), planned_end_time=now - timedelta(hours=1),
+            )
+            for i in range(2)
+        ]
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    list(ParkingSession.objects.select_for_update().filter(pk=sessions[0].pk))
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            self.assertEqual(expire_overdue_sessions(now=now), 1)
+            self.assertTrue(ParkingSession.objects.get(pk=sessions[0].pk).is_active)
+        finally:
+            release.set()
+            holder.join()
+        self.assertEqual(expire_overdue_sessions(now=now), 1)
+        self.assertEqual(expire_overdue_sessions(now=now), 0)
+        self.assertEqual(Parking.objects.get(pk=parking.pk).active_sessions_count, 0)
+
+
+class PlateCollisionTests(TestCase):
+    """
+    Vehicles whose plate collided with another once normalized have
+    plate_normalized NULL (migration 0003) and must still be found by officers
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.controller = CustomUser.objects.create_user(
+            email='controller@example.com', role='controller', allowed_cities=['Milano'])
+        cls.owner = CustomUser.objects.create_user(email='owner@example.com')
+        cls.parking = Parking.objects.create(name='P', city='Milano', address='Via Roma')
+        cls.normalized = Vehicle.objects.create(user=cls.owner, plate='AB123CD')
+        cls.duplicate = Vehicle.objects.create(user=cls.owner, plate='ab-123-cd-x')
+        # As left by the 0003 backfill
+        Vehicle.objects.filter(pk=cls.duplicate.pk).update(plate='ab-123-cd', plate_normalized=None)
+        cls.duplicate.refresh_from_db()
+
+    def setUp(self):
+        session_index.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.controller)
+
+    def start_session(self, vehicle):
+        # Run the on-commit index refresh
+        with self.captureOnCommitCallbacks(execute=True):
+            return ParkingSession.objects.create(user=self.owner, vehicle=vehicle, parking_lot=self.parking)
+
+    def status(self, plate='AB 123 CD'):
+        return self.client.get(f'/api/plates/{plate}/status/').data
+
+    def test_save_keeps_collision_unnormalized(self):
+        self.duplicate.name = 'Renamed'
+        self.duplicate.save()
+        self.duplicate.refresh_from_db()
+        self.assertIsNone(self.duplicate.plate_normalized)
+
+    def test_insert_collision_unnormalized(self):
+        vehicle = Vehicle.objects.create(user=self.owner, plate='AB 123-CD')
+        self.assertIsNone(vehicle.plate_normalized)
+
+    def test_validation_rejects_collision(self):
+        with self.assertRaisesMessage(ValidationError, 'A vehicle with this plate already exists.'):
+            Vehicle(user=self.owner, plate='AB 123-CD', name='Car').full_clean()
+        Vehicle(user=self.owner, plate='ZZ999ZZ', name='Car').full_clean()
+
+    def test_found_once_the_plate_is_free(self):
+        self.normalized.plate = 'ZZ999ZZ'
+        self.normalized.save()
+        self.assertEqual(self.status()['vehicle_id'], self.duplicate.pk)
+
+    def test_latest_session_wins(self):
+        self.start_session(self.duplicate)
+        for warm in (False, True):
+            with self.subTest(warm=warm):
+                status = self.status()
+                self.assertEqual(status['vehicle_id'], self.duplicate.pk)
+                self.assertEqual(status['status'], 'active')
+
+        response = self.client.post('/api/plates/status/', {'plates': ['AB123CD']}, format='json')
+        self.assertEqual(response.data['results'][0]['vehicle_id'], self.duplicate.pk)
+
+        self.start_session(self.normalized)
+        self.assertEqual(self.status()['vehicle_id'], self.normalized.pk)
+
+    def test_index_check_agrees(self):
+        self.start_session(self.duplicate)
+        self.start_session(self.normalized)
+        session_index.warm()
+        self.assertEqual(session_index.check(repair=False), [])
+
+    def test_report_fines_the_vehicle_on_the_street(self):
+        self.start_session(self.duplicate)
+        response = self.client.post('/api/users/violations/report/', {'plate': 'AB123CD', 'reason': 'Parking Violation'})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Fine.objects.get(pk=response.data['fine_id']).vehicle_id, self.duplicate.pk)
+
+    def test_duplicate_plate_rejected(self):
+        self.normalized.delete()
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.post('/api/vehicles/', {'plate': 'AB 123 CD'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(ACTIVE_SESSION_INDEX_SYNC_INTERVAL=0)
+class PlateStatusBatchViewTests(TestCase):
+    """get_plate_statuses() and POST /api/plates/status/ (vehicles/enforcement.py)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = CustomUser.objects.create_user(email='owner@example.com')
+        milano = Parking.objects.create(name='M', city='Milano', address='Via Roma')
+        roma = Parking.objects.create(name='R', city='Roma', address='Via Milano')
+        now = timezone.now()
+        for plate, parking, start in (('MI111AA', milano, now), ('RM222BB', roma, now),
+                                      ('MI333CC', milano, now - timedelta(days=3))):
+            vehicle = Vehicle.objects.create(user=owner, plate=plate)
+            ParkingSession.objects.create(user=owner, vehicle=vehicle, parking_lot=parking, start_time=start,
+                                          planned_end_time=start + timedelta(hours=2),
+                                          is_active=start == now)
+
+    def setUp(self):
+        GlobalSettings.invalidate_cache()
+        session_index.clear()
+        self.addCleanup(session_index.clear)
+        controller = CustomUser.objects.create_user(email='controller@example.com', role='controller',
+                                                    allowed_cities=['Milano'])
+        self.client = APIClient()
+        self.client.force_authenticate(controller)
+
+    def post(self, data):
+        return self.client.post('/api/plates/status/', data, format='json')
+
+    def test_index_hit_and_database_miss(self):
+        session_index.warm()
+        GlobalSettings.grace_minutes()
+        # Active session: answered by the index
+        with self.assertNumQueries(0):
+            [active] = get_plate_statuses(['mi 111 aa'])
+        self.assertEqual((active['status'], active['can_issue_ticket']), ('active', False))
+        # Ended three days ago, so not in the index: one query
+        with self.assertNumQueries(1):
+            [expired] = get_plate_statuses(['MI333CC'])
+        self.assertEqual((expired['status'], expired['can_issue_ticket']), ('expired', True))
+        self.assertEqual(get_plate_statuses(['MI111AA', 'MI333CC', 'ZZ999ZZ']),
+                         [active | {'plate': 'MI111AA'}, expired, get_plate_status('ZZ999ZZ')])
+
+    def test_other_cities_masked(self):
+        response = self.post({'plates': ['MI111AA', 'RM222BB']})
+        self.assertEqual(response.status_code, 200)
+        milano, roma = response.data['results']
+        self.assertEqual((milano['status'], milano['city']), ('active', 'Milano'))
+        # No session details for a city the controller may not check
+        self.assertEqual(roma, {'plate': 'RM222BB', 'status': 'unauthorized_city',
+                                'can_issue_ticket': False, 'city': 'Roma'})
+
+    def test_batch_limit(self):
+        plates = [f'ZZ{i:03d}ZZ' for i in range(MAX_BATCH_PLATES)]
+        self.assertEqual(len(self.post({'plates': plates}).data['results']), MAX_BATCH_PLATES)
+        self.assertEqual(self.post({'plates': plates + ['ZZ999ZZ']}).status_code, 400)
+
+    def test_invalid_body(self):
+        for data in (['AB123CD'], 'AB123CD', {'plates': 'AB123CD'}, {'plates': [1]}, {}):
+            with self.subTest(data=data):
+                self.assertEqual(self.post(data).status_code, 400)
+
+    def test_unknown_plates(self):
+        response = self.post({'plates': ['AB123CD', 'zz 999 zz']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.data['results']], ['no_vehicle', 'no_vehicle'])
+
+
+class OCRResultCacheTests(SimpleTestCase):
+    """vehicles/ocr.py: LRU with a TTL, and the stub provider"""
+
+    def setUp(self):
+        self.cache = ocr.OCRResultCache(max_size=2, ttl=60)
+        patcher = mock.patch('vehicles.ocr.time.monotonic', return_value=1000.0)
+        self.clock = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def key(self, image):
+        return self.cache.key('stub', image)
+
+    def test_least_recently_used_evicted(self):
+        a, b, c = self.key(b'a'), self.key(b'b'), self.key(b'c')
+        self.cache.set(a, 'A')
+        self.cache.set(b, 'B')
+        self.assertEqual(self.cache.get(a), 'A')
+        # b is now the least recently used
+        self.cache.set(c, 'C')
+        self.assertIsNone(self.cache.get(b))
+        self.assertEqual((self.cache.get(a), self.cache.get(c)), ('A', 'C'))
+        self.assertEqual(self.cache.stats(), {
+            'size': 2, 'max_size': 2, 'ttl_seconds': 60,
+            'hits': 3, 'misses': 1, 'evictions': 1, 'hit_rate': 0.75,
+        })
+
+    def test_entries_expire(self):
+        key = self.key(b'a')
+        self.cache.set(key, 'A')
+        self.clock.return_value += 60
+        self.assertEqual(self.cache.get(key), 'A')
+        self.clock.return_value += 1
+        self.assertIsNone(self.cache.get(key))
+        stats = self.cache.stats()
+        self.assertEqual((stats['size'], stats['hits'], stats['misses'], stats['evictions']), (0, 1, 1, 0))
+
+    def test_keyed_by_provider_and_bytes(self):
+        self.assertEqual(self.key(b'a'), self.key(b'a'))
+        self.assertNotEqual(self.key(b'a'), self.key(b'b'))
+        self.assertNotEqual(self.key(b'a'), self.cache.key('platerecognizer', b'a'))
+
+    def test_stub_provider_reads_the_file_name(self):
+        provider = ocr.StubProvider()
+        self.assertEqual(provider.recognize(b'', 'uploads/ab-123 cd.jpg')['plate'], 'AB123CD')
+        self.assertEqual(provider.recognize(b'', '--.jpg'), ocr.empty_result())
+
+
+@override_settings(PLATE_OCR_PROVIDER='stub')
+class PlateOCRJobTests(TransactionTestCase):
+    """Job lifecycle with the stub provider; the worker threads commit, hence TransactionTestCase"""
+
+    def setUp(self):
+        ocr.result_cache.clear()
+        self.user = CustomUser.objects.create_user(email='controller@example.com', role='controller')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        drain_ocr_jobs()
+
+    def photo(self, name='AB123CD.png', color='white'):
+        return photo(name, color)
+
+    def submit(self, photo=None):
+        response = self.client.post('/api/vehicles/plate-ocr/jobs/', {'image': photo or self.photo()})
+        self.assertEqual(response.status_code, 202, response.data)
+        return response.data
+
+    def poll(self, job):
+        return self.client.get(f"/api/vehicles/plate-ocr/jobs/{job['id']}/").data
+
+    def test_job_done(self):
+        job = self.submit()
+        self.assertIn(job['status'], ('pending', 'processing', 'done'))
+        drain_ocr_jobs()
+        job = self.poll(job)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result']['plate'], 'AB123CD')
+        self.assertIsNotNone(job['finished_at'])
+
+    def test_same_photo_answered_from_cache(self):
+        self.submit()
+        drain_ocr_jobs()
+        job = self.submit()
+        # Done at once, without a worker
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result']['plate'], 'AB123CD')
+        self.assertEqual(ocr.result_cache.stats()['hits'], 1)
+
+        job = self.submit(self.photo(color='black'))
+        self.assertNotEqual(job['status'], 'done')
+
+    def test_provider_failure(self):
+        with mock.patch.object(ocr.StubProvider, 'recognize', side_effect=ocr.OCRError({"error": "down"}, 502)):
+            job = self.submit()
+            drain_ocr_jobs()
+        job = self.poll(job)
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error'], {"error": "down"})
+        # Failures are not cached
+        self.assertEqual(ocr.result_cache.stats()['size'], 0)
+
+    def test_other_users_job_not_found(self):
+        job = self.submit()
+        other = CustomUser.objects.create_user(email='other@example.com', role='controller')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f"/api/vehicles/plate-ocr/jobs/{job['id']}/").status_code, 404)
+
+    def test_lost_job_fails_after_timeout(self):
+        lost = PlateOCRJob.objects.create(user=self.user, provider='stub', status='processing')
+        fresh = PlateOCRJob.objects.create(user=self.user, provider='stub')
+        PlateOCRJob.objects.filter(pk=lost.pk).update(created_at=timezone.now() - timedelta(minutes=10))
+
+        job = self.poll({'id': lost.pk})
+        self.assertEqual(job['status'], 'failed')
+        self.assertIsNotNone(job['finished_at'])
+        self.assertEqual(self.poll({'id': fresh.pk})['status'], 'pending')
+
+        PlateOCRJob.objects.filter(pk=fresh.pk).update(created_at=timezone.now() - timedelta(minutes=10))
+        self.assertEqual(ocr.fail_stale_jobs(), 1)
+        self.assertEqual(ocr.fail_stale_jobs(), 0)
+
+    @override_settings(PLATE_OCR_PROVIDER='nope')
+    def test_unknown_provider(self):
+        self.assertEqual([e.id for e in ocr.check_provider(None)], ['vehicles.E001'])
+        response = self.client.post('/api/vehicles/plate-ocr/jobs/', {'image': self.photo()})
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('nope', response.data['error'])
+        response = self.client.post('/api/vehicles/plate-ocr/', {'image': self.photo()})
+        self.assertEqual(response.status_code, 500)
+
+    def test_known_provider_passes_check(self):
+        self.assertEqual(ocr.check_provider(None), [])
+
+
+class VehicleQueryCountTests(QueryCountTestCase):
+    """Vehicle, session and plate endpoints run the same number of queries with N and 10 x N rows"""
+
+    def plates(self):
+        return list(Vehicle.objects.order_by('id').values_list('plate', flat=True))
+
+    def test_vehicle_list(self):
+        self.assertConstantQueries(self.driver, '/api/vehicles/')
+
+    def test_session_list(self):
+        self.assertConstantQueries(self.driver, '/api/sessions/')
+
+    def test_session_list_paginated(self):
+        self.assertConstantQueries(self.driver, '/api/sessions/?page_size=50')
+
+    def test_active_sessions(self):
+        self.assertConstantQueries(self.driver, '/api/sessions/active/')
+
+    def test_session_export(self):
+        self.assertConstantQueries(self.driver, '/api/sessions/export/')
+
+    def test_search_by_plate(self):
+        self.assertConstantQueries(self.controller, lambda: f'/api/sessions/search_by_plate/?plate={self.plates()[0]}')
+
+    def test_plate_status(self):
+        self.assertConstantQueries(self.controller, lambda: f'/api/plates/{self.plates()[0]}/status/')
+
+    def test_plate_status_batch(self):
+        self.assertConstantQueries(
+            self.controller, '/api/plates/status/', method='post', data=lambda: {'plates': self.plates()})
+
+    def test_plate_ocr_stats(self):
+        self.assertConstantQueries(self.manager, '/api/vehicles/plate-ocr/stats/')
+
+    def test_session_start(self):
+        def data():
+            vehicle = Vehicle.objects.create(user=self.driver, plate=f'NW{self.rows:03d}AA')
+            return {'vehicle_id': vehicle.pk, 'parking_lot_id': Parking.objects.latest('id').pk,
+                    'duration_purchased_minutes': 60}
+        self.assertConstantQueries(self.driver, '/api/sessions/', method='post', data=data)
+
+    def test_session_end(self):
+        def path():
+            session = ParkingSession.objects.filter(user=self.driver, is_active=True).latest('id')
+            return f'/api/sessions/{session.pk}/end_session/'
+        self.assertConstantQueries(self.driver, path, method='post')
+
+    @override_settings(PLATE_OCR_PROVIDER='stub')
+    def test_plate_ocr(self):
+        self.assertConstantQueries(
+            self.controller, '/api/vehicles/plate-ocr/', method='post', data=lambda: {'image': photo()},
+            format='multipart')
+
+    @override_settings(PLATE_OCR_PROVIDER='stub')
+    def test_plate_ocr_job_submit(self):
+        self.addCleanup(drain_ocr_jobs)
+        self.assertConstantQueries(
+            self.controller, '/api/vehicles/plate-ocr/jobs/', method='post', data=lambda: {'image': photo()},
+            format='multipart')
+
+    def test_plate_ocr_job(self):
+        def path():
+            job = PlateOCRJob.objects.filter(user=self.controller).latest('created_at')
+            return f'/api/vehicles/plate-ocr/jobs/{job.pk}/'
+        self.assertConstantQueries(self.controller, path)
+
+    def test_fine_bulk(self):
+        self.assertConstantQueries(
+            self.manager, '/api/fines/bulk/', method='post',
+            data=lambda: {'action': 'cancel', 'ids': list(Fine.objects.values_list('id', flat=True))})
+
+    def test_admin_changelists(self):
+        self.assertConstantChangelists('vehicles')
@@ -1,7 +1,8 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import VehicleViewSet, ParkingSessionViewSet
-from .views import VehicleViewSet, ParkingSessionViewSet, PlateOCRView
+from .views import VehicleViewSet, ParkingSessionViewSet, PlateOCRView, PlateStatusView, PlateStatusBatchView
+from .views import PlateOCRJobView, PlateOCRJobDetailView, PlateOCRStatsView, FineBulkView
 
 router = DefaultRouter()
 router.register(r'vehicles', VehicleViewSet, basename='vehicle')
@@ -9,5 +10,11 @@ router.register(r'sessions', ParkingSessionViewSet, basename='session')
 
 urlpatterns = [
     path('vehicles/plate-ocr/', PlateOCRView.as_view(), name='plate-ocr'),
+    path('vehicles/plate-ocr/jobs/', PlateOCRJobView.as_view(), name='plate-ocr-jobs'),
+    path('vehicles/plate-ocr/stats/', PlateOCRStatsView.as_view(), name='plate-ocr-stats'),
+    path('vehicles/plate-ocr/jobs/<uuid:job_id>/', PlateOCRJobDetailView.as_view(), name='plate-ocr-job'),
+    path('fines/bulk/', FineBulkView.as_view(), name='fine-bulk'),
+    path('plates/status/', PlateStatusBatchView.as_view(), name='plate-status-batch'),
+    path('plates/<str:plate>/status/', PlateStatusView.as_view(), name='plate-status'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
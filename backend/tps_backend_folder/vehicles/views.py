@@ -2,53 +2,37 @@ from rest_framework import viewsets, permissions, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from .models import Vehicle, ParkingSession
-from .serializers import VehicleSerializer, ParkingSessionSerializer, ControllerParkingSessionSerializer
+from .models import Vehicle, ParkingSession, PlateOCRJob
+from .serializers import VehicleSerializer, ParkingSessionSerializer, ControllerParkingSessionSerializer, PlateOCRJobSerializer
+from .ocr import OCRError, expire_if_stale, recognize, result_cache, submit_job
+from .enforcement import MAX_BATCH_PLATES, city_denied, get_plate_status, get_plate_statuses
+from .violations import BULK_STATUS_ACTIONS, bulk_set_fine_status, owners_open_fines, reset_owner_standing
 from parkings.models import Parking
+from parkings.stats import record_session_started, record_session_ended
+from parkings.tariffs import get_tariff_plan
+from tps_backend.pagination import KeysetPagination
+from tps_backend.export import NDJSONExportMixin
+from tps_backend.images import InvalidImage, read_downscaled
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal
 import json
 from .models import Vehicle, Fine
-# OCR imports
-import os
-import re
-import requests
+from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser
 
 
-def calculate_prepaid_cost(parking_lot, duration_minutes):
+def calculate_prepaid_cost(parking_lot, duration_minutes, start_time=None):
     """
-    Calcola il costo prepagato utilizzando la tariff_config_json.
-    Supporta HOURLY_LINEAR e FIXED_DAILY di base.
+    Calcola il costo prepagato dal piano tariffario compilato del parcheggio
+    (parkings/tariffs.py): fasce giorno/notte, flex_rules HOURLY_VARIABLE e soste su più giorni.
     """
     if not parking_lot or not parking_lot.tariff_config_json:
-        return 0.00
+        return Decimal('0.00')
 
-    duration_hours = duration_minutes / 60.0
-    cost = 0.00
-
-    try:
-        config = json.loads(parking_lot.tariff_config_json)
-        tariff_type = config.get('type', 'HOURLY_LINEAR')
-
-        if tariff_type == 'FIXED_DAILY':
-            daily_rate = float(config.get('daily_rate', 20.00))
-            # Logica Proporzionale con Cap Giornaliero
-            hourly_proportion = daily_rate / 24.0
-            calculated = duration_hours * hourly_proportion
-            cost = daily_rate if calculated > daily_rate else calculated
-
-        else:  # HOURLY_LINEAR (e fallback per VARIABLE)
-            # Usa day_base_rate come riferimento standard
-            hourly_rate = float(config.get('day_base_rate', 2.00))
-            cost = duration_hours * hourly_rate
-
-    except (json.JSONDecodeError, ValueError, TypeError):
-        # Fallback di emergenza
-        cost = duration_hours * 2.00
-
-    return round(cost, 2)
+    return get_tariff_plan(parking_lot).quote(duration_minutes, start_time)
 
 
 class VehicleViewSet(viewsets.ModelViewSet):
@@ -92,18 +76,25 @@ class VehicleViewSet(viewsets.ModelViewSet):
 
 
 
-class ParkingSessionViewSet(viewsets.ModelViewSet):
+class ParkingSessionViewSet(NDJSONExportMixin, viewsets.ModelViewSet):
     """
     User Side: Managing parking sessions
     """
     serializer_class = ParkingSessionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering = ('-start_time', '-id')
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return ParkingSession.objects.filter(user=self.request.user)
+            return ParkingSession.objects.filter(user=self.request.user).select_related('vehicle', 'parking_lot')
         return ParkingSession.objects.none()
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Whole session history of the user as NDJSON"""
+        return self.stream_ndjson(self.get_queryset().order_by('-start_time', '-id'), 'sessions.ndjson')
+
     @action(detail=False, methods=['get'])
     def active(self, request):
         active_sessions = self.get_queryset().filter(is_active=True)
@@ -117,9 +108,9 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
 
         duration_minutes = serializer.validated_data.pop('duration_purchased_minutes', 0)
 
-        prepaid_cost_server = calculate_prepaid_cost(parking_lot, duration_minutes)
-
         start_time = timezone.now()
+
+        prepaid_cost_server = calculate_prepaid_cost(parking_lot, duration_minutes, start_time)
         
         if duration_minutes > 0:
             end_time = start_time + timedelta(minutes=duration_minutes)
@@ -146,6 +137,7 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
             is_expired=False,
             expired_at=None,
         )
+        record_session_started(serializer.instance)
     @action(detail=True, methods=['post'])
     def end_session(self, request, pk=None):
         session = self.get_object()
@@ -156,7 +148,16 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        session.end_session() 
+        with transaction.atomic():
+            ended = session.end_session()
+            # Only the request that actually closed it frees the place
+            if ended:
+                record_session_ended(session)
+        if not ended:
+            return Response(
+                {'detail': 'Session is already active/ended.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         serializer = self.get_serializer(session)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
@@ -166,11 +167,9 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
         if not plate:
             return Response({"detail": "Plate parameter is required."}, status=400)
 
-        sessions = ParkingSession.objects.filter(
-            vehicle__plate__iexact=plate
-        ).order_by('-start_time')
+        plate_status = get_plate_status(plate)
 
-        if not sessions.exists():
+        if plate_status['status'] in ('no_vehicle', 'no_session'):
             return Response({
                 "status": "no_session",
                 "can_issue_ticket": True,
@@ -178,76 +177,27 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
                 "session_data": None
             }, status=200)
 
-        session = sessions.first()
-        
-        session_data = ParkingSessionSerializer(session).data
-        
-        now = timezone.now()
-        grace_minutes = getattr(session, 'grace_period_minutes', 5)
-
-        reference_time = None
-        
-        if session.planned_end_time:
-            if session.end_time:
-                if session.end_time > session.planned_end_time:
-                    reference_time = session.planned_end_time
-                else:
-                    reference_time = session.end_time
-            else:
-
-                reference_time = session.planned_end_time
-        else:
-            if session.end_time:
-                reference_time = session.end_time
-            else:
-
-                reference_time = now 
-
-        grace_end_time_utc = reference_time + timedelta(minutes=grace_minutes)
-
-        grace_end_time_local_str = timezone.localtime(grace_end_time_utc).strftime('%H:%M')
+        denied_city = city_denied(request.user, plate_status)
+        if denied_city:
+            return Response({
+                "detail": f"Unauthorized city: {denied_city}"
+            }, status=403)
 
-        status_code = "active"
-        can_issue_ticket = False
-        message = "Session is active."
+        status_code = plate_status['status']
+        can_issue_ticket = plate_status['can_issue_ticket']
 
-        if session.is_active and not session.end_time and (not session.planned_end_time or now < session.planned_end_time):
-             return Response({
-                "status": "active",
-                "can_issue_ticket": False,
-                "message": "Session is active (Ongoing).",
-                "session_data": session_data
-            }, status=200)
+        session = ParkingSession.objects.select_related('vehicle', 'parking_lot').get(pk=plate_status['session_id'])
+        session_data = ParkingSessionSerializer(session).data
 
-        if now < reference_time:
-            status_code = "active"
-            can_issue_ticket = False
+        if status_code == "active":
             message = "Session is active."
-        
-        elif now < grace_end_time_utc:
-            status_code = "grace_period"
-            can_issue_ticket = False
+        elif status_code == "grace_period":
+            grace_end_time_local_str = timezone.localtime(plate_status['grace_ends_at']).strftime('%H:%M')
             message = f"In Grace Period (Expires at {grace_end_time_local_str})"
-            session_data['end_time'] = reference_time
-            
+            session_data['end_time'] = plate_status['expires_at']
         else:
-            status_code = "expired"
-            can_issue_ticket = True
             message = "Session expired. You can issue a ticket."
-            session_data['end_time'] = reference_time
-
-        user = request.user
-        if not (user.is_superuser or (hasattr(user, 'role') and user.role == 'superuser')):
-            if hasattr(user, 'role') and user.role == 'controller':
-                if session.parking_lot:
-                    lot_city = session.parking_lot.city
-                    allowed = getattr(user, 'allowed_cities', [])
-                    if not allowed: allowed = []
-                    
-                    if lot_city not in allowed:
-                        return Response({
-                            "detail": f"Unauthorized city: {lot_city}"
-                        }, status=403)
+            session_data['end_time'] = plate_status['expires_at']
 
         return Response({
             "status": status_code,            
@@ -255,18 +205,123 @@ class ParkingSessionViewSet(viewsets.ModelViewSet):
             "message": message,
             "session_data": session_data
         }, status=200)
-    
 
 
-def normalize_plate(raw: str) -> str:
-    if not raw:
-        return ""
-    s = raw.strip().upper()
-    s = re.sub(r"[^A-Z0-9]", "", s)
-    return s
+class PlateStatusBatchView(APIView):
+    """
+    POST /api/plates/status/  {"plates": ["AB123CD", ...]}
+    Status of every plate of a street sweep, from one set-based query.
+    Plates in a city the controller may not check are reported as
+    unauthorized_city without session details.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        user = request.user
+        if not (user.is_superuser or getattr(user, 'role', None) in ['controller', 'manager', 'superuser']):
+            return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
+
+        plates = request.data.get('plates') if isinstance(request.data, dict) else None
+        if not isinstance(plates, list) or not all(isinstance(p, str) for p in plates):
+            return Response({"detail": "plates must be a list of strings."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(plates) > MAX_BATCH_PLATES:
+            return Response({"detail": f"At most {MAX_BATCH_PLATES} plates per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = []
+        for plate_status in get_plate_statuses(plates):
+            denied_city = city_denied(user, plate_status)
+            if denied_city:
+                plate_status = {
+                    "plate": plate_status['plate'],
+                    "status": "unauthorized_city",
+                    "can_issue_ticket": False,
+                    "city": denied_city,
+                }
+            results.append(plate_status)
+
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+
+MAX_BULK_FINES = 5000
+
+
+class FineBulkView(APIView):
+    """
+    POST /api/fines/bulk/  {"action": "cancel" | "mark_paid" | "reset_standing", "ids": [1, 2, ...]}
+    Set-based status change of many fines; the owners' violation counts
+    are reconciled once at the end (vehicles/violations.py).
+    Managers may only act on fines issued in their allowed_cities.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    ACTIONS = (*BULK_STATUS_ACTIONS, 'reset_standing')
+
+    def post(self, request):
+        user = request.user
+        if not (user.is_superuser or getattr(user, 'role', None) in ['manager', 'superuser']):
+            return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
+
+        action_name = request.data.get('action')
+        if action_name not in self.ACTIONS:
+            return Response({"detail": f"action must be one of {list(self.ACTIONS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+            return Response({"detail": "ids must be a non-empty list of fine ids."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > MAX_BULK_FINES:
+            return Response({"detail": f"At most {MAX_BULK_FINES} fines per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+        fines = Fine.objects.filter(pk__in=ids)
+        if not user.is_superuser:
+            # A fine's city is the one of its session's parking: fines without
+            # a session have none and are left to superusers
+            unscoped = sorted(fines.filter(session__isnull=True).values_list('pk', flat=True))
+            if unscoped:
+                return Response(
+                    {"detail": "Fines without a session have no city; only a superuser can change them.", "ids": unscoped},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+            allowed = user.allowed_cities or []
+            # Resetting the owners' standing cancels all their open fines
+            scoped = owners_open_fines(fines) if action_name == 'reset_standing' else fines
+            outside = sorted(scoped.exclude(session__parking_lot__city__in=allowed).values_list('pk', flat=True))
+            if outside:
+                return Response(
+                    {"detail": "Fines outside your cities.", "ids": outside},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+
+        if action_name == 'reset_standing':
+            cancelled, reset = reset_owner_standing(fines)
+            return Response(
+                {"action": action_name, "cancelled": cancelled, "users_reset": reset}, status=status.HTTP_200_OK,
+            )
+
+        updated, owners = bulk_set_fine_status(fines, action_name)
+        return Response({"action": action_name, "updated": updated, "users_updated": owners}, status=status.HTTP_200_OK)
+
+
+class PlateStatusView(APIView):
+    """
+    GET /api/plates/<plate>/status/
+    Compact enforcement status of a plate, answered by a single query.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, plate):
+        user = request.user
+        if not (user.is_superuser or getattr(user, 'role', None) in ['controller', 'manager', 'superuser']):
+            return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
+
+        plate_status = get_plate_status(plate)
+
+        denied_city = city_denied(user, plate_status)
+        if denied_city:
+            return Response({"detail": f"Unauthorized city: {denied_city}"}, status=status.HTTP_403_FORBIDDEN)
+
+        return Response(plate_status, status=status.HTTP_200_OK)
 
 
 class PlateOCRView(APIView):
+    """Synchronous OCR, kept for existing clients; new clients use the job endpoints"""
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser]
 
@@ -277,72 +332,63 @@ class PlateOCRView(APIView):
                 {"error": "Missing image file field 'image'."},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        token = os.getenv("PLATE_RECOGNIZER_TOKEN")
-        if not token:
-            return Response(
-                {"error": "Server missing PLATE_RECOGNIZER_TOKEN environment variable."},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-
-        url = "https://api.platerecognizer.com/v1/plate-reader/"
-        headers = {"Authorization": f"Token {token}"}
 
-        data = {"regions": "it"}
+        try:
+            image_bytes, name, content_type = read_downscaled(img)
+        except InvalidImage as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            img_bytes = img.read()
-            resp = requests.post(
-                url,
-                headers=headers,
-                data=data,
-                files={"upload": (img.name, img_bytes, img.content_type or "application/octet-stream")},
-                timeout=8,
-            )
-        except requests.RequestException as e:
-            return Response(
-                {"error": f"OCR request failed: {str(e)}"},
-                status=status.HTTP_502_BAD_GATEWAY
-            )
+            result = recognize(image_bytes, name, content_type)
+        except OCRError as e:
+            return Response(e.payload, status=e.status_code)
 
-        if resp.status_code not in (200, 201):
-            return Response(
-                {
-                    "error": "OCR provider returned error",
-                    "provider_status": resp.status_code,
-                    "provider_body": resp.text[:500],
-                },
-                status=status.HTTP_502_BAD_GATEWAY
-            )
+        return Response(result, status=status.HTTP_200_OK)
 
-        payload = resp.json()
-        results = payload.get("results") or []
 
-        if not results:
+class PlateOCRJobView(APIView):
+    """
+    POST /api/vehicles/plate-ocr/jobs/  (multipart, field 'image')
+    Queues the photo and answers 202 at once; poll the returned job.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        img = request.FILES.get("image")
+        if not img:
             return Response(
-                {"plate": "", "confidence": 0.0, "candidates": []},
-                status=status.HTTP_200_OK
+                {"error": "Missing image file field 'image'."},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        best = results[0]
-        best_plate = normalize_plate(best.get("plate", ""))
-        best_score = float(best.get("score") or 0.0)
-
-        candidates = []
-        raw_candidates = best.get("candidates") or []
-        if raw_candidates:
-            for c in raw_candidates[:3]:
-                candidates.append({
-                    "plate": normalize_plate(c.get("plate", "")),
-                    "confidence": float(c.get("score") or 0.0)
-                })
-        else:
-            candidates.append({"plate": best_plate, "confidence": best_score})
-
-        return Response(
-            {
-                "plate": best_plate,
-                "confidence": best_score,
-                "candidates": candidates
-            },
-            status=status.HTTP_200_OK
-        )
\ No newline at end of file
+        try:
+            image_bytes, name, content_type = read_downscaled(img)
+        except InvalidImage as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            job = submit_job(request.user, image_bytes, name, content_type)
+        except OCRError as e:
+            return Response(e.payload, status=e.status_code)
+        return Response(PlateOCRJobSerializer(job, context={'request': request}).data, status=status.HTTP_202_ACCEPTED)
+
+
+class PlateOCRJobDetailView(APIView):
+    """GET /api/vehicles/plate-ocr/jobs/<id>/ - status and result of an OCR job"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = expire_if_stale(get_object_or_404(PlateOCRJob, pk=job_id, user=request.user))
+        return Response(PlateOCRJobSerializer(job, context={'request': request}).data, status=status.HTTP_200_OK)
+
+
+class PlateOCRStatsView(APIView):
+    """GET /api/vehicles/plate-ocr/stats/ - OCR result cache hit/miss counters"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        if not (user.is_superuser or getattr(user, 'role', None) in ['manager', 'superuser']):
+            return Response({"detail": "Permission denied."}, status=status.HTTP_403_FORBIDDEN)
+        return Response(result_cache.stats(), status=status.HTTP_200_OK)
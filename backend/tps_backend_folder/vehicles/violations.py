@@ -0,0 +1,204 @@
+"""
+Violation counter: CustomUser.violations_count is the number of the user's
+fines that are not paid or cancelled, and an account stays active while the
+count is below GlobalSettings.max_violations.
+
+Fine writes move the counter by a delta computed from the stored status,
+which Fine.save()/delete() read under a row lock (so two concurrent pays of
+the same fine apply -1 once), through one conditional UPDATE in the fine's
+transaction: no recount of the user's fines and no read-modify-write of the
+user row.
+Writes that bypass save() (queryset.update, raw SQL) and any drift are
+fixed by reconcile_violation_counts(), which recomputes all counts in one
+statement (`manage.py reconcile_violations`).
+
+Bulk status changes (admin actions, POST /api/fines/bulk/) use that path
+on purpose: one UPDATE for the fines, then one reconciliation of the
+owners involved, instead of a counter update per fine.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.lookups import GreaterThanOrEqual
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.activity import log_activities
+from users.models import ActivityLog
+from .models import Fine, GlobalSettings, Vehicle
+
+DEFAULT_MAX_VIOLATIONS = 3
+# Fines in these statuses do not count towards the ban
+UNCOUNTED_STATUSES = ('paid', 'cancelled')
+
+
+def is_counted(status):
+    return status is not None and status not in UNCOUNTED_STATUSES
+
+
+def violation_limit():
+    config = GlobalSettings.get_active()
+    return config.max_violations if config else DEFAULT_MAX_VIOLATIONS
+
+
+def _standing(count, limit):
+    """is_active expression for a violations_count expression"""
+    return Case(When(GreaterThanOrEqual(count, limit), then=Value(False)), default=Value(True))
+
+
+def adjust_violation_count(user_id, delta, limit=None):
+    """Add ``delta`` to a user's count (never below 0) and apply the ban rule"""
+    if not user_id or not delta:
+        return 0
+    limit = violation_limit() if limit is None else limit
+    count = Greatest(F('violations_count') + delta, 0)
+    return get_user_model().objects.filter(pk=user_id).update(
+        violations_count=count,
+        is_active=_standing(count, limit),
+    )
+
+
+def reconcile_violation_counts(user_ids=None):
+    """
+    Recompute counts from the fines table, in one UPDATE touching only the
+    users whose stored count is wrong. Returns the number of users fixed.
+    """
+    actual = Coalesce(
+        Subquery(
+            Fine.objects.filter(vehicle__user=OuterRef('pk'))
+            .exclude(status__in=UNCOUNTED_STATUSES)
+            .order_by()
+            .values('vehicle__user')
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+    users = get_user_model().objects.alias(actual_count=actual).exclude(violations_count=F('actual_count'))
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    return users.update(
+        violations_count=actual,
+        is_active=_standing(actual, violation_limit()),
+    )
+
+
+# Bulk action -> target status; only open fines (counted ones) change
+BULK_STATUS_ACTIONS = {
+    'cancel': 'cancelled',
+    'mark_paid': 'paid',
+}
+
+
+def _owner_ids(fines):
+    return set(fines.order_by().values_list('vehicle__user', flat=True).distinct()) - {None}
+
+
+def bulk_set_fine_status(fines, action):
+    """
+    Apply a BULK_STATUS_ACTIONS action to the open fines of a queryset.
+    Returns (fines updated, owners reconciled).
+    """
+    new_status = BULK_STATUS_ACTIONS[action]
+    fines = fines.exclude(status__in=UNCOUNTED_STATUSES)
+    changes = {'status': new_status}
+    if new_status == 'paid':
+        changes['paid_at'] = timezone.now()
+    with transaction.atomic():
+        owner_ids = _owner_ids(fines)
+        if new_status == 'paid':
+            _log_payments(fines, changes['paid_at'])
+        # queryset.update() sends no signals: counts are fixed once below
+        updated = fines.update(**changes)
+        reconciled = reconcile_violation_counts(owner_ids) if updated else 0
+    return updated, reconciled
+
+
+def _log_payments(fines, paid_at):
+    """Activity feed entries of a bulk payment, normally written by users/signals.py"""
+    rows = fines.values_list('vehicle__plate', 'amount', 'vehicle__user', 'session__parking_lot__city')
+    log_activities(
+        ActivityLog(
+            type='fine_payment', title='Fine Paid', timestamp=paid_at,
+            identifier=plate, amount=amount, user_id=user_id, city=city or '',
+        )
+        for plate, amount, user_id, city in rows.iterator()
+    )
+
+
+def owners_open_fines(fines):
+    """Every open (counted) fine of the owners of some fines"""
+    return Fine.objects.filter(
+        vehicle__user__in=fines.order_by().values('vehicle__user'),
+    ).exclude(status__in=UNCOUNTED_STATUSES)
+
+
+def reset_owner_standing(fines):
+    """
+    Unban the owners of some fines and zero their count. Their open fines
+    are cancelled, otherwise the next reconciliation would count them and
+    ban the owners again. Returns (fines cancelled, users reset).
+    """
+    with transaction.atomic():
+        owner_ids = _owner_ids(fines)
+        cancelled = Fine.objects.filter(vehicle__user__in=owner_ids).exclude(
+            status__in=UNCOUNTED_STATUSES,
+        ).update(status='cancelled')
+        reset = get_user_model().objects.filter(
+            pk__in=owner_ids,
+        ).exclude(
+            violations_count=0, is_active=True,
+        ).update(violations_count=0, is_active=True)
+    return cancelled, reset
+
+
+def _owner_id(fine, vehicle_id):
+    if vehicle_id is None:
+        return None
+    if vehicle_id == fine.vehicle_id and Fine.vehicle.is_cached(fine):
+        return fine.vehicle.user_id
+    return Vehicle.objects.filter(pk=vehicle_id).values_list('user_id', flat=True).first()
+
+
+def _apply(fine, old_state, new_state):
+    (old_vehicle_id, old_status), (new_vehicle_id, new_status) = old_state, new_state
+    old_counted, new_counted = is_counted(old_status), is_counted(new_status)
+    if old_vehicle_id == new_vehicle_id and old_counted == new_counted:
+        return
+
+    deltas = {}
+    if old_counted:
+        owner = _owner_id(fine, old_vehicle_id)
+        deltas[owner] = deltas.get(owner, 0) - 1
+    if new_counted:
+        owner = _owner_id(fine, new_vehicle_id)
+        deltas[owner] = deltas.get(owner, 0) + 1
+    deltas = {user_id: delta for user_id, delta in deltas.items() if user_id and delta}
+    if deltas:
+        limit = violation_limit()
+        for user_id, delta in deltas.items():
+            adjust_violation_count(user_id, delta, limit=limit)
+
+
+# Fine.save() and deletes run these inside their transaction
+
+@receiver(post_save, sender=Fine)
+def count_saved_fine(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new_state = (instance.vehicle_id, instance.status)
+    if created:
+        _apply(instance, (None, None), new_state)
+    elif instance.loaded_state is None:
+        # Saved without being loaded first: the previous status is unknown
+        reconcile_violation_counts([_owner_id(instance, instance.vehicle_id)])
+    else:
+        _apply(instance, instance.loaded_state, new_state)
+
+
+@receiver(post_delete, sender=Fine)
+def count_deleted_fine(sender, instance, **kwargs):
+    old_state = instance.loaded_state or (instance.vehicle_id, instance.status)
+    _apply(instance, old_state, (None, None))